@@ -35,7 +35,13 @@ class Config(userOwnedObject.UserOwnedObject, dict):
       ,"locked-subusers-path"
       ,"subuser-home-dirs-dir"
       ,"repositories-dir"
+      ,"git-reference-repository"
       ,"runtime-cache"
+      ,"build-context-cache"
+      ,"image-properties-cache"
+      ,"git-tree-cache"
+      ,"hash-cache"
+      ,"repository-catalog-cache"
       ,"lock-dir"
       ,"volumes-dir"]
     loadMultiFallbackJsonConfigFile.expandPathsInDict(self.user.homeDir,pathsToExpand,config)
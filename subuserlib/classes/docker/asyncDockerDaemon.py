@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+"""
+The AsyncDockerDaemon object allows us to communicate with the Docker daemon via the Docker HTTP REST API using asyncio.
+
+Each request is sent over its own connection, so many requests can be in flight at once without threads. Use ``runConcurrently`` to wait for several operations at the same time::
+
+  asyncDockerDaemon = user.asyncDockerDaemon
+  runConcurrently(asyncDockerDaemon.stopContainer(clientId),asyncDockerDaemon.stopContainer(serverId))
+"""
+
+#external imports
+import asyncio
+import urllib
+import json
+import sys
+import os
+import time
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+from subuserlib.classes.uhttpConnection import BufferedResponse
+from subuserlib.classes.docker.buildContextCache import BuildContextCache
+from subuserlib.classes.docker.dockerDaemon import readImageList,generateBuildContext,readExcludePatterns,BuildStatusDecoder,BuildResult,handleBuildStatusMessage,permissionErrorMessage,ImageDoesNotExistsException,ContainerDependsOnImageException,ServerErrorException
+import subuserlib.classes.exceptions as exceptions
+import subuserlib.docker
+import subuserlib.test
+
+def runConcurrently(*awaitables):
+  """
+  Run the given coroutines at the same time and return the list of their results, in the order in which they were given.
+
+  >>> import asyncio
+  >>> async def double(x):
+  ...   await asyncio.sleep(0)
+  ...   return x*2
+  >>> runConcurrently(double(1),double(2),double(3))
+  [2, 4, 6]
+  """
+  async def gather():
+    return await asyncio.gather(*awaitables)
+  return asyncio.run(gather())
+
+async def iterateInExecutor(iterator):
+  """
+  Pull the items of a blocking iterator, such as a build context generator which reads files from disk, without blocking the event loop.
+  """
+  loop = asyncio.get_running_loop()
+  iterator = iter(iterator)
+  finished = object()
+  while True:
+    item = await loop.run_in_executor(None,next,iterator,finished)
+    if item is finished:
+      return
+    yield item
+
+class AsyncResponse():
+  """
+  The status and headers of a response from the Docker daemon, whose body can be read as it arrives.
+  """
+  def __init__(self,status,reason,headers,reader,writer,hasBody=True):
+    self.status = status
+    self.reason = reason
+    self.headers = headers
+    self.__reader = reader
+    self.__writer = writer
+    self.__hasBody = hasBody
+
+  async def iterChunks(self):
+    """
+    Yield the body of the response piece by piece. The connection is closed once the body has been read.
+    """
+    reader = self.__reader
+    try:
+      if not self.__hasBody:
+        return
+      if self.headers.get("transfer-encoding","").lower() == "chunked":
+        while True:
+          sizeLine = await reader.readline()
+          if not sizeLine:
+            return
+          size = int(sizeLine.split(b";")[0].strip(),16)
+          if size == 0:
+            return
+          chunk = await reader.readexactly(size)
+          await reader.readexactly(2)
+          yield chunk
+      elif "content-length" in self.headers:
+        remaining = int(self.headers["content-length"])
+        while remaining > 0:
+          chunk = await reader.read(min(remaining,65536))
+          if not chunk:
+            return
+          remaining -= len(chunk)
+          yield chunk
+      else:
+        while True:
+          chunk = await reader.read(65536)
+          if not chunk:
+            return
+          yield chunk
+    finally:
+      self.close()
+
+  async def read(self):
+    """
+    Read the whole body of the response.
+    """
+    chunks = []
+    async for chunk in self.iterChunks():
+      chunks.append(chunk)
+    return b"".join(chunks)
+
+  def close(self):
+    self.__writer.close()
+
+class AsyncDockerDaemon(UserOwnedObject):
+  def __init__(self,user,socketPath="/var/run/docker.sock"):
+    self.socketPath = socketPath
+    self.__verifiedExecutable = False
+    UserOwnedObject.__init__(self,user)
+    self.buildContextCache = BuildContextCache(user)
+    self.lastBuildResult = None
+
+  async def openConnection(self):
+    """
+    Open a new connection to the Docker daemon. Returns a (reader,writer) pair of asyncio streams.
+    """
+    if not self.__verifiedExecutable:
+      subuserlib.docker.getAndVerifyExecutable()
+      self.__verifiedExecutable = True
+    try:
+      return await asyncio.open_unix_connection(self.socketPath)
+    except PermissionError as e:
+      sys.exit(permissionErrorMessage % str(e))
+
+  async def openResponse(self,method,url,body=None,headers=None):
+    """
+    Send a request to the Docker daemon and return an ``AsyncResponse`` as soon as the status and headers have arrived.
+
+    The body may be bytes, a file object, or an iterable of bytes. Iterables are sent with chunked transfer encoding unless a Content-Length header is given.
+    """
+    headers = dict(headers or {})
+    if isinstance(body,str):
+      body = body.encode("utf-8")
+    if hasattr(body,"read"):
+      fileObject = body
+      body = iter(lambda: fileObject.read(65536),b"")
+    chunked = False
+    if isinstance(body,bytes):
+      headers["Content-Length"] = str(len(body))
+    elif body is not None and not "Content-Length" in headers:
+      headers["Transfer-Encoding"] = "chunked"
+      chunked = True
+    (reader,writer) = await self.openConnection()
+    try:
+      requestLines = [method+" "+url+" HTTP/1.1","Host: localhost","Connection: close"]
+      for header,value in headers.items():
+        requestLines.append(header+": "+value)
+      writer.write(("\r\n".join(requestLines)+"\r\n\r\n").encode("latin-1"))
+      if isinstance(body,bytes):
+        writer.write(body)
+      elif body is not None:
+        async for piece in iterateInExecutor(body):
+          if not piece:
+            continue
+          if chunked:
+            writer.write(("%x\r\n" % len(piece)).encode("latin-1")+piece+b"\r\n")
+          else:
+            writer.write(piece)
+          await writer.drain()
+        if chunked:
+          writer.write(b"0\r\n\r\n")
+      await writer.drain()
+      statusLine = (await reader.readline()).decode("latin-1").rstrip("\r\n").split(" ",2)
+      if len(statusLine) < 2:
+        raise ServerErrorException("Unexpected response from the Docker daemon to "+method+" "+url)
+      status = int(statusLine[1])
+      reason = statusLine[2] if len(statusLine) > 2 else ""
+      responseHeaders = {}
+      while True:
+        headerLine = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+        if not headerLine:
+          break
+        header,_,value = headerLine.partition(":")
+        responseHeaders[header.strip().lower()] = value.strip()
+    except BaseException:
+      writer.close()
+      raise
+    hasBody = not (method == "HEAD" or status in [204,304] or 100 <= status < 200)
+    return AsyncResponse(status,reason,responseHeaders,reader,writer,hasBody=hasBody)
+
+  async def request(self,method,url,body=None,headers=None):
+    """
+    Send a request to the Docker daemon and return the fully read response.
+    """
+    response = await self.openResponse(method,url,body=body,headers=headers)
+    return BufferedResponse(response.status,response.reason,await response.read())
+
+  async def getImageProperties(self,imageTagOrId):
+    """
+     Returns a dictionary of image properties, or None if the image does not exist.
+    """
+    response = await self.request("GET","/v1.13/images/"+imageTagOrId+"/json")
+    if not response.status == 200:
+      return None
+    return json.loads(response.read().decode("utf-8"))
+
+  async def getImageList(self):
+    """
+     Returns a list of dictionaries with the Id, Parent, Created, Size and RepoTags properties of every image, in the same format as ``DockerDaemon.getImageList``.
+    """
+    response = await self.request("GET","/v1.13/images/json?all=1")
+    if not response.status == 200:
+      return []
+    return readImageList(response.read())
+
+  async def removeImage(self,imageId):
+    self.user.dockerDaemon.imageInventory.invalidate()
+    self.user.dockerDaemon.imagePropertiesCache.forget(imageId)
+    response = await self.request("DELETE","/v1.13/images/"+imageId)
+    if response.status == 404:
+      raise ImageDoesNotExistsException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
+    elif response.status == 409:
+      raise ContainerDependsOnImageException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
+    elif response.status == 500:
+      raise ServerErrorException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
+
+  async def build(self,relativeBuildContextPath=None,repositoryFileStructure=None,useCache=True,rm=True,forceRm=True,quiet=False,tag=None,dockerfile=None,quietClient=False):
+    """
+    Build a Docker image, logging the build status messages as they arrive. Takes the same arguments as ``DockerDaemon.build``.
+    Returns the newly created images Id or raises an exception if the build fails. The ``BuildResult`` of the build is kept in ``lastBuildResult``.
+    """
+    queryParameters =  {
+      'q': "true" if quiet else "false",
+      'nocache': "false" if useCache else "true",
+      'rm': "true" if rm  else "false",
+      'forcerm': "true" if forceRm else "false"
+      }
+    if tag:
+      queryParameters["t"] = tag
+    excludePatterns = readExcludePatterns(relativeBuildContextPath,repositoryFileStructure)
+    query = "/v1.18/build?"+urllib.parse.urlencode(queryParameters)
+    self.user.registry.log(query)
+    buildContextCache = self.buildContextCache
+    cacheKey = buildContextCache.getKey(relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=dockerfile)
+    cachedArchivePath = None
+    if cacheKey is not None:
+      cachedArchivePath = buildContextCache.get(cacheKey)
+    buildResult = BuildResult()
+    startTime = time.time()
+    try:
+      if cachedArchivePath is not None:
+        self.user.registry.log("Using cached build context "+cacheKey,verbosityLevel=4)
+        with open(cachedArchivePath,"rb") as cachedArchive:
+          buildResult.bytesUploaded = os.fstat(cachedArchive.fileno()).st_size
+          response = await self.openResponse("POST",query,body=cachedArchive,headers={"Content-Type":"application/x-tar","Content-Length":str(buildResult.bytesUploaded)})
+      else:
+        buildContext = generateBuildContext(relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,excludePatterns=excludePatterns,dockerfile=dockerfile)
+        if cacheKey is not None:
+          buildContext = buildContextCache.store(cacheKey,buildContext)
+        response = await self.openResponse("POST",query,body=buildResult.countUploadedBytes(buildContext),headers={"Content-Type":"application/x-tar"})
+      decoder = BuildStatusDecoder()
+      async for chunk in response.iterChunks():
+        for message in decoder.feed(chunk):
+          handleBuildStatusMessage(self.user,message,buildResult,quiet=quietClient)
+      for message in decoder.close():
+        handleBuildStatusMessage(self.user,message,buildResult,quiet=quietClient)
+    finally:
+      self.user.dockerDaemon.imageInventory.invalidate()
+    if response.status != 200:
+      raise exceptions.ImageBuildException("Building image failed.\n"
+                     +"status: "+str(response.status)+"\n"
+                     +"Reason: "+response.reason+"\n")
+    buildResult.duration = time.time() - startTime
+    self.lastBuildResult = buildResult
+    if not buildResult.imageId:
+      if not buildResult.shortId:
+        raise exceptions.ImageBuildException("Unexpected server response when building image. Docker did not report the Id of the new image.")
+      # Daemons which are too old to send the aux message only give us the short Id.
+      buildResult.imageId = (await self.getImageProperties(buildResult.shortId))["Id"]
+    self.user.registry.log(str(buildResult),verbosityLevel=4)
+    return buildResult.imageId
+
+  async def inspectContainer(self,containerId):
+    """
+     Returns a dictionary of container properties.
+     If the container no longer exists, return None.
+    """
+    response = await self.request("GET","/v1.13/containers/"+containerId+"/json")
+    if not response.status == 200:
+      return None
+    return json.loads(response.read().decode("utf-8"))
+
+  async def stopContainer(self,containerId):
+    await self.request("POST","/v1.13/containers/"+containerId+"/stop")
+
+  async def removeContainer(self,containerId,force=False):
+    queryParametersString = urllib.parse.urlencode({'force': force})
+    await self.request("DELETE","/v1.13/containers/"+containerId+"?"+queryParametersString)
+
+  async def getContainerStats(self,containerId):
+    """
+    Returns a single sample of the container's resource usage statistics, or None if the container does not exist.
+    """
+    response = await self.request("GET","/v1.21/containers/"+containerId+"/stats?stream=0")
+    if not response.status == 200:
+      return None
+    return json.loads(response.read().decode("utf-8"))
+
+  async def getEvents(self,since,until,filters=None):
+    """
+    Returns the list of events which the Docker daemon has recorded between the unix times since and until, or None if the events could not be retrieved.
+    """
+    queryParameters = {"since":since,"until":until}
+    if filters:
+      queryParameters["filters"] = json.dumps(filters)
+    response = await self.openResponse("GET","/v1.13/events?"+urllib.parse.urlencode(queryParameters))
+    if not response.status == 200:
+      response.close()
+      return None
+    decoder = BuildStatusDecoder()
+    events = []
+    async for chunk in response.iterChunks():
+      events.extend(decoder.feed(chunk))
+    return events + decoder.close()
+
+if subuserlib.test.testing:
+  from subuserlib.classes.docker.mockAsyncDockerDaemon import MockAsyncDockerDaemon
+  RealAsyncDockerDaemon = AsyncDockerDaemon
+  AsyncDockerDaemon = MockAsyncDockerDaemon
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+The BuildContextCache keeps finished build context archives on disk so that they can be sent to Docker again without re-reading the files which went into them.
+
+Archives are content addressed. They are stored under a key derived from the content id of the build context(for git repositories, the id of the git tree), the .dockerignore patterns and the digest of the injected Dockerfile.
+"""
+
+#external imports
+import os
+import json
+import hashlib
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+
+class BuildContextCache(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+
+  @property
+  def cacheDir(self):
+    return self.user.config["build-context-cache"]
+
+  @property
+  def maxSize(self):
+    return int(self.user.config["build-context-cache-size"])
+
+  def getKey(self,relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=None):
+    """
+    Return the key under which the archive of the given build context is cached, or None if the build context cannot be cached.
+
+    Only build contexts whose file structure can cheaply tell us when their contents change can be cached.
+    """
+    if not (relativeBuildContextPath and repositoryFileStructure):
+      return None
+    contentId = repositoryFileStructure.getContentId(relativeBuildContextPath)
+    if contentId is None:
+      return None
+    dockerfileDigest = None
+    if dockerfile is not None:
+      dockerfileDigest = hashlib.sha256(dockerfile.encode("utf-8")).hexdigest()
+    keyMaterial = json.dumps([contentId,excludePatterns,dockerfileDigest])
+    return hashlib.sha256(keyMaterial.encode("utf-8")).hexdigest()
+
+  def getPath(self,key):
+    return os.path.join(self.cacheDir,key+".tar")
+
+  def get(self,key):
+    """
+    Return the path to the cached archive with the given key, or None if no such archive is cached.
+    """
+    path = self.getPath(key)
+    try:
+      # Bump the modification time, it is what we use to find the least recently used archives.
+      os.utime(path)
+    except OSError:
+      return None
+    return path
+
+  def store(self,key,pieces):
+    """
+    Pass the pieces of an archive through, writing them to the cache as they go by.
+    The archive is only added to the cache once all of the pieces have been consumed.
+    """
+    self.user.endUser.makedirs(self.cacheDir)
+    path = self.getPath(key)
+    temporaryPath = path+"."+str(os.getpid())+".tmp"
+    try:
+      with self.user.endUser.get_file(temporaryPath,mode="wb") as archive:
+        for piece in pieces:
+          archive.write(piece)
+          yield piece
+    except BaseException:
+      try:
+        os.remove(temporaryPath)
+      except OSError:
+        pass
+      raise
+    os.rename(temporaryPath,path)
+    self.user.registry.log("Cached build context "+key,verbosityLevel=4)
+    self.evict()
+
+  def evict(self):
+    """
+    Remove the least recently used archives until the cache is no larger than the configured maximum size.
+    """
+    archives = []
+    totalSize = 0
+    for archiveName in os.listdir(self.cacheDir):
+      if not archiveName.endswith(".tar"):
+        continue
+      try:
+        archiveStat = os.stat(os.path.join(self.cacheDir,archiveName))
+      except OSError:
+        continue
+      archives.append((archiveStat.st_mtime,archiveStat.st_size,archiveName))
+      totalSize += archiveStat.st_size
+    archives.sort()
+    for _,size,archiveName in archives:
+      if totalSize <= self.maxSize:
+        break
+      try:
+        os.remove(os.path.join(self.cacheDir,archiveName))
+      except OSError:
+        pass
+      totalSize -= size
@@ -19,18 +19,15 @@ class Container(UserOwnedObject):
      Returns a dictionary of container properties.
      If the container no longer exists, return None.
     """
-    self.user.dockerDaemon.getConnection().request("GET","/v1.13/containers/"+self.id+"/json")
-    response = self.user.dockerDaemon.getConnection().getresponse()
+    response = self.user.dockerDaemon.request("GET","/v1.13/containers/"+self.id+"/json")
     if not response.status == 200:
-      response.read() # Read the response and discard it to prevent the server from getting locked up: https://stackoverflow.com/questions/3231543/python-httplib-responsenotready
       return None
     else:
       return json.loads(response.read().decode("utf-8"))
 
   def stop(self):
-    self.user.dockerDaemon.getConnection().request("POST","/v1.13/containers/"+self.id+"/stop")
-    response = self.user.dockerDaemon.getConnection().getresponse()
-    response.read()
+    # Docker waits for the container to shut down before responding.
+    self.user.dockerDaemon.request("POST","/v1.13/containers/"+self.id+"/stop",timeout=None)
 
   def remove(self,force=False):
     queryParameters =  {
@@ -40,7 +37,5 @@ class Container(UserOwnedObject):
       queryParametersString = urllib.urlencode(queryParameters)
     except AttributeError:
       queryParametersString = urllib.parse.urlencode(queryParameters) # Python 3
-    self.user.dockerDaemon.getConnection().request("DELETE","/v1.13/containers/"+self.id+"?"+queryParametersString)
-    response = self.user.dockerDaemon.getConnection().getresponse()
-    response.read()
+    self.user.dockerDaemon.request("DELETE","/v1.13/containers/"+self.id+"?"+queryParametersString,timeout=None)
 
@@ -8,11 +8,12 @@ The DockerDaemon object allows us to communicate with the Docker daemon via the
 import urllib
 import tarfile
 import os
-import tempfile
 import fnmatch
 import re
 import json
 import sys
+import time
+import datetime
 try:
   import httplib
 except ImportError:
@@ -24,107 +25,307 @@ except ImportError:
   import io
 #internal imports
 from subuserlib.classes.userOwnedObject import UserOwnedObject
-from subuserlib.classes.uhttpConnection import UHTTPConnection
+from subuserlib.classes.uhttpConnection import UHTTPConnectionPool,DEFAULT_TIMEOUT
 import subuserlib.docker
 import subuserlib.test
 from subuserlib.classes.docker.container import Container
+from subuserlib.classes.docker.buildContextCache import BuildContextCache
+from subuserlib.classes.docker.imageInventory import ImageInventory
+from subuserlib.classes.docker.imagePropertiesCache import ImagePropertiesCache
+from subuserlib.classes.docker.engineApiLauncher import EngineApiLauncher
 import subuserlib.classes.exceptions as exceptions
 
+# The build context is yielded in pieces of about this many bytes.
+buildContextPieceSize = 256*1024
+
+def generateBuildContext(relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=None):
+  """
+  Yield a tar archive of the files in relativeBuildContextPath piece by piece, excluding files who's paths(relative to relativeBuildContextPath) are in excludePatterns.
+  If dockerfile is set to a string, include that string as the file Dockerfile in the archive.
+
+  Files are read from the repositoryFileStructure only as the archive is consumed, and are streamed into the archive in chunks, so the archive can be sent to Docker without ever holding it, or any one file in it, in memory as a whole.
+  The archive is byte for byte the same as one written by ``tarfile`` in streaming mode.
+  """
+  def generateFile(path,size,chunks,mode=420):
+    tarinfo = tarfile.TarInfo(name=path)
+    tarinfo.mode=mode
+    tarinfo.size = size
+    yield tarinfo.tobuf(tarfile.DEFAULT_FORMAT,tarfile.ENCODING,"surrogateescape")
+    remaining = size
+    for chunk in chunks:
+      chunk = chunk[:remaining]
+      remaining -= len(chunk)
+      if chunk:
+        yield chunk
+    if remaining:
+      raise OSError("File changed size while it was being archived: "+path)
+    if size % tarfile.BLOCKSIZE:
+      yield tarfile.NUL*(tarfile.BLOCKSIZE-size%tarfile.BLOCKSIZE)
+  # Inspired by and partialy taken from https://github.com/docker/docker-py
+  def generateArchive():
+    if relativeBuildContextPath and repositoryFileStructure:
+      def addFolder(folder):
+        for filename in repositoryFileStructure.lsFiles(folder):
+          filePathRelativeToRepository = os.path.join(folder,filename)
+          filePathRelativeToBuildContext = os.path.relpath(filePathRelativeToRepository,relativeBuildContextPath)
+          exclude = False
+          for excludePattern in excludePatterns:
+            if fnmatch.fnmatch(filePathRelativeToBuildContext,excludePattern):
+              exclude = True
+              break
+          if not exclude:
+            for piece in generateFile(path=filePathRelativeToBuildContext,size=repositoryFileStructure.getSize(filePathRelativeToRepository),chunks=repositoryFileStructure.iterChunks(filePathRelativeToRepository),mode=repositoryFileStructure.getMode(filePathRelativeToRepository)):
+              yield piece
+        for subFolder in repositoryFileStructure.lsFolders(folder):
+          for piece in addFolder(os.path.join(folder,subFolder)):
+            yield piece
+      repositoryFileStructure.prefetch(relativeBuildContextPath)
+      with repositoryFileStructure.snapshot():
+        for piece in addFolder(relativeBuildContextPath):
+          yield piece
+    # Add the provided Dockerfile if necessary
+    if not dockerfile == None:
+      contents = dockerfile.encode("utf-8")
+      for piece in generateFile(path="./Dockerfile",size=len(contents),chunks=[contents]):
+        yield piece
+    # The archive ends with two empty blocks, and is padded out to a whole number of records.
+    yield tarfile.NUL*(tarfile.BLOCKSIZE*2)
+  archiveSize = 0
+  # Small files and tar headers are gathered into larger pieces, so that they are not sent one by one.
+  pending = []
+  pendingSize = 0
+  for piece in generateArchive():
+    archiveSize += len(piece)
+    pending.append(piece)
+    pendingSize += len(piece)
+    if pendingSize >= buildContextPieceSize:
+      yield b"".join(pending)
+      pending = []
+      pendingSize = 0
+  if archiveSize % tarfile.RECORDSIZE:
+    pending.append(tarfile.NUL*(tarfile.RECORDSIZE-archiveSize%tarfile.RECORDSIZE))
+  yield b"".join(pending)
+
 def archiveBuildContext(archive,relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=None):
   """
   Archive files from directoryWithDockerfile into the FileObject archive excluding files who's paths(relative to directoryWithDockerfile) are in excludePatterns.
   If dockerfile is set to a string, include that string as the file Dockerfile in the archive.
   """
-  def getFileObject(contents):
+  for piece in generateBuildContext(relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=dockerfile):
+    archive.write(piece)
+  archive.seek(0)
+
+def readExcludePatterns(relativeBuildContextPath,repositoryFileStructure):
+  """
+  Return the list of patterns from the repository's .dockerignore file, or [] if there is none.
+  """
+  if relativeBuildContextPath and repositoryFileStructure:
+    dockerignore = "./.dockerignore"
+    if repositoryFileStructure.exists(dockerignore):
+      return list(filter(bool, repositoryFileStructure.read(dockerignore).split('\n')))
+  return []
+
+def readImageList(responseBody):
+  """
+  Convert the body of the Docker daemon's response to ``GET /images/json`` into a list of dictionaries with the Id, Parent, Created, Size and RepoTags properties of every image.
+  The properties are named and formatted as they are when an image is inspected, except that the Created time is only given to the second. Images which were created in the same second cannot be told apart by it, so the exact time should be taken from the image's inspection.
+
+  >>> readImageList(b'[{"Id":"sha256:2","ParentId":"sha256:1","Created":1500000000,"Size":5,"RepoTags":null}]')
+  [{'Id': 'sha256:2', 'Parent': 'sha256:1', 'Created': '2017-07-14T02:40:00Z', 'Size': 5, 'RepoTags': []}]
+  """
+  images = []
+  for image in json.loads(responseBody.decode("utf-8")):
+    created = datetime.datetime.fromtimestamp(image["Created"],datetime.timezone.utc)
+    images.append({
+      "Id":image["Id"],
+      "Parent":image.get("ParentId",""),
+      "Created":created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+      "Size":image.get("Size",0),
+      "RepoTags":image.get("RepoTags") or []})
+  return images
+
+permissionErrorMessage = "Permission error (%s) connecting to the docker socket. This usually happens when you've added yourself as a member of the docker group but haven't logged out/in again before starting subuser."
+
+class BuildStatusDecoder():
+  """
+  Incrementally decodes the newline delimited stream of JSON messages which Docker sends while building an image.
+
+  >>> decoder = BuildStatusDecoder()
+  >>> decoder.feed(b'{"stream":"Step 1"}\\n{"stream":"Ste')
+  [{'stream': 'Step 1'}]
+  >>> decoder.feed(b'p 2"}{"status":"Done"}\\n\\n')
+  [{'stream': 'Step 2'}, {'status': 'Done'}]
+  >>> decoder.feed(b'Not JSON')
+  []
+  >>> decoder.close()
+  [{'stream': 'Not JSON'}]
+  """
+  def __init__(self):
+    self.__pendingChunks = []
+    self.__jsonDecoder = json.JSONDecoder()
+
+  def feed(self,chunk):
     """
-    Returns a FileObject from the given string. Works with both versions of python.
+    Add a chunk of bytes to the stream. Returns a list of the messages which were completed by that chunk.
     """
-    return io.BytesIO(contents)
+    lines = chunk.split(b"\n")
+    self.__pendingChunks.append(lines[0])
+    if len(lines) == 1:
+      return []
+    messages = self.__decodeLine(b"".join(self.__pendingChunks))
+    for line in lines[1:-1]:
+      messages.extend(self.__decodeLine(line))
+    self.__pendingChunks = [lines[-1]]
+    return messages
 
-  def addFileFromContents(path,contents,mode=420):
-    fileObject = getFileObject(contents)
-    tarinfo = tarfile.TarInfo(name=path)
-    tarinfo.mode=mode
-    fileObject.seek(0, os.SEEK_END)
-    tarinfo.size = fileObject.tell()
-    fileObject.seek(0)
-    contexttarfile.addfile(tarinfo,fileObject)
-  # Inspired by and partialy taken from https://github.com/docker/docker-py
-  contexttarfile = tarfile.open(mode="w",fileobj=archive)
-  if relativeBuildContextPath and repositoryFileStructure:
-    def addFolder(folder):
-      for filename in repositoryFileStructure.lsFiles(folder):
-        filePathRelativeToRepository = os.path.join(folder,filename)
-        filePathRelativeToBuildContext = os.path.relpath(filePathRelativeToRepository,relativeBuildContextPath)
-        exclude = False
-        for excludePattern in excludePatterns:
-          if fnmatch.fnmatch(filePathRelativeToBuildContext,excludePattern):
-            exclude = True
-            break
-        if not exclude:
-          addFileFromContents(path=filePathRelativeToBuildContext,contents=repositoryFileStructure.readBinary(filePathRelativeToRepository),mode=repositoryFileStructure.getMode(filePathRelativeToRepository))
-      for subFolder in repositoryFileStructure.lsFolders(folder):
-        addFolder(os.path.join(folder,subFolder))
-    addFolder(relativeBuildContextPath)
-  # Add the provided Dockerfile if necessary
-  if not dockerfile == None:
-    addFileFromContents(path="./Dockerfile",contents=dockerfile.encode("utf-8"))
-  contexttarfile.close()
-  archive.seek(0)
+  def close(self):
+    """
+    Decode whatever is left over once the stream has ended.
+    """
+    messages = self.__decodeLine(b"".join(self.__pendingChunks))
+    self.__pendingChunks = []
+    return messages
 
-def readAndPrintStreamingBuildStatus(user,response):
-  jsonSegmentBytes = b''
-  output = b''
-  byte = response.read(1)
-  while byte:
-    jsonSegmentBytes += byte
-    output += byte
-    byte = response.read(1)
-    try:
-      lineDict = json.loads(jsonSegmentBytes.decode("utf-8"))
-      if lineDict == {}:
-        pass
-      elif "stream" in lineDict:
-        user.registry.log(lineDict["stream"])
-      elif "status" in lineDict:
-        user.registry.log(lineDict["status"])
-      elif "errorDetail" in lineDict:
-        raise exceptions.ImageBuildException("Build error:"+lineDict["errorDetail"]["message"]+"\n"+response.read().decode())
-      else:
-        raise exceptions.ImageBuildException("Build error:"+jsonSegmentBytes.decode("utf-8")+"\n"+response.read().decode("utf-8"))
-      jsonSegmentBytes = b''
-    except ValueError:
-      pass
-  output = output.decode("utf-8")
-  if not output.strip().startswith("{"):
-    user.registry.log(output)
-  return output
+  def __decodeLine(self,line):
+    text = line.decode("utf-8","replace").strip()
+    messages = []
+    position = 0
+    # Older Docker daemons do not always put a newline between messages.
+    while position < len(text):
+      try:
+        message,position = self.__jsonDecoder.raw_decode(text,position)
+      except ValueError:
+        # Docker answers some errors in plain text rather than in JSON.
+        messages.append({"stream":text[position:]})
+        break
+      messages.append(message)
+      while position < len(text) and text[position].isspace():
+        position += 1
+    return messages
+
+class BuildResult():
+  """
+  What we learned about a build from the status messages which Docker sent while building.
+
+   - imageId: The full Id of the new image, as reported in Docker's aux message, or None if Docker didn't report it.
+   - shortId: The short Id of the new image, as printed at the end of the build, or None.
+   - duration: The number of seconds which the build took.
+   - bytesUploaded: The size of the build context which was sent to Docker.
+   - stepCount: The number of Dockerfile steps which were run.
+
+  >>> buildResult = BuildResult()
+  >>> for message in [{"stream":"Step 1/2 : FROM debian"},{"stream":"Step 2/2 : RUN true"},{"aux":{"ID":"sha256:7f2a"}},{"stream":"Successfully built 7f2a"}]:
+  ...   buildResult.handleMessage(message)
+  >>> buildResult.imageId,buildResult.shortId,buildResult.stepCount
+  ('sha256:7f2a', '7f2a', 2)
+  """
+  def __init__(self):
+    self.imageId = None
+    self.shortId = None
+    self.duration = None
+    self.bytesUploaded = 0
+    self.stepCount = 0
+
+  def handleMessage(self,message):
+    if "stream" in message:
+      if re.match(r'^Step [0-9]+',message["stream"]):
+        self.stepCount += 1
+      match = re.search(r'Successfully built ([0-9a-f]+)',message["stream"])
+      if match:
+        self.shortId = match.group(1)
+    elif "aux" in message and isinstance(message["aux"],dict) and "ID" in message["aux"]:
+      self.imageId = message["aux"]["ID"]
+
+  def countUploadedBytes(self,pieces):
+    """
+    Pass the pieces of the build context through, adding up their size.
+    """
+    for piece in pieces:
+      self.bytesUploaded += len(piece)
+      yield piece
+
+  def __str__(self):
+    return "Built image "+str(self.imageId or self.shortId)+" in "+"%.1f" % (self.duration or 0)+" seconds. Steps: "+str(self.stepCount)+" Bytes uploaded: "+str(self.bytesUploaded)
+
+def handleBuildStatusMessage(user,message,buildResult,quiet=False,readRemainder=lambda: ""):
+  """
+  Log a single build status message unless quiet is set, and record what it tells us in the buildResult.
+  Raises an ``ImageBuildException`` if the message reports an error. The readRemainder function is called to get the rest of the response for the exception's message.
+  """
+  if message == {}:
+    return
+  elif "stream" in message:
+    if not quiet:
+      user.registry.log(message["stream"])
+  elif "status" in message:
+    if not quiet:
+      user.registry.log(message["status"])
+  elif "errorDetail" in message:
+    raise exceptions.ImageBuildException("Build error:"+message["errorDetail"]["message"]+"\n"+readRemainder())
+  elif "aux" in message:
+    user.registry.log(json.dumps(message["aux"]),verbosityLevel=4)
+  else:
+    raise exceptions.ImageBuildException("Build error:"+json.dumps(message)+"\n"+readRemainder())
+  buildResult.handleMessage(message)
+
+def readAndPrintStreamingBuildStatus(user,response,quiet=False,buildResult=None):
+  """
+  Read the build status messages from the response as they arrive, logging them unless quiet is set.
+  Returns a ``BuildResult``. Only one chunk of the response is held in memory at a time.
+  """
+  if buildResult is None:
+    buildResult = BuildResult()
+  decoder = BuildStatusDecoder()
+  def readRemainder():
+    return response.read().decode("utf-8","replace")
+  if hasattr(response,"read1"):
+    readChunk = response.read1
+  else:
+    readChunk = response.read
+  chunk = readChunk(65536)
+  while chunk:
+    for message in decoder.feed(chunk):
+      handleBuildStatusMessage(user,message,buildResult,quiet=quiet,readRemainder=readRemainder)
+    chunk = readChunk(65536)
+  for message in decoder.close():
+    handleBuildStatusMessage(user,message,buildResult,quiet=quiet,readRemainder=readRemainder)
+  return buildResult
 
 class DockerDaemon(UserOwnedObject):
   def __init__(self,user):
-    self.__connection = None
+    self.__connectionPool = None
     self.__imagePropertiesCache = {}
+    self.lastBuildResult = None
     UserOwnedObject.__init__(self,user)
+    self.buildContextCache = BuildContextCache(user)
+    self.imageInventory = ImageInventory(user)
+    self.imagePropertiesCache = ImagePropertiesCache(user)
 
-  def getConnection(self):
+  def getConnectionPool(self):
     """
-     Get an `HTTPConnection <https://docs.python.org/2/library/httplib.html#httplib.HTTPConnection>`_ to the Docker daemon.
+     Get the ``UHTTPConnectionPool`` which holds our keep-alive connections to the Docker daemon.
 
      Note: You can find more info in the `Docker API docs <https://docs.docker.com/reference/api/docker_remote_api_v1.13/>`_
     """
-    if not self.__connection:
+    if not self.__connectionPool:
       subuserlib.docker.getAndVerifyExecutable()
-      try:
-        self.__connection = UHTTPConnection("/var/run/docker.sock")
-      except PermissionError as e:
-        sys.exit("Permission error (%s) connecting to the docker socket. This usually happens when you've added yourself as a member of the docker group but haven't logged out/in again before starting subuser."% str(e))
-    return self.__connection
+      self.__connectionPool = UHTTPConnectionPool("/var/run/docker.sock")
+    return self.__connectionPool
+
+  def request(self,method,url,body=None,headers=None,timeout=DEFAULT_TIMEOUT):
+    """
+     Send a request to the Docker daemon and return the fully read response.
+     The timeout is given in seconds. None means wait forever. By default, the connection pool's timeout is used.
+    """
+    try:
+      return self.getConnectionPool().request(method,url,body=body,headers=headers,timeout=timeout)
+    except PermissionError as e:
+      sys.exit(permissionErrorMessage % str(e))
 
   def getContainers(self,onlyRunning=False):
     queryParameters =  {'all': not onlyRunning}
     queryParametersString = urllib.parse.urlencode(queryParameters)
-    self.getConnection().request("GET","/v1.13/containers/json?"+queryParametersString)
-    response = self.getConnection().getresponse()
+    response = self.request("GET","/v1.13/containers/json?"+queryParametersString)
     if response.status == 200:
       return json.loads(response.read().decode("utf-8"))
     else:
@@ -141,32 +342,45 @@ class DockerDaemon(UserOwnedObject):
       return self.__imagePropertiesCache[imageTagOrId]
     except KeyError:
       pass
-    self.getConnection().request("GET","/v1.13/images/"+imageTagOrId+"/json")
-    response = self.getConnection().getresponse()
-    if not response.status == 200:
-      response.read() # Read the response and discard it to prevent the server from getting locked up: https://stackoverflow.com/questions/3231543/python-httplib-responsenotready
-      return None
-    else:
+    properties = self.imagePropertiesCache.get(imageTagOrId)
+    if properties is None:
+      response = self.request("GET","/v1.13/images/"+imageTagOrId+"/json")
+      if not response.status == 200:
+        return None
       properties = json.loads(response.read().decode("utf-8"))
-      self.__imagePropertiesCache[imageTagOrId] = properties
-      return properties
+      self.imagePropertiesCache.store(imageTagOrId,properties)
+    self.__imagePropertiesCache[imageTagOrId] = properties
+    return properties
+
+  def getImageList(self):
+    """
+     Returns a list of dictionaries with the Id, Parent, Created, Size and RepoTags properties of every image, including intermediate images.
+     See ``readImageList`` for how they are formatted.
+    """
+    response = self.request("GET","/v1.13/images/json?all=1")
+    if not response.status == 200:
+      return []
+    return readImageList(response.read())
 
   def removeImage(self,imageId):
-    self.getConnection().request("DELETE","/v1.13/images/"+imageId)
-    response = self.getConnection().getresponse()
+    self.imageInventory.invalidate()
+    self.__imagePropertiesCache = {}
+    self.imagePropertiesCache.forget(imageId)
+    # Removing large images can take a long time.
+    response = self.request("DELETE","/v1.13/images/"+imageId,timeout=None)
     if response.status == 404:
       raise ImageDoesNotExistsException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
     elif response.status == 409:
       raise ContainerDependsOnImageException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
     elif response.status == 500:
       raise ServerErrorException("The image "+imageId+" could not be deleted.\n"+response.read().decode("utf-8"))
-    else:
-      response.read()
 
   def build(self,relativeBuildContextPath=None,repositoryFileStructure=None,useCache=True,rm=True,forceRm=True,quiet=False,tag=None,dockerfile=None,quietClient=False):
     """
     Build a Docker image.  If a the dockerfile argument is set to a string, use that string as the Dockerfile.  Returns the newly created images Id or raises an exception if the build fails.
 
+    The ``BuildResult`` of the build is kept in ``lastBuildResult``.
+
     Most of the options are passed directly on to Docker.
 
     The quietClient option makes it so that this function does not print any of Docker's status messages when building.
@@ -181,57 +395,88 @@ class DockerDaemon(UserOwnedObject):
     if tag:
       queryParameters["t"] = tag
     queryParametersString = urllib.parse.urlencode(queryParameters)
-    excludePatterns = []
-    if relativeBuildContextPath and repositoryFileStructure:
-      dockerignore = "./.dockerignore"
-      if repositoryFileStructure.exists(dockerignore):
-        exclude = list(filter(bool, repositoryFileStructure.read(dockerignore).split('\n')))
-    with tempfile.NamedTemporaryFile() as tmpArchive:
-      archiveBuildContext(tmpArchive,relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,excludePatterns=excludePatterns,dockerfile=dockerfile)
-      query = "/v1.18/build?"+queryParametersString
-      self.user.registry.log(query)
-      self.getConnection().request("POST",query,body=tmpArchive)
+    excludePatterns = readExcludePatterns(relativeBuildContextPath,repositoryFileStructure)
+    query = "/v1.18/build?"+queryParametersString
+    self.user.registry.log(query)
+    cacheKey = self.buildContextCache.getKey(relativeBuildContextPath,repositoryFileStructure,excludePatterns,dockerfile=dockerfile)
+    cachedArchivePath = None
+    if cacheKey is not None:
+      cachedArchivePath = self.buildContextCache.get(cacheKey)
+    buildResult = BuildResult()
+    startTime = time.time()
     try:
-      response = self.getConnection().getresponse()
-    except httplib.ResponseNotReady as rnr:
-      raise exceptions.ImageBuildException(rnr)
-    if response.status != 200:
-      if quietClient:
-        response.read()
-      else:
-        readAndPrintStreamingBuildStatus(self.user, response)
-      raise exceptions.ImageBuildException("Building image failed.\n"
-                     +"status: "+str(response.status)+"\n"
-                     +"Reason: "+response.reason+"\n")
-    if quietClient:
-      output = response.read().decode("utf-8")
-    else:
-      output = readAndPrintStreamingBuildStatus(self.user,response)
-    # Now we move to regex code stolen from the official python Docker bindings. This is REALLY UGLY!
-    outputLines = output.split("\n")
-    search = r'Successfully built ([0-9a-f]+)' #This is REALLY ugly!
-    match = None
-    for line in reversed(outputLines):
-      match = re.search(search, line) #This is REALLY ugly!
-      if match:
-        break
-    if not match:
-      raise exceptions.ImageBuildException("Unexpected server response when building image. \n " + output)
-    shortId = match.group(1) #This is REALLY ugly!
-    return self.getImageProperties(shortId)["Id"]
+      # Builds can take as long as they like, so no timeout is set on the connection.
+      with self.getConnectionPool().connection(timeout=None) as connection:
+        if cachedArchivePath is not None:
+          self.user.registry.log("Using cached build context "+cacheKey,verbosityLevel=4)
+          with open(cachedArchivePath,"rb") as cachedArchive:
+            buildResult.bytesUploaded = os.fstat(cachedArchive.fileno()).st_size
+            connection.request("POST",query,body=cachedArchive,headers={"Content-Type":"application/x-tar","Content-Length":str(buildResult.bytesUploaded)})
+        else:
+          # The archive is generated as it is sent. Since its length is not known in advance, http.client uploads it with chunked transfer encoding.
+          buildContext = generateBuildContext(relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,excludePatterns=excludePatterns,dockerfile=dockerfile)
+          if cacheKey is not None:
+            buildContext = self.buildContextCache.store(cacheKey,buildContext)
+          connection.request("POST",query,body=buildResult.countUploadedBytes(buildContext),headers={"Content-Type":"application/x-tar"})
+        try:
+          response = connection.getresponse()
+        except httplib.ResponseNotReady as rnr:
+          raise exceptions.ImageBuildException(rnr)
+        if response.status != 200:
+          if quietClient:
+            response.read()
+          else:
+            readAndPrintStreamingBuildStatus(self.user, response)
+          raise exceptions.ImageBuildException("Building image failed.\n"
+                         +"status: "+str(response.status)+"\n"
+                         +"Reason: "+response.reason+"\n")
+        readAndPrintStreamingBuildStatus(self.user,response,quiet=quietClient,buildResult=buildResult)
+    except PermissionError as e:
+      sys.exit(permissionErrorMessage % str(e))
+    finally:
+      self.imageInventory.invalidate()
+    buildResult.duration = time.time() - startTime
+    self.lastBuildResult = buildResult
+    if not buildResult.imageId:
+      if not buildResult.shortId:
+        raise exceptions.ImageBuildException("Unexpected server response when building image. Docker did not report the Id of the new image.")
+      # Daemons which are too old to send the aux message only give us the short Id.
+      buildResult.imageId = self.getImageProperties(buildResult.shortId)["Id"]
+    self.user.registry.log(str(buildResult),verbosityLevel=4)
+    return buildResult.imageId
 
   def getInfo(self):
     """
     Returns a dictionary of version info about the running Docker daemon.
     """
-    self.getConnection().request("GET","/v1.13/info")
-    response = self.getConnection().getresponse()
+    response = self.request("GET","/v1.13/info")
     if not response.status == 200:
-      response.read() # Read the response and discard it to prevent the server from getting locked up: https://stackoverflow.com/questions/3231543/python-httplib-responsenotready
       return None
     else:
       return json.loads(response.read().decode("utf-8"))
 
+  def getEvents(self,since,until,filters=None):
+    """
+    Returns the list of events which the Docker daemon has recorded between the unix times since and until, or None if the events could not be retrieved.
+    """
+    queryParameters = {"since":since,"until":until}
+    if filters:
+      queryParameters["filters"] = json.dumps(filters)
+    response = self.request("GET","/v1.13/events?"+urllib.parse.urlencode(queryParameters))
+    if not response.status == 200:
+      return None
+    decoder = BuildStatusDecoder()
+    return decoder.feed(response.read()) + decoder.close()
+
+  def runContainer(self,args,background=False):
+    """
+    Run a container through the Docker daemon's API, given the arguments that would be passed to ``docker run``.
+    If the background argument is True, return the new container's Id as soon as it has started.
+    Otherwise, wait for the container to exit and return its exit code.
+    Raises an ``UnsupportedRunFlagException`` if the arguments cannot be translated, in which case ``execute`` should be used instead.
+    """
+    return EngineApiLauncher(self.user,self).run(args,background=background)
+
   def execute(self,args,cwd=None,background=False,backgroundSuppressOutput=True,backgroundCollectStdout=False,backgroundCollectStderr=False):
     """
     Execute the docker client.
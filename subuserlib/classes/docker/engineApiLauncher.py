@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+The EngineApiLauncher runs containers by talking to the Docker daemon's HTTP API directly, rather than by starting the docker client.
+
+It accepts the same arguments that would be given to ``docker run`` and translates them into a container create request. Only the flags which subuser itself generates are understood. Any other flag raises an ``UnsupportedRunFlagException``, in which case the caller should fall back to the docker client.
+"""
+
+#external imports
+import json
+import os
+import sys
+import struct
+import select
+import signal
+import socket
+import termios
+import tty
+import threading
+import urllib
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+from subuserlib.classes.uhttpConnection import DEFAULT_TIMEOUT
+
+apiVersion = "/v1.30"
+
+memoryUnits = {"b":1,"k":1024,"m":1024**2,"g":1024**3}
+
+def parseMemorySize(size):
+  """
+  Convert a docker memory size such as ``200m`` to a number of bytes.
+
+  >>> from subuserlib.classes.docker.engineApiLauncher import parseMemorySize
+  >>> parseMemorySize("200m")
+  209715200
+  >>> parseMemorySize("1024")
+  1024
+  """
+  size = size.strip().lower()
+  if size and size[-1] in memoryUnits:
+    return int(float(size[:-1])*memoryUnits[size[-1]])
+  return int(size)
+
+def translateRunArguments(args,environment=os.environ):
+  """
+  Translate the arguments of a ``docker run`` command into the body of a container create request.
+  Returns a tuple (createRequestBody,interactive,allocateTty).
+
+  >>> from subuserlib.classes.docker.engineApiLauncher import translateRunArguments
+  >>> body,interactive,allocateTty = translateRunArguments(["run","--rm","-i","-e","HOME=/home/subuser","--volume=/tmp/a:/a:rw","--device=/dev/dri/card0","--net=none","--memory=200m","--entrypoint","/usr/bin/foo","image-id","--bar"])
+  >>> print(json.dumps(body,sort_keys=True,indent=1))
+  {
+   "AttachStderr": true,
+   "AttachStdin": true,
+   "AttachStdout": true,
+   "Cmd": [
+    "--bar"
+   ],
+   "Entrypoint": [
+    "/usr/bin/foo"
+   ],
+   "Env": [
+    "HOME=/home/subuser"
+   ],
+   "HostConfig": {
+    "AutoRemove": true,
+    "Binds": [
+     "/tmp/a:/a:rw"
+    ],
+    "Devices": [
+     {
+      "CgroupPermissions": "rwm",
+      "PathInContainer": "/dev/dri/card0",
+      "PathOnHost": "/dev/dri/card0"
+     }
+    ],
+    "Memory": 209715200,
+    "NetworkMode": "none"
+   },
+   "Image": "image-id",
+   "OpenStdin": true,
+   "StdinOnce": true,
+   "Tty": false
+  }
+  >>> interactive,allocateTty
+  (True, False)
+
+  Flags which we do not know how to translate are refused.
+
+  >>> translateRunArguments(["run","--cap-add=ALL","image-id"])
+  Traceback (most recent call last):
+  ...
+  subuserlib.classes.docker.engineApiLauncher.UnsupportedRunFlagException: --cap-add=ALL
+  """
+  if not args or not args[0] == "run":
+    raise UnsupportedRunFlagException(" ".join(args[:1]))
+  body = {"Env":[],"AttachStdout":True,"AttachStderr":True,"Tty":False,"OpenStdin":False,"StdinOnce":False,"AttachStdin":False}
+  hostConfig = {}
+  body["HostConfig"] = hostConfig
+  flagsWithValues = ["-e","--env","-v","--volume","--device","--memory","--cpus","--workdir","-w","--net","--network","--user","-u","--hostname","-h","--entrypoint","--cidfile"]
+  arguments = list(args[1:])
+  while arguments:
+    argument = arguments.pop(0)
+    if not argument.startswith("-"):
+      body["Image"] = argument
+      body["Cmd"] = arguments
+      break
+    if "=" in argument and argument.startswith("--"):
+      flag,value = argument.split("=",1)
+    elif argument in flagsWithValues:
+      flag = argument
+      if not arguments:
+        raise UnsupportedRunFlagException(argument)
+      value = arguments.pop(0)
+    else:
+      flag,value = argument,None
+    if flag == "--rm" and value is None:
+      hostConfig["AutoRemove"] = True
+    elif flag in ["-i","--interactive"] and value is None:
+      body["OpenStdin"] = body["StdinOnce"] = body["AttachStdin"] = True
+    elif flag in ["-t","--tty"] and value is None:
+      body["Tty"] = True
+    elif flag in ["-e","--env"]:
+      if not "=" in value:
+        if not value in environment:
+          continue
+        value = value+"="+environment[value]
+      body["Env"].append(value)
+    elif flag in ["-v","--volume"]:
+      hostConfig.setdefault("Binds",[]).append(value)
+    elif flag == "--device":
+      parts = value.split(":")
+      hostConfig.setdefault("Devices",[]).append({"PathOnHost":parts[0],"PathInContainer":parts[1] if len(parts) > 1 else parts[0],"CgroupPermissions":parts[2] if len(parts) > 2 else "rwm"})
+    elif flag == "--memory":
+      hostConfig["Memory"] = parseMemorySize(value)
+    elif flag == "--cpus":
+      hostConfig["NanoCpus"] = int(float(value)*10**9)
+    elif flag in ["--workdir","-w"]:
+      body["WorkingDir"] = value
+    elif flag in ["--net","--network"]:
+      hostConfig["NetworkMode"] = value
+    elif flag in ["--user","-u"]:
+      body["User"] = value
+    elif flag in ["--hostname","-h"]:
+      body["Hostname"] = value
+    elif flag == "--entrypoint":
+      body["Entrypoint"] = [value]
+    elif flag == "--privileged" and value is None:
+      hostConfig["Privileged"] = True
+    elif flag == "--cidfile":
+      # The container's Id is returned directly, so there is no need for a cid file.
+      pass
+    else:
+      raise UnsupportedRunFlagException(argument)
+  if not "Image" in body:
+    raise UnsupportedRunFlagException("No image given.")
+  return (body,body["OpenStdin"],body["Tty"])
+
+class EngineApiLauncher(UserOwnedObject):
+  def __init__(self,user,dockerDaemon):
+    self.dockerDaemon = dockerDaemon
+    UserOwnedObject.__init__(self,user)
+
+  def __request(self,method,url,body=None,timeout=DEFAULT_TIMEOUT):
+    headers = {}
+    if body is not None:
+      body = json.dumps(body).encode("utf-8")
+      headers["Content-Type"] = "application/json"
+    return self.dockerDaemon.request(method,apiVersion+url,body=body,headers=headers,timeout=timeout)
+
+  def createContainer(self,createRequestBody):
+    """
+    Create a container and return its Id.
+    """
+    response = self.__request("POST","/containers/create",body=createRequestBody)
+    if not response.status == 201:
+      raise ContainerLaunchException("Creating container failed.\n"+response.read().decode("utf-8","replace"))
+    return json.loads(response.read().decode("utf-8"))["Id"]
+
+  def startContainer(self,containerId):
+    # Starting a container can take a long time when its volumes have to be set up.
+    response = self.__request("POST","/containers/"+containerId+"/start",timeout=None)
+    if not response.status in [204,304]:
+      raise ContainerLaunchException("Starting container failed.\n"+response.read().decode("utf-8","replace"))
+
+  def resizeContainerTty(self,containerId):
+    try:
+      columns,lines = os.get_terminal_size(sys.stdout.fileno())
+    except OSError:
+      return
+    self.__request("POST","/containers/"+containerId+"/resize?"+urllib.parse.urlencode({"h":lines,"w":columns}))
+
+  def killContainer(self,containerId,signum):
+    """
+    Send the signal with the given number to the container's main process.
+    """
+    self.__request("POST","/containers/"+containerId+"/kill?"+urllib.parse.urlencode({"signal":signal.Signals(signum).name}))
+
+  def run(self,args,background=False):
+    """
+    Run a container given the arguments of a ``docker run`` command.
+    If background is True, return the new container's Id as soon as it has started.
+    Otherwise, forward the terminal to the container until it exits and return its exit code.
+    """
+    (createRequestBody,interactive,allocateTty) = translateRunArguments(args)
+    if background:
+      createRequestBody["AttachStdin"] = createRequestBody["AttachStdout"] = createRequestBody["AttachStderr"] = False
+      containerId = self.createContainer(createRequestBody)
+      self.startContainer(containerId)
+      return containerId
+    containerId = self.createContainer(createRequestBody)
+    connectionPool = self.dockerDaemon.getConnectionPool()
+    # Once attached, the connection no longer speaks HTTP, so it cannot go back to the pool.
+    with connectionPool.connection(timeout=None,reusable=False) as attachConnection, connectionPool.connection(timeout=None) as waitConnection:
+      attachConnection.request("POST",apiVersion+"/containers/"+containerId+"/attach?"+urllib.parse.urlencode({"stream":1,"stdin":int(interactive),"stdout":1,"stderr":1}),headers={"Connection":"Upgrade","Upgrade":"tcp"})
+      attachResponse = attachConnection.getresponse()
+      if not attachResponse.status in [101,200]:
+        raise ContainerLaunchException("Attaching to container failed.\n"+attachResponse.read().decode("utf-8","replace"))
+      # The wait request is sent before the container is started, so that the exit code cannot be missed even if the container is removed right away.
+      waitConnection.request("POST",apiVersion+"/containers/"+containerId+"/wait?"+urllib.parse.urlencode({"condition":"next-exit"}))
+      self.startContainer(containerId)
+      previousSigwinchHandler = None
+      if allocateTty and sys.stdout.isatty():
+        self.resizeContainerTty(containerId)
+        previousSigwinchHandler = signal.signal(signal.SIGWINCH,lambda signum,frame: self.resizeContainerTty(containerId))
+      previousSignalHandlers = {}
+      if not allocateTty and threading.current_thread() is threading.main_thread():
+        # Without a tty, Ctrl-C and friends reach us rather than the container, so we pass them on. Otherwise the container would keep running after we had exited.
+        for signum in [signal.SIGINT,signal.SIGTERM]:
+          previousSignalHandlers[signum] = signal.signal(signum,lambda signum,frame: self.killContainer(containerId,signum))
+      try:
+        self.forwardStreams(attachConnection.sock,attachResponse,interactive,allocateTty)
+      finally:
+        if previousSigwinchHandler is not None:
+          signal.signal(signal.SIGWINCH,previousSigwinchHandler)
+        for signum,previousSignalHandler in previousSignalHandlers.items():
+          signal.signal(signum,previousSignalHandler)
+        attachConnection.close()
+      waitResponse = waitConnection.getresponse()
+      waitResult = waitResponse.read()
+    if not waitResponse.status == 200:
+      raise ContainerLaunchException("Waiting for container failed.\n"+waitResult.decode("utf-8","replace"))
+    return json.loads(waitResult.decode("utf-8"))["StatusCode"]
+
+  def forwardStreams(self,sock,attachResponse,interactive,allocateTty):
+    """
+    Copy our stdin to the container and the container's output to our stdout and stderr until the container closes its end of the connection.
+    """
+    def copyOutput():
+      output = attachResponse.fp
+      while True:
+        if allocateTty:
+          chunk = output.read1(65536)
+          if not chunk:
+            return
+          sys.stdout.buffer.write(chunk)
+          sys.stdout.buffer.flush()
+        else:
+          # Without a tty, Docker multiplexes stdout and stderr. Each frame has an 8 byte header: the stream number, three bytes of padding and the length of the payload.
+          header = output.read(8)
+          if len(header) < 8:
+            return
+          streamNumber,length = struct.unpack(">BxxxL",header)
+          payload = output.read(length)
+          stream = sys.stderr.buffer if streamNumber == 2 else sys.stdout.buffer
+          stream.write(payload)
+          stream.flush()
+    outputThread = threading.Thread(target=copyOutput,daemon=True)
+    outputThread.start()
+    if not interactive:
+      outputThread.join()
+      return
+    stdinFd = sys.stdin.fileno()
+    terminalSettings = None
+    if allocateTty and os.isatty(stdinFd):
+      terminalSettings = termios.tcgetattr(stdinFd)
+      tty.setraw(stdinFd)
+    try:
+      while outputThread.is_alive():
+        readable,_,_ = select.select([stdinFd],[],[],0.1)
+        if not readable:
+          continue
+        data = os.read(stdinFd,65536)
+        if not data:
+          # Let the container know that its stdin has ended.
+          sock.shutdown(socket.SHUT_WR)
+          outputThread.join()
+          break
+        sock.sendall(data)
+    finally:
+      if terminalSettings is not None:
+        termios.tcsetattr(stdinFd,termios.TCSADRAIN,terminalSettings)
+
+class UnsupportedRunFlagException(Exception):
+  pass
+
+class ContainerLaunchException(Exception):
+  pass
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+The ImageInventory is an in-memory index of every image known to the Docker daemon.
+
+It is filled with a single request for the daemon's full image list, rather than inspecting images one at a time, and is refreshed lazily after images have been built or removed.
+"""
+
+#external imports
+#import ...
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+
+class ImageInventory(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+    self.__index = None
+
+  def invalidate(self):
+    """
+    Forget the current inventory. It will be fetched again the next time it is queried.
+    """
+    self.__index = None
+
+  def __getIndex(self):
+    if self.__index is None:
+      index = {}
+      for imageProperties in self.user.dockerDaemon.getImageList():
+        imageId = imageProperties["Id"]
+        index[imageId] = imageProperties
+        if imageId.startswith("sha256:"):
+          index[imageId[len("sha256:"):]] = imageProperties
+        for tag in imageProperties.get("RepoTags") or []:
+          index[tag] = imageProperties
+      self.__index = index
+    return self.__index
+
+  def getImageProperties(self,imageTagOrId):
+    """
+    Returns a dictionary with the Id, Parent, Created and Size properties of the image, or None if the image does not exist.
+    """
+    return self.__getIndex().get(imageTagOrId)
+
+  def __contains__(self,imageTagOrId):
+    return imageTagOrId in self.__getIndex()
+
+  def getLineage(self,imageId):
+    """
+    Return the list of image ids which goes from a base image to the given image, including all of the image's ancestors in order of dependency.
+    Returns [] if the image does not exist.
+    """
+    lineage = []
+    imageProperties = self.getImageProperties(imageId)
+    while imageProperties is not None:
+      lineage.append(imageId)
+      imageId = imageProperties["Parent"]
+      if not imageId:
+        break
+      imageProperties = self.getImageProperties(imageId)
+    lineage.reverse()
+    return lineage
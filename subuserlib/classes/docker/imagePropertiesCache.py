@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""
+The ImagePropertiesCache keeps the results of image inspections on disk, so that they can be shared between subuser processes.
+
+The properties of an image with a given full Id never change, so they are stored in one file per image Id. Lookups by tag or short Id go through a tag index. Both are checked against the Docker daemon's event log once per process, so that images which have since been deleted, and tags which have since been moved, are forgotten. The daemon forgets its events when it is restarted, so they are also checked against the daemon's current list of images.
+
+Files are replaced atomically, so concurrent readers always see either the old or the new version of a file.
+
+>>> import os
+>>> from subuserlib.classes.user import User
+>>> from subuserlib.classes.docker.imagePropertiesCache import ImagePropertiesCache
+>>> user = User()
+>>> dockerDaemon = user.dockerDaemon
+>>> dockerDaemon.getInfo = lambda: {"ID":"test-daemon"}
+>>> images = [{"Id":"1","Parent":"","Created":"0","RepoTags":["foo:latest"]},{"Id":"2","Parent":"1","Created":"1","RepoTags":[]}]
+>>> dockerDaemon.getImageList = lambda: images
+>>> events = []
+>>> dockerDaemon.getEvents = lambda since,until,filters=None: events
+
+Properties which are stored are found again by later processes.
+
+>>> ImagePropertiesCache(user).store("foo:latest",{"Id":"1","Parent":""})
+>>> ImagePropertiesCache(user).store("2",{"Id":"2","Parent":"1"})
+>>> ImagePropertiesCache(user).get("foo:latest")
+{'Id': '1', 'Parent': ''}
+
+Images which the daemon reports as deleted are forgotten.
+
+>>> events = [{"Action":"delete","id":"1"}]
+>>> cache = ImagePropertiesCache(user)
+>>> cache.get("foo:latest") is None
+True
+>>> os.path.exists(cache.getImagePath("1")),os.path.exists(cache.getImagePath("2"))
+(False, True)
+
+If the daemon sends as many events as it remembers, some may have been lost, so everything is forgotten.
+
+>>> events = [{"Action":"pull","id":"3"}] * 256
+>>> ImagePropertiesCache(user).get("2") is None
+True
+
+Images which have disappeared while the daemon's events were lost, for example because it was restarted, are forgotten as well.
+
+>>> events = []
+>>> ImagePropertiesCache(user).store("2",{"Id":"2","Parent":"1"})
+>>> ImagePropertiesCache(user).get("2")
+{'Id': '2', 'Parent': '1'}
+>>> images = images[:1]
+>>> dockerDaemon.imageInventory.invalidate()
+>>> ImagePropertiesCache(user).get("2") is None
+True
+"""
+
+#external imports
+import os
+import re
+import json
+import time
+import threading
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+
+# The Docker daemon only remembers this many events. If we are sent this many, some may have been lost.
+maxEvents = 256
+
+class ImagePropertiesCache(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+    self.__state = None
+    # Images may be removed from several threads at once.
+    self.__lock = threading.RLock()
+
+  @property
+  def cacheDir(self):
+    return self.user.config["image-properties-cache"]
+
+  @property
+  def statePath(self):
+    return os.path.join(self.cacheDir,"state.json")
+
+  def getImagePath(self,imageId):
+    if imageId.startswith("sha256:"):
+      imageId = imageId[len("sha256:"):]
+    return os.path.join(self.cacheDir,"images",imageId+".json")
+
+  def isFullImageId(self,imageTagOrId):
+    return re.match(r"^(sha256:)?[0-9a-f]{64}$",imageTagOrId) is not None
+
+  def __writeAtomically(self,path,contents):
+    directory = os.path.dirname(path)
+    self.user.endUser.makedirs(directory)
+    temporaryPath = path+"."+str(os.getpid())+"."+str(threading.get_ident())+".tmp"
+    with self.user.endUser.get_file(temporaryPath,mode="w") as temporaryFile:
+      json.dump(contents,temporaryFile)
+    os.rename(temporaryPath,path)
+
+  def __loadState(self):
+    try:
+      with open(self.statePath,"r") as stateFile:
+        return json.load(stateFile)
+    except (OSError,ValueError):
+      return None
+
+  def __saveState(self):
+    try:
+      self.__writeAtomically(self.statePath,self.__state)
+    except OSError:
+      pass
+
+  def clear(self):
+    """
+    Forget everything that is cached.
+    """
+    imagesDir = os.path.join(self.cacheDir,"images")
+    try:
+      for imageFile in os.listdir(imagesDir):
+        try:
+          os.remove(os.path.join(imagesDir,imageFile))
+        except OSError:
+          pass
+    except OSError:
+      pass
+    if self.__state is not None:
+      self.__state["tags"] = {}
+
+  def validate(self):
+    """
+    Bring the cache up to date with the changes which have happened to the Docker daemon's images since the cache was last used.
+    This only does any work the first time it is called in a given process.
+    """
+    with self.__lock:
+      if self.__state is None:
+        self.__validate()
+
+  def __validate(self):
+    info = self.user.dockerDaemon.getInfo() or {}
+    daemonId = info.get("ID")
+    now = int(time.time())
+    state = self.__loadState()
+    self.__state = {"daemon-id":daemonId,"last-checked":now,"tags":{}}
+    if state is None or daemonId is None or not state.get("daemon-id") == daemonId:
+      self.clear()
+    else:
+      self.__state["tags"] = state.get("tags",{})
+      events = self.user.dockerDaemon.getEvents(since=state.get("last-checked",0),until=now,filters={"type":["image"]})
+      if events is None or len(events) >= maxEvents:
+        self.clear()
+      else:
+        for event in events:
+          action = event.get("Action",event.get("status"))
+          if action == "delete":
+            self.forget(event.get("id",""))
+          if action in ("delete","tag","untag","import","load","pull"):
+            self.__state["tags"] = {}
+        self.__forgetMissingImages()
+    self.__saveState()
+
+  def __forgetMissingImages(self):
+    """
+    Forget the images which are no longer in the Docker daemon's image list, and the tags which no longer point to the image that they pointed to.
+    Unlike the event log, the image list survives restarts of the daemon.
+    """
+    imageInventory = self.user.dockerDaemon.imageInventory
+    imagesDir = os.path.join(self.cacheDir,"images")
+    try:
+      imageFiles = os.listdir(imagesDir)
+    except OSError:
+      imageFiles = []
+    for imageFile in imageFiles:
+      if imageFile.endswith(".json") and not imageFile[:-len(".json")] in imageInventory:
+        try:
+          os.remove(os.path.join(imagesDir,imageFile))
+        except OSError:
+          pass
+    for tag,imageId in list(self.__state["tags"].items()):
+      imageProperties = imageInventory.getImageProperties(tag)
+      if imageProperties is None and imageId in imageInventory and imageId.replace("sha256:","").startswith(tag.replace("sha256:","")):
+        # Short Ids are not in the image list.
+        continue
+      if imageProperties is None or not imageProperties["Id"] == imageId:
+        del self.__state["tags"][tag]
+
+  def get(self,imageTagOrId):
+    """
+    Returns the cached properties of the image, or None if the image is not in the cache.
+    """
+    self.validate()
+    imageId = imageTagOrId
+    if not self.isFullImageId(imageTagOrId):
+      imageId = self.__state["tags"].get(imageTagOrId)
+      if imageId is None:
+        return None
+    try:
+      with open(self.getImagePath(imageId),"r") as imageFile:
+        return json.load(imageFile)
+    except (OSError,ValueError):
+      return None
+
+  def store(self,imageTagOrId,properties):
+    """
+    Add the properties of an image to the cache.
+    """
+    self.validate()
+    try:
+      self.__writeAtomically(self.getImagePath(properties["Id"]),properties)
+    except OSError:
+      return
+    if not self.isFullImageId(imageTagOrId):
+      with self.__lock:
+        self.__state["tags"][imageTagOrId] = properties["Id"]
+        self.__saveState()
+
+  def forget(self,imageId):
+    """
+    Remove the image from the cache.
+    """
+    try:
+      os.remove(self.getImagePath(imageId))
+    except OSError:
+      pass
+    with self.__lock:
+      if self.__state is not None:
+        for tag,taggedImageId in list(self.__state["tags"].items()):
+          if taggedImageId == imageId:
+            del self.__state["tags"][tag]
+        self.__saveState()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+
+"""
+In order to make our test suit work, we must use a MockAsyncDockerDaemon rather than communicating with a real Docker instance.
+
+It shares its images with the user's ``MockDockerDaemon``. Requests which the real ``AsyncDockerDaemon`` sends are answered by a mock transport, so that the real request and response handling is still exercised.
+
+>>> from subuserlib.classes.user import User
+>>> from subuserlib.classes.docker.asyncDockerDaemon import runConcurrently
+>>> user = User()
+>>> asyncDockerDaemon = user.asyncDockerDaemon
+>>> runConcurrently(asyncDockerDaemon.stopContainer("client"),asyncDockerDaemon.stopContainer("server"),asyncDockerDaemon.inspectContainer("client"))
+[None, None, None]
+>>> runConcurrently(asyncDockerDaemon.getImageProperties("no-such-image"),asyncDockerDaemon.getEvents(0,1))
+[None, []]
+"""
+
+#external imports
+import json
+import re
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+import subuserlib.classes.docker.asyncDockerDaemon
+from subuserlib.classes.docker.mockDockerDaemon import MockResponse
+
+class MockAsyncDockerDaemon(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+    self.asyncDockerDaemon = subuserlib.classes.docker.asyncDockerDaemon.RealAsyncDockerDaemon(user)
+    self.asyncDockerDaemon.openResponse = self.openResponse
+
+  async def openResponse(self,method,url,body=None,headers=None):
+    # Consume streamed request bodies just like the real transport would.
+    if body is not None and not isinstance(body,(bytes,str)) and not hasattr(body,"read"):
+      async for _ in subuserlib.classes.docker.asyncDockerDaemon.iterateInExecutor(body):
+        pass
+    path = url.split("?")[0]
+    mockDockerDaemon = self.user.dockerDaemon
+    if path.endswith("/build"):
+      return MockAsyncResponse(200,MockResponse(mockDockerDaemon).body)
+    match = re.match(r"^/v[0-9.]+/images/(.+)/json$",path)
+    if match:
+      imageProperties = mockDockerDaemon.getImageProperties(match.group(1))
+      if imageProperties is None:
+        return MockAsyncResponse(404,b"")
+      return MockAsyncResponse(200,json.dumps(imageProperties).encode("utf-8"))
+    if path.endswith("/events"):
+      return MockAsyncResponse(200,b"")
+    if path.startswith("/v1.13/containers/") and method == "GET":
+      # There are never any containers in the mock Docker daemon.
+      return MockAsyncResponse(404,b"")
+    if "/containers/" in path and "/stats" in path:
+      return MockAsyncResponse(404,b"")
+    return MockAsyncResponse(204,b"")
+
+  @property
+  def lastBuildResult(self):
+    return self.asyncDockerDaemon.lastBuildResult
+
+  async def getImageProperties(self,imageTagOrId):
+    return await self.asyncDockerDaemon.getImageProperties(imageTagOrId)
+
+  async def getImageList(self):
+    return self.user.dockerDaemon.getImageList()
+
+  async def removeImage(self,imageId):
+    self.user.dockerDaemon.removeImage(imageId)
+
+  async def build(self,relativeBuildContextPath=None,repositoryFileStructure=None,useCache=True,rm=True,forceRm=True,quiet=False,tag=None,dockerfile=None,quietClient=False):
+    self.user.dockerDaemon.addImage(dockerfile)
+    return await self.asyncDockerDaemon.build(relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,useCache=useCache,rm=rm,forceRm=forceRm,quiet=quiet,tag=tag,dockerfile=dockerfile,quietClient=quietClient)
+
+  async def inspectContainer(self,containerId):
+    return await self.asyncDockerDaemon.inspectContainer(containerId)
+
+  async def stopContainer(self,containerId):
+    await self.asyncDockerDaemon.stopContainer(containerId)
+
+  async def removeContainer(self,containerId,force=False):
+    await self.asyncDockerDaemon.removeContainer(containerId,force=force)
+
+  async def getContainerStats(self,containerId):
+    return await self.asyncDockerDaemon.getContainerStats(containerId)
+
+  async def getEvents(self,since,until,filters=None):
+    return await self.asyncDockerDaemon.getEvents(since,until,filters=filters)
+
+class MockAsyncResponse():
+  def __init__(self,status,body):
+    self.status = status
+    self.reason = ""
+    self.headers = {}
+    self.body = body
+
+  async def iterChunks(self):
+    # Hand the body out in small pieces so that readers have to cope with messages which are split between chunks.
+    for position in range(0,len(self.body),16):
+      yield self.body[position:position+16]
+
+  async def read(self):
+    return self.body
+
+  def close(self):
+    pass
@@ -8,10 +8,14 @@ In order to make our test suit work, we must use a MockDockerDaemon rather than
 #external imports
 import json
 import os
+import threading
 from collections import OrderedDict
+from contextlib import contextmanager
 #internal imports
 from subuserlib.classes.userOwnedObject import UserOwnedObject
 import subuserlib.classes.docker.dockerDaemon
+import subuserlib.classes.docker.engineApiLauncher
+from subuserlib.classes.docker.imageInventory import ImageInventory
 import subuserlib.print
 
 class MockDockerDaemon(UserOwnedObject):
@@ -19,24 +23,35 @@ class MockDockerDaemon(UserOwnedObject):
     self.images = {}
     self.nextImageId = 1
     self.newId = None
+    self.lock = threading.Lock()
     UserOwnedObject.__init__(self,user)
     self.imagesPath = os.path.join(user.homeDir,"docker/images.json")
+    self.imageInventory = ImageInventory(user)
     self.__load()
     self.dockerDaemon = subuserlib.classes.docker.dockerDaemon.RealDockerDaemon(user)
-    self.connection = MockConnection(self)
-    self.dockerDaemon.getConnection = self.getConnection
+    self.connectionPool = MockConnectionPool(self)
+    self.dockerDaemon.getConnectionPool = self.getConnectionPool
     self.dockerDaemon.getImageProperties = self.getImageProperties
 
   def __load(self):
+    # Tests which run outside of the test directory start out without any images.
+    if not os.path.exists(self.imagesPath):
+      self.images = OrderedDict()
+      return
     with open(self.imagesPath,"r") as imagesFile:
       self.images = json.load(imagesFile, object_pairs_hook=OrderedDict)
 
   def __save(self):
+    os.makedirs(os.path.dirname(self.imagesPath),exist_ok=True)
     with open(self.imagesPath,"w") as imagesFile:
       json.dump(self.images,imagesFile)
 
-  def getConnection(self):
-    return self.connection
+  def getConnectionPool(self):
+    return self.connectionPool
+
+  @property
+  def lastBuildResult(self):
+    return self.dockerDaemon.lastBuildResult
 
   def getImageProperties(self,imageTagOrId):
     """
@@ -47,10 +62,21 @@ class MockDockerDaemon(UserOwnedObject):
     else:
       return None
 
+  def getImageList(self):
+    return list(self.images.values())
+
   def build(self,relativeBuildContextPath=None,repositoryFileStructure=None,useCache=True,rm=True,forceRm=True,quiet=False,quietClient=False,tag=None,dockerfile=None):
     """
     Build a Docker image.  If a the dockerfile argument is set to a string, use that string as the Dockerfile.  Return the newly created images Id or raises an exception if the build fails.
     """
+    self.addImage(dockerfile)
+    self.dockerDaemon.build(relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,useCache=useCache,rm=rm,forceRm=forceRm,quiet=quiet,tag=tag,dockerfile=dockerfile,quietClient=quietClient)
+    return self.newId
+
+  def addImage(self,dockerfile):
+    """
+    Add the image which the dockerfile would build to our list of images. Its Id is stored in ``newId``.
+    """
     while str(self.nextImageId) in self.images:
       self.nextImageId = self.nextImageId+1
     self.newId = str(self.nextImageId)
@@ -59,16 +85,27 @@ class MockDockerDaemon(UserOwnedObject):
       parent = ""
     self.images[self.newId] = {"Id":self.newId,"Parent":parent,"Created":str(len(self.images))}
     self.__save()
-    self.dockerDaemon.build(relativeBuildContextPath=relativeBuildContextPath,repositoryFileStructure=repositoryFileStructure,useCache=useCache,rm=rm,forceRm=forceRm,quiet=quiet,tag=tag,dockerfile=dockerfile,quietClient=quietClient)
-    return self.newId
+    self.imageInventory.invalidate()
 
   def removeImage(self,imageId):
-    del self.images[imageId]
-    self.__save()
+    with self.lock:
+      del self.images[imageId]
+      self.__save()
+      self.imageInventory.invalidate()
 
   def getInfo(self):
     return {"Foo":"bar"}
 
+  def getEvents(self,since,until,filters=None):
+    return []
+
+  def runContainer(self,args,background=False):
+    (createRequestBody,_,_) = subuserlib.classes.docker.engineApiLauncher.translateRunArguments(args)
+    subuserlib.print.printWithoutCrashing("Create container: "+json.dumps(createRequestBody,sort_keys=True))
+    if background:
+      return "<container-id>"
+    return 0
+
   def execute(self,args,cwd=None,background=False,backgroundSuppressOutput=True,backgroundCollectStdout=False,backgroundCollectStderr=False):
     subuserlib.print.printWithoutCrashing("Execute docker with args: "+str(args))
     subuserlib.print.printWithoutCrashing("Cwd:"+str(cwd))
@@ -77,7 +114,7 @@ class MockResponse():
   def __init__(self,mockDockerDaemon):
     self.mockDockerDaemon = mockDockerDaemon
     self.status = 200
-    self.body = b"{\"stream\":\"Building"+"→→→".encode("utf-8")+b"\"}\n{\"stream\":\"Building...\"}\n{\"stream\":\"Building...\"}\n{\"stream\":\"Successfully built "+mockDockerDaemon.newId.encode("utf-8")+b"\"}"
+    self.body = b"{\"stream\":\"Building"+"→→→".encode("utf-8")+b"\"}\n{\"stream\":\"Building...\"}\n{\"stream\":\"Building...\"}\n{\"aux\":{\"ID\":\""+mockDockerDaemon.newId.encode("utf-8")+b"\"}}\n{\"stream\":\"Successfully built "+mockDockerDaemon.newId.encode("utf-8")+b"\"}"
 
   def read(self,bytes=None):
     if bytes:
@@ -87,13 +124,29 @@ class MockResponse():
     else:
       return self.body
 
+class MockConnectionPool():
+  def __init__(self,mockDockerDaemon):
+    self.mockDockerDaemon = mockDockerDaemon
+
+  @contextmanager
+  def connection(self,timeout=None,reusable=True):
+    yield MockConnection(self.mockDockerDaemon)
+
+  def request(self,method,url,body=None,headers=None,timeout=None):
+    connection = MockConnection(self.mockDockerDaemon)
+    connection.request(method,url,body=body,headers=headers)
+    return connection.getresponse()
+
 class MockConnection():
   def __init__(self,mockDockerDaemon):
     self.mockDockerDaemon = mockDockerDaemon
     self.newId = None
 
   def request(self,method,url,body=None,headers=None):
-    pass
+    # Consume streamed request bodies just like http.client would.
+    if body is not None and not isinstance(body,(bytes,str)) and not hasattr(body,"read"):
+      for _ in body:
+        pass
 
   def getresponse(self):
     return MockResponse(self.mockDockerDaemon)
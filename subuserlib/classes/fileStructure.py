@@ -7,16 +7,34 @@ A file structure object is a read only view of a file structure, such as a real
 
 #external imports
 import abc
+import codecs
+import collections
+import contextlib
 import hashlib
+import json
 import os
 import stat
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 #internal imports
 import subuserlib.test
 import subuserlib.print
 if subuserlib.test.testing:
   hashtestDir = subuserlib.test.hashtestDir
 
+# Files are read in pieces of this many bytes when they are streamed.
+chunkSize = 1024*1024
+
+# The most files which are read at the same time while hashing a directory.
+maxHashWorkers = 2
+# The most files, each no larger than chunkSize, which are held in memory while waiting to be hashed.
+maxReadAheadFiles = 16
+
+# Files modified this recently may be modified again without their timestamps changing, so their stats cannot yet be trusted to identify their contents.
+racyInterval = 2
+
 class FileStructure():
   __metaclass__ = abc.ABCMeta
 
@@ -86,6 +104,18 @@ class FileStructure():
   def _readBinary(self,path):
     pass
 
+  def iterChunks(self,path,chunkSize=chunkSize):
+    """
+    Yield the contents of the given file in pieces of at most chunkSize bytes, so that large files need not be held in memory as a whole.
+    """
+    self.assertLegalPath(path)
+    return self._iterChunks(path,chunkSize)
+
+  def _iterChunks(self,path,chunkSize):
+    contents = self.readBinary(path)
+    for position in range(0,len(contents),chunkSize):
+      yield contents[position:position+chunkSize]
+
   @abc.abstractmethod
   def getMode(self,path):
    self.assertLegalPath(path)
@@ -99,6 +129,12 @@ class FileStructure():
   def _getSize(self,path):
     pass
 
+  def prefetch(self,path):
+    """
+    Hint that all of the files in the given directory are about to be read, so that they may be loaded in bulk ahead of time. File structures whose files are always readily available do nothing.
+    """
+    pass
+
   @abc.abstractmethod
   def isLegalSymlink(self,path):
     """
@@ -151,6 +187,24 @@ class FileStructure():
     if not self.isLegalSymlink(path):
       raise IOError(path + " in file structure at "+self.path+" is a symlink which points outside of the filestructure which is not allowed.")
 
+  @contextlib.contextmanager
+  def snapshot(self):
+    """
+    Within the with block, the file structure may assume that its files do not change, so that it can answer repeated questions about the same files from what it has already read. File structures which cannot change do nothing.
+    """
+    yield
+
+  def getContentId(self,path):
+    """
+    Return an identifier which changes whenever the contents of the file or directory at path change.
+    Returns None if the file structure has no cheap way of telling when its contents change.
+    """
+    self.assertLegalPath(path)
+    return self._getContentId(path)
+
+  def _getContentId(self,path):
+    return None
+
   def getModeString(self,path):
     """
     Return the human readable mode string for the mode in octal notation.
@@ -183,33 +237,63 @@ class FileStructure():
     >>> fileStructure.hash("./")
     'b0cd63dd96b76d7a9c61e434b43f0eea408c2dd14dca1f436be0a56bf1f91aa75f4406b9fe9fb2025b84e3445f747a2680d56ca92f5b4fc28a98d8f70586cf15'
     """
+    with self.snapshot():
+      return self.__hash(path,printDebugOutput)
+
+  def __hash(self,path,printDebugOutput):
     self.assertLegalPath(path)
+    self.prefetch(path)
     hashFunction = hashlib.sha512
     hash = hashFunction()
     # TODO - what about symlinks?
     # TODO - what about devices?
     # TODO - what about sockets?
     # TODO - what about named pipes?
-    def hashFile(path):
-      file_metadata_string = str(len(path))+" "+path+" "+str(self.getSize(path))+" "
+    def hashFile(path,size,contents):
+      file_metadata_string = str(len(path))+" "+path+" "+str(size)+" "
       hash.update(file_metadata_string.encode("utf-8"))
-      hash.update(self.readBinary(path))
+      if printDebugOutput:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        debugOutput = [file_metadata_string]
+      chunks = [contents] if contents is not None else self.iterChunks(path)
+      for chunk in chunks:
+        hash.update(chunk)
+        if printDebugOutput:
+          debugOutput.append(decoder.decode(chunk))
       hash.update("\n".encode("utf-8"))
       if printDebugOutput:
-        subuserlib.print.printWithoutCrashing(file_metadata_string.encode("utf-8").decode("utf-8")+self.readBinary(path).decode("utf-8","replace"))
-    def hashDir(path):
-      # Hash subdirectories
+        debugOutput.append(decoder.decode(b"",final=True))
+        subuserlib.print.printWithoutCrashing("".join(debugOutput))
+    filesToHash = []
+    def listDir(path):
+      # Subdirectories are hashed first
       subdirs = self.lsFolders(path)
       subdirs.sort()
       for subdir in subdirs:
         if subdir != ".git":
-          hashDir(os.path.join(path,subdir))
-      # Hash files
+          listDir(os.path.join(path,subdir))
+      # Then files
       files = self.lsFiles(path)
       files.sort()
       for fileToHash in files:
-        hashFile(os.path.join(path,fileToHash))
-    hashDir(path)
+        filesToHash.append(os.path.join(path,fileToHash))
+    listDir(path)
+    # The files have to be fed to the hash one after another, but they can be read ahead of time in parallel. Large files are streamed when their turn comes, so that only a bounded amount of data is ever read ahead.
+    def readFile(path):
+      size = self.getSize(path)
+      if size is not None and size <= chunkSize:
+        return (size,self.readBinary(path))
+      return (size,None)
+    with ThreadPoolExecutor(max_workers=maxHashWorkers) as executor:
+      readAhead = collections.deque()
+      for fileToHash in filesToHash:
+        readAhead.append((fileToHash,executor.submit(readFile,fileToHash)))
+        if len(readAhead) >= maxReadAheadFiles:
+          (fileToHash,read) = readAhead.popleft()
+          hashFile(fileToHash,*read.result())
+      while readAhead:
+        (fileToHash,read) = readAhead.popleft()
+        hashFile(fileToHash,*read.result())
     return hash.hexdigest()
 
 class BasicFileStructure(FileStructure):
@@ -220,6 +304,105 @@ class BasicFileStructure(FileStructure):
     self.path = path
     if not os.path.exists(path):
       raise FileNotFoundError(path+" does not exist.")
+    self.__snapshot = None
+    self.__snapshotDepth = 0
+    self.__snapshotLock = threading.Lock()
+
+  @contextlib.contextmanager
+  def snapshot(self):
+    """
+    Within the with block, each directory is scanned only once, with ``os.scandir``. The types, sizes and modes of its entries, and whether they are symlinks which point out of the file structure, are all answered from that scan rather than by a ``stat`` for each question.
+
+    >>> from subuserlib.classes.fileStructure import FileStructure
+    >>> fileStructure = BasicFileStructure(subuserlib.classes.fileStructure.hashtestDir)
+    >>> with fileStructure.snapshot():
+    ...   print(",".join(fileStructure.lsFiles("./bar")))
+    ...   print(fileStructure.getSize("./bar/abacus"))
+    ...   print(fileStructure.exists("./bar/non-existant"))
+    New York,abacus
+    7
+    False
+    """
+    with self.__snapshotLock:
+      if self.__snapshotDepth == 0:
+        self.__snapshot = {}
+      self.__snapshotDepth += 1
+    try:
+      yield
+    finally:
+      with self.__snapshotLock:
+        self.__snapshotDepth -= 1
+        if self.__snapshotDepth == 0:
+          self.__snapshot = None
+
+  def __scanDir(self,subfolder):
+    """
+    Returns a tuple (realDirectory,entries) where entries is a dictionary of tuples (stat,isLegal) by name. The stat is None for entries, such as broken symlinks, which cannot be stat'ed.
+    Returns None if no snapshot is being taken, or if the directory cannot be scanned.
+    """
+    snapshot = self.__snapshot
+    if snapshot is None:
+      return None
+    if subfolder in snapshot:
+      return snapshot[subfolder]
+    directory = self.getPathInStructure(subfolder)
+    try:
+      realDirectory = os.path.realpath(directory)
+      entries = {}
+      with os.scandir(directory) as scan:
+        for entry in scan:
+          try:
+            entryStat = entry.stat()
+          except OSError:
+            entryStat = None
+          if entry.is_symlink():
+            realPath = os.path.realpath(entry.path)
+          else:
+            realPath = os.path.join(realDirectory,entry.name)
+          entries[entry.name] = (entryStat,self.__isInside(realPath))
+      scanned = (realDirectory,entries)
+    except OSError:
+      scanned = None
+    snapshot[subfolder] = scanned
+    return scanned
+
+  def __isInside(self,realPath):
+    return not os.path.relpath(realPath,self.path).startswith("..")
+
+  def __getEntry(self,path):
+    """
+    Returns a tuple (stat,isLegal) for the path from the current snapshot. The stat is None if the path does not exist.
+    Returns None if there is no snapshot, or it cannot answer for this path.
+    """
+    path = os.path.normpath(path)
+    if path == "." or ".." in path.split(os.sep):
+      return None
+    (directory,name) = os.path.split(path)
+    scanned = self.__scanDir(directory or ".")
+    if scanned is None:
+      return None
+    (realDirectory,entries) = scanned
+    if name in entries:
+      return entries[name]
+    return (None,self.__isInside(os.path.join(realDirectory,name)))
+
+  def __stat(self,path):
+    entry = self.__getEntry(path)
+    if entry is not None and entry[0] is not None:
+      return entry[0]
+    return os.stat(self.getPathInStructure(path))
+
+  def __lsEntries(self,subfolder):
+    """
+    Returns a sorted list of tuples (name,stat) from the current snapshot, or None if there is no snapshot.
+    """
+    subfolder = os.path.normpath(subfolder)
+    if ".." in subfolder.split(os.sep):
+      return None
+    scanned = self.__scanDir(subfolder)
+    if scanned is None:
+      return None
+    return [(name,entryStat) for (name,(entryStat,_)) in sorted(scanned[1].items())]
 
   def getPathInStructure(self,path):
     """
@@ -235,6 +418,9 @@ class BasicFileStructure(FileStructure):
     bar,blah
     """
     assert(objectType==None)
+    entries = self.__lsEntries(subfolder)
+    if entries is not None:
+      return [name for (name,_) in entries]
     paths = []
     path = self.getPathInStructure(subfolder)
     for path in os.listdir(path):
@@ -254,6 +440,9 @@ class BasicFileStructure(FileStructure):
     >>> print(",".join(fileStructure.lsFiles("./bar")))
     New York,abacus
     """
+    entries = self.__lsEntries(subfolder)
+    if entries is not None:
+      return [name for (name,entryStat) in entries if entryStat is not None and stat.S_ISREG(entryStat.st_mode)]
     files = []
     for path in self.ls(subfolder):
       if os.path.isfile(self.getPathInStructure(os.path.join(subfolder,path))):
@@ -268,6 +457,9 @@ class BasicFileStructure(FileStructure):
     >>> print(",".join(fileStructure.lsFolders("./")))
     bar
     """
+    entries = self.__lsEntries(subfolder)
+    if entries is not None:
+      return [name for (name,entryStat) in entries if entryStat is not None and stat.S_ISDIR(entryStat.st_mode)]
     folders = []
     for path in self.ls(subfolder):
       pathInStructure = self.getPathInStructure(os.path.join(subfolder,path))
@@ -285,6 +477,9 @@ class BasicFileStructure(FileStructure):
     >>> fileStructure.exists("./non-existant")
     False
     """
+    entry = self.__getEntry(path)
+    if entry is not None:
+      return entry[0] is not None
     return os.path.exists(self.getPathInStructure(path))
 
   def _read(self,path):
@@ -320,6 +515,20 @@ class BasicFileStructure(FileStructure):
     with open(self.getPathInStructure(path),"rb") as fd:
       return fd.read()
 
+  def _iterChunks(self,path,chunkSize):
+    """
+    >>> from subuserlib.classes.fileStructure import FileStructure
+    >>> fileStructure = BasicFileStructure(subuserlib.classes.fileStructure.hashtestDir)
+    >>> list(fileStructure.iterChunks("./blah",chunkSize=4))
+    [b'blah', b'blah', b'\\n']
+    """
+    with open(self.getPathInStructure(path),"rb") as fd:
+      while True:
+        chunk = fd.read(chunkSize)
+        if not chunk:
+          break
+        yield chunk
+
   def _getMode(self,path):
     """
     >>> from subuserlib.classes.fileStructure import FileStructure
@@ -328,7 +537,7 @@ class BasicFileStructure(FileStructure):
     >>> print(fileStructure.getModeString("./blah"))
     100664
     """
-    return os.stat(self.getPathInStructure(path))[stat.ST_MODE]
+    return self.__stat(path)[stat.ST_MODE]
 
   def _getSize(self,path):
     """
@@ -338,11 +547,50 @@ class BasicFileStructure(FileStructure):
     >>> print(fileStructure.getSize("./blah"))
     9
     """
-    return os.stat(self.getPathInStructure(path))[stat.ST_SIZE]
+    return self.__stat(path)[stat.ST_SIZE]
+
+  def _getContentId(self,path):
+    """
+    The content id of a real directory is built from the stats of the files within it, so that telling whether its contents have changed costs a ``stat`` of each file rather than a read.
+
+    Returns None if any file was modified too recently for its stats to be trusted.
+
+    >>> from subuserlib.classes.fileStructure import FileStructure
+    >>> fileStructure = BasicFileStructure(subuserlib.classes.fileStructure.hashtestDir)
+    >>> subuserlib.classes.fileStructure.racyInterval = 0
+    >>> fileStructure.getContentId("./") == fileStructure.getContentId("./")
+    True
+    >>> fileStructure.getContentId("./") == fileStructure.getContentId("./bar")
+    False
+    >>> subuserlib.classes.fileStructure.racyInterval = 2
+    """
+    stats = []
+    now = time.time()
+    def statFile(path):
+      fileStat = self.__stat(path)
+      if max(fileStat.st_mtime,fileStat.st_ctime) > now - racyInterval:
+        raise ValueError(path)
+      stats.append([path,fileStat.st_ino,fileStat.st_size,fileStat.st_mtime_ns,fileStat.st_ctime_ns])
+    # Walk the directory in the same way that FileStructure.hash does.
+    def statDir(path):
+      statFile(path)
+      for subdir in sorted(self.lsFolders(path)):
+        if subdir != ".git":
+          statDir(os.path.join(path,subdir))
+      for fileToStat in sorted(self.lsFiles(path)):
+        statFile(os.path.join(path,fileToStat))
+    try:
+      with self.snapshot():
+        statDir(path)
+    except (OSError,ValueError):
+      return None
+    return hashlib.sha256(json.dumps([os.path.realpath(self.path),stats]).encode("utf-8")).hexdigest()
 
   def realpath(self,path):
     return os.path.realpath(self.getPathInStructure(path))
 
   def isLegalSymlink(self,path):
-    path = self.realpath(path)
-    return not os.path.relpath(path,self.path).startswith("..")
+    entry = self.__getEntry(path)
+    if entry is not None:
+      return entry[1]
+    return self.__isInside(self.realpath(path))
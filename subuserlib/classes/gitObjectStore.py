@@ -0,0 +1,800 @@
+# -*- coding: utf-8 -*-
+
+"""
+The GitObjectStore reads objects straight out of a git repository's ``.git`` directory, without starting git.
+
+Loose objects and objects in pack files are both understood, including deltified objects. Refs are looked up in loose ref files and in the ``packed-refs`` file.
+
+Anything which is not understood raises an ``UnsupportedGitObjectException``. The caller should then ask git itself, which is slower but always right. This happens for revision expressions such as ``HEAD~1``, for abbreviated hashes, for repositories which use the sha256 object format or the reftable ref format, and for objects which are not present locally, such as the files of a partial clone which have not been fetched yet.
+
+Here we set up a repository which has loose objects, packed objects and deltas:
+
+>>> import os
+>>> import shutil
+>>> import tempfile
+>>> import subprocess
+>>> from subuserlib.classes.gitObjectStore import GitObjectStore
+>>> repoDir = tempfile.mkdtemp()
+>>> def git(args):
+...   return subprocess.check_output(["git"]+args,cwd=repoDir)
+>>> _ = git(["init","--quiet"])
+>>> os.mkdir(os.path.join(repoDir,"dir"))
+>>> for version in range(3):
+...   with open(os.path.join(repoDir,"dir","big file"),"w") as bigFile:
+...     _ = bigFile.write("".join("line "+str(line)+"\\n" for line in range(2000+version)))
+...   _ = git(["add","."])
+...   _ = git(["commit","--quiet","-m","Version "+str(version)])
+>>> _ = git(["repack","-a","-d","-q"])
+>>> with open(os.path.join(repoDir,"small"),"w") as smallFile:
+...   _ = smallFile.write("loose\\n")
+>>> _ = git(["add","."])
+>>> _ = git(["commit","--quiet","-m","Loose"])
+
+Every object reads back exactly as git shows it.
+
+>>> objectStore = GitObjectStore(repoDir)
+>>> objectIds = git(["rev-list","--objects","--all"]).decode("utf-8").split()
+>>> objectIds = [objectId for objectId in objectIds if len(objectId) == 40]
+>>> all(objectStore.readObject(objectId) == (git(["cat-file","-t",objectId]).decode("utf-8").strip(),git(["cat-file",git(["cat-file","-t",objectId]).decode("utf-8").strip(),objectId])) for objectId in objectIds)
+True
+>>> all(objectStore.getObjectInfo(objectId)[1] == int(git(["cat-file","-s",objectId])) for objectId in objectIds)
+True
+>>> objectStore.lookup("master:small")[1:]
+('blob', 6, b'loose\\n')
+>>> objectStore.lookup("master:dir/big file")[0] == git(["rev-parse","master:dir/big file"]).decode("utf-8").strip()
+True
+>>> objectStore.lookup("master^{tree}")[0] == git(["rev-parse","master^{tree}"]).decode("utf-8").strip()
+True
+>>> print(objectStore.lookup("master:non-existant"))
+None
+
+Looking up the type and size of an object does not read the object itself.
+
+>>> readObject = objectStore.readObject
+>>> readObjectIds = []
+>>> def recordReadObject(objectId):
+...   readObjectIds.append(objectId)
+...   return readObject(objectId)
+>>> objectStore.readObject = recordReadObject
+>>> bigFileId = git(["rev-parse","master:dir/big file"]).decode("utf-8").strip()
+>>> objectStore.lookupInfo("master:dir/big file") == (bigFileId,"blob",len(git(["cat-file","blob",bigFileId])))
+True
+>>> bigFileId in readObjectIds
+False
+>>> print(objectStore.lookupInfo("master:dir/big file/non-existant"))
+None
+>>> del objectStore.readObject
+>>> objectStore.lsTree(objectStore.lookup("master")[0]) == [line.split(maxsplit=4) for line in git(["ls-tree","-rtl","master"]).decode("utf-8").splitlines()]
+True
+
+Revision expressions are left to git.
+
+>>> objectStore.lookup("master~1")
+Traceback (most recent call last):
+...
+subuserlib.classes.gitObjectStore.UnsupportedGitObjectException: Revision master~1 is not understood.
+>>> objectStore.close()
+>>> shutil.rmtree(repoDir)
+"""
+
+#external imports
+import os
+import re
+import bisect
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+#internal imports
+#import ...
+
+objectTypes = {1:"commit",2:"tree",3:"blob",4:"tag"}
+offsetDeltaType = 6
+refDeltaType = 7
+# Trees and commits are read again and again when looking up paths, so the most recently used ones are kept in memory.
+objectCacheSize = 256
+# Resolved delta bases are kept in memory up to this many bytes per pack, so that objects which share bases need not resolve them again.
+deltaBaseCacheSize = 16*1024*1024
+# Damaged or unexpected data shows up as one of these.
+corruptionErrors = (OSError,ValueError,IndexError,KeyError,struct.error,zlib.error)
+
+class GitObjectStore():
+  def __init__(self,path):
+    """
+    The path is either the working tree of a git repository, or a bare git repository.
+    """
+    self.path = path
+    self.__gitDir = None
+    self.__objectDirs = None
+    self.__packs = OrderedDict()
+    self.__packedRefs = None
+    self.__packedRefsStat = None
+    self.__objectCache = OrderedDict()
+    self.__lock = threading.Lock()
+
+  @property
+  def gitDir(self):
+    if self.__gitDir is None:
+      gitDir = os.path.join(self.path,".git")
+      if not os.path.isdir(gitDir):
+        gitDir = self.path
+      if not (os.path.isdir(os.path.join(gitDir,"objects")) and os.path.isfile(os.path.join(gitDir,"HEAD"))):
+        raise UnsupportedGitObjectException("No git directory found in "+self.path)
+      if os.path.exists(os.path.join(gitDir,"commondir")):
+        raise UnsupportedGitObjectException("Linked worktrees are not supported.")
+      try:
+        with open(os.path.join(gitDir,"config"),"r") as configFile:
+          config = configFile.read().lower()
+      except OSError:
+        config = ""
+      if "objectformat" in config or "refstorage" in config:
+        raise UnsupportedGitObjectException("Only sha1 repositories with files based refs are supported.")
+      self.__gitDir = gitDir
+    return self.__gitDir
+
+  def getConfigValue(self,section,subsection,key):
+    """
+    Returns the value of a setting in the repository's own ``config`` file, such as ``remote.origin.promisor``, or None if it is not set there.
+    Only simple ``key = value`` lines are understood.
+    """
+    try:
+      with open(os.path.join(self.gitDir,"config"),"r") as configFile:
+        lines = configFile.read().splitlines()
+    except OSError:
+      return None
+    value = None
+    inSection = False
+    for line in lines:
+      line = line.strip()
+      if not line or line[0] in "#;":
+        continue
+      match = re.match(r'^\[\s*([A-Za-z0-9.-]+)(\s+"(.*)")?\s*\]$',line)
+      if match:
+        if match.group(1).lower() in ["include","includeif"]:
+          raise UnsupportedGitObjectException("Included config files are not supported.")
+        inSection = match.group(1).lower() == section and match.group(3) == subsection
+        continue
+      if line.startswith("["):
+        raise UnsupportedGitObjectException("Config line "+line+" is not understood.")
+      if inSection:
+        name,_,settingValue = line.partition("=")
+        if name.strip().lower() == key:
+          value = settingValue.strip()
+    return value
+
+  def getObjectDirs(self):
+    """
+    Returns the repository's object directory followed by any alternate object directories it borrows objects from.
+    """
+    if self.__objectDirs is None:
+      objectsDir = os.path.join(self.gitDir,"objects")
+      objectDirs = [objectsDir]
+      try:
+        with open(os.path.join(objectsDir,"info","alternates"),"r") as alternatesFile:
+          for line in alternatesFile.read().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+              objectDirs.append(os.path.normpath(os.path.join(objectsDir,line)))
+      except OSError:
+        pass
+      self.__objectDirs = objectDirs
+    return self.__objectDirs
+
+  def getPacks(self,rescan=False):
+    with self.__lock:
+      if rescan or not self.__packs:
+        for objectDir in self.getObjectDirs():
+          packDir = os.path.join(objectDir,"pack")
+          try:
+            indexNames = sorted(os.listdir(packDir))
+          except OSError:
+            continue
+          for indexName in indexNames:
+            indexPath = os.path.join(packDir,indexName)
+            if indexName.endswith(".idx") and not indexPath in self.__packs and os.path.exists(indexPath[:-len(".idx")]+".pack"):
+              self.__packs[indexPath] = PackFile(self,indexPath)
+      return list(self.__packs.values())
+
+  def close(self):
+    """
+    Close any open pack files.
+    """
+    with self.__lock:
+      for pack in self.__packs.values():
+        pack.close()
+      self.__packs = OrderedDict()
+      self.__objectCache = OrderedDict()
+
+  def __getLooseObjectPath(self,objectId):
+    for objectDir in self.getObjectDirs():
+      path = os.path.join(objectDir,objectId[:2],objectId[2:])
+      if os.path.isfile(path):
+        return path
+    return None
+
+  def __findPackedObject(self,objectId):
+    """
+    Returns a tuple (pack,offset), or None if the object is not in any pack.
+    """
+    binaryObjectId = bytes.fromhex(objectId)
+    for rescan in (False,True):
+      for pack in self.getPacks(rescan=rescan):
+        offset = pack.findOffset(binaryObjectId)
+        if offset is not None:
+          return (pack,offset)
+    return None
+
+  def readObject(self,objectId):
+    """
+    Returns a tuple (objectType,contents) for the object with the given full hash.
+    """
+    with self.__lock:
+      if objectId in self.__objectCache:
+        self.__objectCache.move_to_end(objectId)
+        return self.__objectCache[objectId]
+    looseObjectPath = self.__getLooseObjectPath(objectId)
+    if looseObjectPath is not None:
+      with open(looseObjectPath,"rb") as looseObjectFile:
+        data = zlib.decompress(looseObjectFile.read())
+      header,_,contents = data.partition(b"\0")
+      objectType,size = header.decode("ascii").split()
+      if not int(size) == len(contents):
+        raise UnsupportedGitObjectException("Object "+objectId+" is corrupt.")
+      result = (objectType,contents)
+    else:
+      packedObject = self.__findPackedObject(objectId)
+      if packedObject is None:
+        raise UnsupportedGitObjectException("Object "+objectId+" is not present.")
+      (pack,offset) = packedObject
+      result = pack.readObject(offset)
+    if not result[0] == "blob":
+      with self.__lock:
+        self.__objectCache[objectId] = result
+        if len(self.__objectCache) > objectCacheSize:
+          self.__objectCache.popitem(last=False)
+    return result
+
+  def openObject(self,objectId,chunkSize):
+    """
+    Returns a tuple (objectType,size,chunks) for the object with the given full hash. Iterating over chunks yields the contents of the object in pieces of at most chunkSize bytes, so that large files never have to be held in memory as a whole.
+
+    Deltified objects still have to be rebuilt in memory, but git stores files larger than ``core.bigFileThreshold`` whole.
+    """
+    if re.match(r"^[0-9a-f]{40}$",objectId) is None:
+      raise UnsupportedGitObjectException(objectId+" is not a full object id.")
+    try:
+      return self.__openObject(objectId,chunkSize)
+    except corruptionErrors as e:
+      raise UnsupportedGitObjectException("Failed to read "+objectId+": "+str(e))
+
+  def __openObject(self,objectId,chunkSize):
+    looseObjectPath = self.__getLooseObjectPath(objectId)
+    if looseObjectPath is not None:
+      looseObjectFile = open(looseObjectPath,"rb")
+      try:
+        pieces = iterInflate(lambda: looseObjectFile.read(65536),chunkSize)
+        header = b""
+        while not b"\0" in header:
+          piece = next(pieces,None)
+          if piece is None:
+            raise UnsupportedGitObjectException("Object "+objectId+" is corrupt.")
+          header += piece
+        header,_,firstPiece = header.partition(b"\0")
+        objectType,size = header.decode("ascii").split()
+      except Exception:
+        looseObjectFile.close()
+        raise
+      def iterLooseObject():
+        with looseObjectFile:
+          if firstPiece:
+            yield firstPiece
+          for piece in pieces:
+            yield piece
+      return (objectType,int(size),checkLength(iterLooseObject(),int(size),objectId))
+    packedObject = self.__findPackedObject(objectId)
+    if packedObject is None:
+      raise UnsupportedGitObjectException("Object "+objectId+" is not present.")
+    (pack,offset) = packedObject
+    (typeNumber,size,dataOffset,_) = pack.readEntryHeader(offset)
+    if typeNumber in objectTypes:
+      return (objectTypes[typeNumber],size,checkLength(pack.iterInflate(dataOffset,chunkSize),size,objectId))
+    (objectType,contents) = pack.readObject(offset)
+    return (objectType,len(contents),(contents[position:position+chunkSize] for position in range(0,len(contents),chunkSize)))
+
+  def getObjectInfo(self,objectId):
+    """
+    Returns a tuple (objectType,size) for the object with the given full hash, without reading all of its contents where possible.
+    """
+    looseObjectPath = self.__getLooseObjectPath(objectId)
+    if looseObjectPath is not None:
+      decompressor = zlib.decompressobj()
+      header = b""
+      with open(looseObjectPath,"rb") as looseObjectFile:
+        while not b"\0" in header:
+          chunk = looseObjectFile.read(256)
+          if not chunk:
+            raise UnsupportedGitObjectException("Object "+objectId+" is corrupt.")
+          header += decompressor.decompress(chunk,64)
+      objectType,size = header.partition(b"\0")[0].decode("ascii").split()
+      return (objectType,int(size))
+    packedObject = self.__findPackedObject(objectId)
+    if packedObject is None:
+      raise UnsupportedGitObjectException("Object "+objectId+" is not present.")
+    (pack,offset) = packedObject
+    return pack.getObjectInfo(offset)
+
+  def readPackedRefs(self):
+    path = os.path.join(self.gitDir,"packed-refs")
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return {}
+    if self.__packedRefs is None or not self.__packedRefsStat == (stat.st_mtime_ns,stat.st_size):
+      packedRefs = {}
+      with open(path,"r") as packedRefsFile:
+        for line in packedRefsFile.read().splitlines():
+          if line.startswith("#") or line.startswith("^") or not line.strip():
+            continue
+          objectId,refName = line.split(maxsplit=1)
+          packedRefs[refName] = objectId
+      self.__packedRefs = packedRefs
+      self.__packedRefsStat = (stat.st_mtime_ns,stat.st_size)
+    return self.__packedRefs
+
+  def readRef(self,refName,depth=0):
+    """
+    Returns the hash which the ref points to, following symbolic refs, or None if there is no such ref.
+    """
+    if depth > 5:
+      raise UnsupportedGitObjectException("Too many levels of symbolic refs.")
+    if ".." in refName or refName.startswith("/") or refName.endswith("/") or "\\" in refName:
+      raise UnsupportedGitObjectException("Ref "+refName+" is not understood.")
+    path = os.path.join(self.gitDir,refName)
+    if os.path.isfile(path):
+      with open(path,"r") as refFile:
+        contents = refFile.read().strip()
+      if contents.startswith("ref:"):
+        return self.readRef(contents[len("ref:"):].strip(),depth+1)
+      if re.match(r"^[0-9a-f]{40}$",contents):
+        return contents
+      raise UnsupportedGitObjectException("Ref "+refName+" is not understood.")
+    return self.readPackedRefs().get(refName)
+
+  def resolveRevision(self,revision):
+    """
+    Returns the hash named by a full hash, a ref or a branch or tag name.
+    """
+    if re.match(r"^[0-9a-f]{40}$",revision):
+      return revision
+    if not revision or re.search(r"[\^~:@?*\[\s]",revision):
+      raise UnsupportedGitObjectException("Revision "+revision+" is not understood.")
+    # These are the places which git looks for refs, in the same order.
+    candidates = ["refs/"+revision,"refs/tags/"+revision,"refs/heads/"+revision,"refs/remotes/"+revision,"refs/remotes/"+revision+"/HEAD"]
+    if revision.startswith("refs/") or re.match(r"^[A-Z_]+$",revision):
+      candidates.insert(0,revision)
+    for candidate in candidates:
+      objectId = self.readRef(candidate)
+      if objectId is not None:
+        return objectId
+    # It may be an abbreviated hash, or a ref which we failed to find.
+    raise UnsupportedGitObjectException("Revision "+revision+" is not understood.")
+
+  def peel(self,objectId,targetType):
+    """
+    Dereference tags, and commits if the target is a tree, until an object of the target type is reached.
+    Returns the tuple (objectId,objectType,contents) of that object, or None if there is no such object.
+    """
+    while True:
+      (objectType,contents) = self.readObject(objectId)
+      if targetType is None and not objectType == "tag":
+        return (objectId,objectType,contents)
+      if objectType == targetType:
+        return (objectId,objectType,contents)
+      if objectType == "tag":
+        objectId = contents.split(b"\n",1)[0].split()[1].decode("ascii")
+      elif objectType == "commit" and targetType == "tree":
+        objectId = contents.split(b"\n",1)[0].split()[1].decode("ascii")
+      else:
+        return None
+
+  def lookup(self,objectName):
+    """
+    Look up an object by a name such as ``master``, ``master^{tree}`` or ``master:path/to/file``.
+    Returns a tuple (objectId,objectType,size,contents), or None if there is no such object.
+    """
+    try:
+      return self.__lookup(objectName)
+    except corruptionErrors as e:
+      raise UnsupportedGitObjectException("Failed to read "+objectName+": "+str(e))
+
+  def lookupInfo(self,objectName):
+    """
+    Look up an object by name, like ``lookup``, but without reading the contents of the object itself.
+    Returns a tuple (objectId,objectType,size), or None if there is no such object.
+    """
+    try:
+      objectId = self.__resolve(objectName)
+      if objectId is None:
+        return None
+      return (objectId,)+self.getObjectInfo(objectId)
+    except corruptionErrors as e:
+      raise UnsupportedGitObjectException("Failed to read "+objectName+": "+str(e))
+
+  def __lookup(self,objectName):
+    objectId = self.__resolve(objectName)
+    if objectId is None:
+      return None
+    (objectType,contents) = self.readObject(objectId)
+    return (objectId,objectType,len(contents),contents)
+
+  def __resolve(self,objectName):
+    """
+    Returns the hash of the named object, or None if there is no such object. Only the commits and trees which lead to the object are read, not the object itself.
+    """
+    revision,hasPath,path = objectName.partition(":")
+    match = re.match(r"^(.*?)((\^\{[a-z]*\})*)$",revision)
+    revision = match.group(1)
+    peeledTypes = re.findall(r"\^\{([a-z]*)\}",match.group(2))
+    objectId = self.resolveRevision(revision)
+    for peeledType in peeledTypes:
+      if not peeledType in ["","commit","tree","blob","tag"]:
+        raise UnsupportedGitObjectException("Revision "+objectName+" is not understood.")
+      peeled = self.peel(objectId,peeledType or None)
+      if peeled is None:
+        return None
+      objectId = peeled[0]
+    if not hasPath:
+      return objectId
+    peeled = self.peel(objectId,"tree")
+    if peeled is None:
+      return None
+    (objectId,_,contents) = peeled
+    names = [name for name in path.split("/") if not name in ["","."]]
+    if ".." in names:
+      raise UnsupportedGitObjectException("Path "+path+" is not understood.")
+    for name in names:
+      # Contents are None once we have reached something which is not a tree.
+      if contents is None:
+        return None
+      for (mode,entryName,entryObjectId) in parseTree(contents):
+        if entryName == name:
+          objectId = entryObjectId
+          break
+      else:
+        return None
+      if mode == "40000":
+        contents = self.readObject(objectId)[1]
+      else:
+        contents = None
+    return objectId
+
+  def lsTree(self,treeish,sizes=True):
+    """
+    Returns the same listing as ``git ls-tree -rtl``, or ``git ls-tree -rt`` if sizes is False, as a list of [mode,type,hash,size,path] lists. Sizes are "-" for anything which is not a file, and for everything if sizes is False.
+    """
+    try:
+      return self.__lsTree(treeish,sizes)
+    except corruptionErrors as e:
+      raise UnsupportedGitObjectException("Failed to list "+treeish+": "+str(e))
+
+  def __lsTree(self,treeish,sizes):
+    peeled = self.peel(treeish,"tree")
+    if peeled is None:
+      raise UnsupportedGitObjectException(treeish+" is not a tree.")
+    items = []
+    def listTree(contents,prefix):
+      for (mode,name,objectId) in parseTree(contents):
+        path = prefix+name
+        if mode == "40000":
+          items.append(["040000","tree",objectId,"-",path])
+          listTree(self.readObject(objectId)[1],path+"/")
+        elif mode == "160000":
+          items.append([mode,"commit",objectId,"-",path])
+        else:
+          size = "-"
+          if sizes:
+            size = str(self.getObjectInfo(objectId)[1])
+          items.append([mode.zfill(6),"blob",objectId,size,path])
+    listTree(peeled[2],"")
+    return items
+
+def parseTree(contents):
+  """
+  Yield a tuple (mode,name,objectId) for each entry in a tree object.
+  """
+  position = 0
+  while position < len(contents):
+    spacePosition = contents.index(b" ",position)
+    nullPosition = contents.index(b"\0",spacePosition)
+    mode = contents[position:spacePosition].decode("ascii")
+    name = contents[spacePosition+1:nullPosition].decode("utf-8","replace")
+    objectId = contents[nullPosition+1:nullPosition+21].hex()
+    position = nullPosition+21
+    yield (mode,name,objectId)
+
+def iterInflate(readCompressed,chunkSize):
+  """
+  Yield the decompressed contents of a zlib stream in pieces of at most chunkSize bytes. readCompressed is called whenever more of the compressed stream is needed.
+  """
+  decompressor = zlib.decompressobj()
+  while not decompressor.eof:
+    compressed = decompressor.unconsumed_tail or readCompressed()
+    if not compressed:
+      raise UnsupportedGitObjectException("Unexpected end of compressed object.")
+    piece = decompressor.decompress(compressed,chunkSize)
+    if piece:
+      yield piece
+
+def checkLength(chunks,size,objectId):
+  """
+  Pass the chunks through, making sure that they add up to the expected size.
+  """
+  length = 0
+  for chunk in chunks:
+    length += len(chunk)
+    yield chunk
+  if not length == size:
+    raise UnsupportedGitObjectException("Object "+objectId+" is corrupt.")
+
+def readDeltaSize(delta,position):
+  size = 0
+  shift = 0
+  while True:
+    byte = delta[position]
+    position += 1
+    size |= (byte & 0x7f) << shift
+    shift += 7
+    if not byte & 0x80:
+      return (size,position)
+
+def applyDelta(base,delta):
+  """
+  Rebuild an object from its delta base and a git delta.
+  """
+  (sourceSize,position) = readDeltaSize(delta,0)
+  (targetSize,position) = readDeltaSize(delta,position)
+  if not sourceSize == len(base):
+    raise UnsupportedGitObjectException("Delta does not match its base.")
+  target = bytearray()
+  while position < len(delta):
+    opcode = delta[position]
+    position += 1
+    if opcode & 0x80:
+      # Copy a range of the base.
+      offset = 0
+      size = 0
+      for byteNumber in range(4):
+        if opcode & (1 << byteNumber):
+          offset |= delta[position] << (8*byteNumber)
+          position += 1
+      for byteNumber in range(3):
+        if opcode & (1 << (4+byteNumber)):
+          size |= delta[position] << (8*byteNumber)
+          position += 1
+      if size == 0:
+        size = 0x10000
+      target += base[offset:offset+size]
+    elif opcode:
+      # Insert new data.
+      target += delta[position:position+opcode]
+      position += opcode
+    else:
+      raise UnsupportedGitObjectException("Invalid delta opcode.")
+  if not len(target) == targetSize:
+    raise UnsupportedGitObjectException("Delta produced the wrong size.")
+  return bytes(target)
+
+class PackFile():
+  """
+  A pack file and its version 2 index.
+  """
+  def __init__(self,objectStore,indexPath):
+    self.objectStore = objectStore
+    self.indexPath = indexPath
+    self.packPath = indexPath[:-len(".idx")]+".pack"
+    with open(indexPath,"rb") as indexFile:
+      self.index = indexFile.read()
+    if not self.index[:8] == b"\377tOc\0\0\0\2":
+      raise UnsupportedGitObjectException("Only version 2 pack indexes are supported: "+indexPath)
+    self.fanout = struct.unpack(">256I",self.index[8:8+256*4])
+    self.objectCount = self.fanout[255]
+    self.hashTableStart = 8+256*4
+    self.offsetTableStart = self.hashTableStart+self.objectCount*(20+4)
+    self.largeOffsetTableStart = self.offsetTableStart+self.objectCount*4
+    self.__fd = None
+    self.__deltaBaseCache = OrderedDict()
+    self.__deltaBaseCacheBytes = 0
+    self.__lock = threading.Lock()
+
+  @property
+  def fd(self):
+    with self.__lock:
+      if self.__fd is None:
+        self.__fd = os.open(self.packPath,os.O_RDONLY)
+      return self.__fd
+
+  def close(self):
+    if self.__fd is not None:
+      os.close(self.__fd)
+      self.__fd = None
+    with self.__lock:
+      self.__deltaBaseCache = OrderedDict()
+      self.__deltaBaseCacheBytes = 0
+
+  def getHash(self,number):
+    start = self.hashTableStart+number*20
+    return self.index[start:start+20]
+
+  def findOffset(self,binaryObjectId):
+    """
+    Returns the position of the object in the pack file, or None if it is not in this pack.
+    """
+    firstByte = binaryObjectId[0]
+    low = self.fanout[firstByte-1] if firstByte else 0
+    high = self.fanout[firstByte]
+    hashes = HashTable(self,low,high)
+    number = low+bisect.bisect_left(hashes,binaryObjectId)
+    if number >= high or not self.getHash(number) == binaryObjectId:
+      return None
+    start = self.offsetTableStart+number*4
+    (offset,) = struct.unpack(">I",self.index[start:start+4])
+    if offset & 0x80000000:
+      start = self.largeOffsetTableStart+(offset & 0x7fffffff)*8
+      (offset,) = struct.unpack(">Q",self.index[start:start+8])
+    return offset
+
+  def readEntryHeader(self,offset):
+    """
+    Returns a tuple (typeNumber,size,dataOffset,base). The base is the offset of the delta base for offset deltas, its hash for ref deltas, and None otherwise.
+    """
+    header = os.pread(self.fd,64,offset)
+    byte = header[0]
+    typeNumber = (byte >> 4) & 0x7
+    size = byte & 0x0f
+    shift = 4
+    position = 1
+    while byte & 0x80:
+      byte = header[position]
+      position += 1
+      size |= (byte & 0x7f) << shift
+      shift += 7
+    base = None
+    if typeNumber == offsetDeltaType:
+      byte = header[position]
+      position += 1
+      baseDistance = byte & 0x7f
+      while byte & 0x80:
+        byte = header[position]
+        position += 1
+        baseDistance = ((baseDistance+1) << 7) | (byte & 0x7f)
+      base = offset-baseDistance
+    elif typeNumber == refDeltaType:
+      base = header[position:position+20].hex()
+      position += 20
+    elif not typeNumber in objectTypes:
+      raise UnsupportedGitObjectException("Unknown object type in "+self.packPath)
+    return (typeNumber,size,offset+position,base)
+
+  def inflate(self,dataOffset,size,maxLength=None):
+    """
+    Decompress the data of a pack entry. If maxLength is given, only that many bytes are decompressed.
+    """
+    decompressor = zlib.decompressobj()
+    wanted = size if maxLength is None else min(size,maxLength)
+    pieces = []
+    inflatedLength = 0
+    position = dataOffset
+    while inflatedLength < wanted and not decompressor.eof:
+      chunk = os.pread(self.fd,max(65536,wanted-inflatedLength),position)
+      if not chunk:
+        raise UnsupportedGitObjectException("Unexpected end of "+self.packPath)
+      position += len(chunk)
+      piece = decompressor.decompress(chunk,wanted-inflatedLength)
+      inflatedLength += len(piece)
+      pieces.append(piece)
+      # Anything left over belongs to the next pack entry.
+      while decompressor.unconsumed_tail and inflatedLength < wanted:
+        piece = decompressor.decompress(decompressor.unconsumed_tail,wanted-inflatedLength)
+        inflatedLength += len(piece)
+        pieces.append(piece)
+    data = b"".join(pieces)
+    if not len(data) == wanted:
+      raise UnsupportedGitObjectException("Corrupt entry in "+self.packPath)
+    return data
+
+  def iterInflate(self,dataOffset,chunkSize):
+    """
+    Decompress the data of a pack entry piece by piece.
+    """
+    position = dataOffset
+    def readCompressed():
+      nonlocal position
+      chunk = os.pread(self.fd,65536,position)
+      position += len(chunk)
+      return chunk
+    return iterInflate(readCompressed,chunkSize)
+
+  def readObject(self,offset):
+    """
+    Returns a tuple (objectType,contents) for the entry at the given offset, resolving deltas.
+    """
+    deltas = []
+    while True:
+      cached = self.__getCachedDeltaBase(offset)
+      if cached is not None:
+        (objectType,contents) = cached
+        break
+      (typeNumber,size,dataOffset,base) = self.readEntryHeader(offset)
+      if typeNumber == offsetDeltaType:
+        deltas.append((offset,self.inflate(dataOffset,size)))
+        offset = base
+      elif typeNumber == refDeltaType:
+        deltas.append((offset,self.inflate(dataOffset,size)))
+        (objectType,contents) = self.objectStore.readObject(base)
+        break
+      else:
+        objectType = objectTypes[typeNumber]
+        contents = self.inflate(dataOffset,size)
+        break
+    if deltas:
+      self.__cacheDeltaBase(offset,objectType,contents)
+    for (deltaOffset,delta) in reversed(deltas):
+      contents = applyDelta(contents,delta)
+      self.__cacheDeltaBase(deltaOffset,objectType,contents)
+    return (objectType,contents)
+
+  def __getCachedDeltaBase(self,offset):
+    with self.__lock:
+      if offset in self.__deltaBaseCache:
+        self.__deltaBaseCache.move_to_end(offset)
+        return self.__deltaBaseCache[offset]
+    return None
+
+  def __cacheDeltaBase(self,offset,objectType,contents):
+    if len(contents) > deltaBaseCacheSize:
+      return
+    with self.__lock:
+      if offset in self.__deltaBaseCache:
+        return
+      self.__deltaBaseCache[offset] = (objectType,contents)
+      self.__deltaBaseCacheBytes += len(contents)
+      while self.__deltaBaseCacheBytes > deltaBaseCacheSize:
+        (_,(_,evictedContents)) = self.__deltaBaseCache.popitem(last=False)
+        self.__deltaBaseCacheBytes -= len(evictedContents)
+
+  def getObjectInfo(self,offset):
+    """
+    Returns a tuple (objectType,size) for the entry at the given offset, reading only the start of any deltas.
+    """
+    size = None
+    while True:
+      (typeNumber,entrySize,dataOffset,base) = self.readEntryHeader(offset)
+      if typeNumber in objectTypes:
+        return (objectTypes[typeNumber],entrySize if size is None else size)
+      if size is None:
+        # The size of the result is stored at the start of the delta, after the size of the base.
+        deltaStart = self.inflate(dataOffset,entrySize,maxLength=20)
+        (_,position) = readDeltaSize(deltaStart,0)
+        (size,_) = readDeltaSize(deltaStart,position)
+      if typeNumber == offsetDeltaType:
+        offset = base
+      else:
+        return (self.objectStore.getObjectInfo(base)[0],size)
+
+class HashTable():
+  """
+  A read only sequence view of part of a pack index's table of hashes, so that it can be searched with ``bisect``.
+  """
+  def __init__(self,pack,low,high):
+    self.pack = pack
+    self.low = low
+    self.high = high
+
+  def __len__(self):
+    return self.high-self.low
+
+  def __getitem__(self,number):
+    return self.pack.getHash(self.low+number)
+
+class UnsupportedGitObjectException(Exception):
+  pass
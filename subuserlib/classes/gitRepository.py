@@ -9,9 +9,14 @@ import os
 import tempfile
 import sys
 import errno
+import json
+import atexit
+import subprocess
+import threading
 #internal imports
 from subuserlib.classes.userOwnedObject import UserOwnedObject
 from subuserlib.classes.fileStructure import FileStructure
+from subuserlib.classes.gitObjectStore import GitObjectStore,UnsupportedGitObjectException,corruptionErrors
 import subuserlib.executablePath
 import subuserlib.test
 if subuserlib.test.testing:
@@ -26,6 +31,9 @@ class GitRepository(UserOwnedObject):
     UserOwnedObject.__init__(self,user)
     self.path = path
     self.__gitExecutable = None
+    self.__isPartialClone = None
+    self.objectStore = GitObjectStore(path)
+    self.objectReader = GitObjectReader(self)
 
   def getGitExecutable(self):
     global gitExecutable
@@ -50,11 +58,52 @@ $ git config --global user.name "John Doe"
 $ git config --global user.email johndoe@example.com
 """)
 
-  def clone(self,origin):
+  def clone(self,origin,partial=False,reference=None):
     """
     Clone an external repository in order to create this repository.
+
+    If partial is True, a blobless partial clone is made. Only commits and trees are downloaded, and the contents of files are fetched from origin when they are first read. Subuser reads repositories through git's object store rather than the working tree, so nothing is checked out.
+
+    If reference is the path of another local repository, objects which are already present there are borrowed rather than downloaded again. The reference repository must not be deleted, and objects must not be pruned from it, while this repository still uses it.
+    """
+    args = ["clone"]
+    if partial:
+      args += ["--filter=blob:none","--no-checkout"]
+    if reference:
+      args += ["--reference-if-able",reference]
+    self.__isPartialClone = None
+    return self.user.endUser.call(self.getGitExecutable()+args+[origin, self.path])
+
+  def isPartialClone(self):
+    """
+    Returns True if this repository is a partial clone, whose file contents may not all have been downloaded yet.
     """
-    return self.user.endUser.call(self.getGitExecutable()+["clone", origin, self.path])
+    if self.__isPartialClone is None:
+      try:
+        promisor = self.objectStore.getConfigValue("remote","origin","promisor") or "false"
+      except UnsupportedGitObjectException:
+        try:
+          (returncode,promisor) = self.runCollectOutput(["config","--type=bool","--default=false","--get","remote.origin.promisor"],eatStderr=True)
+        except OSError:
+          return False
+        if returncode != 0:
+          return False
+      self.__isPartialClone = promisor.strip().lower() in ["true","yes","on","1"]
+    return self.__isPartialClone
+
+  def fetchMissingObjects(self,treeish):
+    """
+    Download all of the objects reachable from the given tree or commit which are missing from a partial clone, using a single request to origin.
+    Otherwise, git would fetch each missing file separately as it is read.
+    """
+    (returncode,output) = self.runCollectOutput(["rev-list","--objects","--missing=print",treeish],eatStderr=True)
+    if returncode != 0:
+      return
+    missingObjects = [line[1:].strip() for line in output.splitlines() if line.startswith("?")]
+    if not missingObjects:
+      return
+    self.user.registry.log("Fetching "+str(len(missingObjects))+" missing objects into "+self.path,verbosityLevel=4)
+    self.runCollectOutput(["-c","fetch.negotiationAlgorithm=noop","fetch","--quiet","--no-tags","--no-write-fetch-head","--recurse-submodules=no","--filter=blob:none","origin"]+missingObjects,eatStderr=True)
 
   def run(self,args):
     returncode,_ = self.__run(args)
@@ -77,7 +126,7 @@ $ git config --global user.email johndoe@example.com
       self.user.registry.log(str(stdout),verbosityLevel=verbosityLevel)
       self.user.registry.log(str(stderr),verbosityLevel=verbosityLevel)
       if stderr and not eatStderr:
-        raise GitException(stderr)
+        raise GitException(stderr,returncode=returncode)
       return (returncode,stdout)
     except OSError as e:
       if e.errno == errno.EEXIST:
@@ -113,6 +162,32 @@ $ git config --global user.email johndoe@example.com
     """
     return self.run(["commit","--message",message])
 
+  def stage(self,paths):
+    """
+    Add the current contents of the given files to the index, or remove them from the index if they no longer exist. Paths are relative to the repository.
+    Unlike ``git add .``, this only looks at the given files, rather than at the whole working tree.
+    """
+    if paths:
+      self.run(["update-index","--add","--remove","--"]+list(paths))
+
+  def commitIndex(self,message):
+    """
+    Commit whatever is currently in the index, with the given message.
+    Only the files which have been staged are looked at, rather than the whole working tree. Git's commit hooks and settings such as ``commit.gpgsign`` apply just as they do to ``git commit``.
+    Returns the hash of the new commit, or None if the index does not differ from the current commit.
+    """
+    (returncode,tree) = self.runCollectOutput(["write-tree"])
+    if returncode != 0:
+      raise GitException("Failed to write tree for commit.\nRepo: "+self.path)
+    parent = self.objectReader.getObjectId("HEAD^{commit}")
+    if parent is not None and self.objectReader.getObjectId(parent+"^{tree}") == tree.strip():
+      return None
+    # Untracked files are not committed, so there is no need for git to look for them.
+    (returncode,_) = self.runCollectOutput(["commit","--quiet","--untracked-files=no","--message",message],eatStderr=True)
+    if returncode != 0:
+      raise GitException("Failed to create commit.\nRepo: "+self.path)
+    return self.runCollectOutput(["rev-parse","HEAD"])[1].strip()
+
   def checkout(self,commit,files=[]):
     """
     Run git checkout
@@ -137,6 +212,193 @@ $ git config --global user.email johndoe@example.com
     else:
       return False
 
+# The GitObjectReaders whose processes are still running. They are shut down when subuser exits.
+runningObjectReaders = set()
+
+def closeRunningObjectReaders():
+  for objectReader in list(runningObjectReaders):
+    objectReader.close()
+
+atexit.register(closeRunningObjectReaders)
+
+class GitObjectReader():
+  """
+  Reads objects out of a git repository. Objects are read directly from the ``.git`` directory by the repository's ``GitObjectStore`` when possible. Anything which it does not understand is read through a single long running ``git cat-file --batch`` process, rather than starting a new git process for each object.
+
+  Objects are named as they would be on git's command line, for example ``master:path/to/file``.
+
+  >>> from subuserlib.classes.gitRepository import GitRepository
+  >>> gitRepository = GitRepository(subuserlib.classes.gitRepository.getUser(),subuserlib.classes.gitRepository.hashtestDir)
+  >>> gitRepository.objectReader.read("master:blah")
+  b'blahblah\\n'
+  >>> gitRepository.objectReader.exists("master:bar")
+  True
+  >>> gitRepository.objectReader.getObjectId("master:blah")
+  '63756ef0df5e4f10b6efa33cfe5c758749615f20'
+  >>> print(gitRepository.objectReader.read("master:non-existant"))
+  None
+
+  Asking for the size of a file does not read its contents.
+
+  >>> readObject = gitRepository.objectStore.readObject
+  >>> blahId = gitRepository.objectReader.getObjectId("master:blah")
+  >>> def refuseToReadBlah(objectId):
+  ...   assert not objectId == blahId
+  ...   return readObject(objectId)
+  >>> gitRepository.objectStore.readObject = refuseToReadBlah
+  >>> gitRepository.objectReader.getSize("master:blah")
+  9
+  >>> gitRepository.getFileStructureAtCommit("master")._getSize("./blah")
+  9
+  >>> del gitRepository.objectStore.readObject
+  >>> gitRepository.objectReader.close()
+  """
+  def __init__(self,gitRepository):
+    self.gitRepository = gitRepository
+    self.__process = None
+    self.__lock = threading.Lock()
+
+  def __start(self):
+    command = self.gitRepository.getGitExecutable()+["cat-file","--batch"]
+    self.gitRepository.user.registry.log(self.gitRepository.path+": "+" ".join(command),verbosityLevel=5)
+    self.__process = self.gitRepository.user.endUser.Popen(command,cwd=self.gitRepository.path,stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.DEVNULL)
+    runningObjectReaders.add(self)
+
+  def __request(self,objectName,keepContents):
+    """
+    Ask git for the object. Returns a tuple (objectId,objectType,size,contents), or None if the object does not exist.
+    If keepContents is False, the contents are read and thrown away, and None is returned in their place.
+    """
+    if "\n" in objectName:
+      raise OSError("Git object names cannot contain newlines: "+repr(objectName))
+    try:
+      if keepContents:
+        return self.gitRepository.objectStore.lookup(objectName)
+      # Only the header of the object is read, so that asking for the size of a large file does not load it into memory.
+      result = self.gitRepository.objectStore.lookupInfo(objectName)
+      if result is None:
+        return None
+      return result+(None,)
+    except UnsupportedGitObjectException:
+      pass
+    with self.__lock:
+      if self.__process is None or self.__process.poll() is not None:
+        self.__start()
+      process = self.__process
+      try:
+        process.stdin.write(objectName.encode("utf-8")+b"\n")
+        process.stdin.flush()
+        header = process.stdout.readline()
+        if not header:
+          raise OSError("git cat-file exited unexpectedly.\nRepo: "+self.gitRepository.path)
+        fields = header.split()
+        # Missing and ambiguous objects are reported as "<name> missing" or "<name> ambiguous".
+        if not len(fields) == 3:
+          return None
+        objectId = fields[0].decode("utf-8")
+        objectType = fields[1].decode("utf-8")
+        size = int(fields[2])
+        remaining = size
+        chunks = []
+        while remaining > 0:
+          chunk = process.stdout.read(min(remaining,65536))
+          if not chunk:
+            raise OSError("git cat-file exited unexpectedly.\nRepo: "+self.gitRepository.path)
+          remaining -= len(chunk)
+          if keepContents:
+            chunks.append(chunk)
+        # Each object is followed by a newline.
+        process.stdout.read(1)
+      except (OSError,ValueError):
+        self.__close()
+        raise
+      if keepContents:
+        return (objectId,objectType,size,b"".join(chunks))
+      return (objectId,objectType,size,None)
+
+  def read(self,objectName):
+    """
+    Returns the contents of the object as bytes, or None if there is no such object.
+    """
+    result = self.__request(objectName,keepContents=True)
+    if result is None:
+      return None
+    return result[3]
+
+  def iterChunks(self,objectName,chunkSize):
+    """
+    Yield the contents of the object in pieces of at most chunkSize bytes, without ever holding the whole object in memory.
+    Objects which the object store cannot read are streamed out of a separate ``git cat-file`` process, so that the shared ``git cat-file --batch`` process is not tied up while the object is being consumed.
+    """
+    try:
+      (_,_,chunks) = self.gitRepository.objectStore.openObject(objectName,chunkSize)
+    except UnsupportedGitObjectException:
+      for chunk in self.__iterCatFile(objectName,chunkSize):
+        yield chunk
+      return
+    try:
+      for chunk in chunks:
+        yield chunk
+    except corruptionErrors as e:
+      raise OSError("Failed to read "+objectName+": "+str(e)+"\nRepo: "+self.gitRepository.path)
+
+  def __iterCatFile(self,objectName,chunkSize):
+    command = self.gitRepository.getGitExecutable()+["cat-file","blob",objectName]
+    self.gitRepository.user.registry.log(self.gitRepository.path+": "+" ".join(command),verbosityLevel=5)
+    process = self.gitRepository.user.endUser.Popen(command,cwd=self.gitRepository.path,stdout=subprocess.PIPE,stderr=subprocess.DEVNULL)
+    try:
+      while True:
+        chunk = process.stdout.read(chunkSize)
+        if not chunk:
+          break
+        yield chunk
+    finally:
+      process.stdout.close()
+      process.wait()
+    if not process.returncode == 0:
+      raise OSError("Failed to read "+objectName+"\nRepo: "+self.gitRepository.path)
+
+  def exists(self,objectName):
+    return self.__request(objectName,keepContents=False) is not None
+
+  def getObjectId(self,objectName):
+    """
+    Returns the full hash of the named object, or None if there is no such object.
+    This is used to resolve refs such as ``master`` to the commit which they currently point to.
+    """
+    result = self.__request(objectName,keepContents=False)
+    if result is None:
+      return None
+    return result[0]
+
+  def getSize(self,objectName):
+    """
+    Returns the size of the object in bytes, or None if there is no such object.
+    """
+    result = self.__request(objectName,keepContents=False)
+    if result is None:
+      return None
+    return result[2]
+
+  def __close(self):
+    if self.__process is not None:
+      try:
+        self.__process.stdin.close()
+      except OSError:
+        pass
+      self.__process.wait()
+      self.__process.stdout.close()
+      self.__process = None
+    runningObjectReaders.discard(self)
+
+  def close(self):
+    """
+    Shut down the git process. It will be started again if another object is read.
+    """
+    with self.__lock:
+      self.__close()
+    self.gitRepository.objectStore.close()
+
 class GitFileStructure(FileStructure):
   def __init__(self,gitRepository,commit):
     """
@@ -155,6 +417,7 @@ class GitFileStructure(FileStructure):
     self.gitRepository = gitRepository
     self.commit = commit
     self.__lsTreeCache = {}
+    self.__treeIndex = None
 
   def lsTree(self):
     """
@@ -163,24 +426,110 @@ class GitFileStructure(FileStructure):
 
     Coresponding to the items found in the subfolder.
     """
-    args = [self.commit,"-rtl"]
+    # Listing sizes would make git download the contents of every file in a partial clone.
+    listSizes = not self.gitRepository.isPartialClone()
+    if listSizes:
+      args = [self.commit,"-rtlz"]
+    else:
+      args = [self.commit,"-rtz"]
     argsTuple = tuple(args)
     try:
       return self.__lsTreeCache[argsTuple]
     except KeyError:
       pass
-    (returncode,output) = self.gitRepository.runCollectOutput(["ls-tree"]+args)
-    if returncode != 0:
-      return [] # It is simpler to just return [] here than to check if the repository is properly initialized everywhere else.
-    lines = output.splitlines()
-    items = []
-    for line in lines:
-      mode,objectType,objectHash,size,path = line.split(maxsplit=4)
-      line = {"mode":mode,"type":objectType,"hash":objectHash,"size":size,"path":path}
-      items.append(line)
+    # The listing of a given commit can never change, so listings are cached on disk by commit hash. Refs are resolved first, so that a ref which has moved is never served a stale listing.
+    commitId = self.gitRepository.objectReader.getObjectId(self.commit+"^{commit}")
+    items = None
+    if commitId is not None:
+      items = self.__loadCachedTree(commitId)
+      if items is None:
+        # Try reading the trees directly from the .git directory before asking git.
+        try:
+          items = [{"mode":mode,"type":objectType,"hash":objectHash,"size":size,"path":path} for (mode,objectType,objectHash,size,path) in self.gitRepository.objectStore.lsTree(commitId,sizes=listSizes)]
+        except UnsupportedGitObjectException:
+          pass
+        if items is not None:
+          self.__storeCachedTree(commitId,items)
+    if items is None:
+      # List the commit which was resolved above, so that a ref which moves meanwhile cannot store another commit's listing under this commit's hash.
+      if commitId is not None:
+        args = [commitId]+args[1:]
+      (returncode,output) = self.gitRepository.runCollectOutput(["ls-tree"]+args)
+      if returncode != 0:
+        return [] # It is simpler to just return [] here than to check if the repository is properly initialized everywhere else.
+      # Records are separated by null characters so that paths are never quoted.
+      lines = [line for line in output.split("\0") if line]
+      items = []
+      for line in lines:
+        (metadata,path) = line.split("\t",1)
+        if listSizes:
+          mode,objectType,objectHash,size = metadata.split()
+        else:
+          mode,objectType,objectHash = metadata.split()
+          size = "-"
+        line = {"mode":mode,"type":objectType,"hash":objectHash,"size":size,"path":path}
+        items.append(line)
+      if commitId is not None:
+        self.__storeCachedTree(commitId,items)
     self.__lsTreeCache[argsTuple] = items
     return items
 
+  def __getCachedTreePath(self,commitId):
+    return os.path.join(self.gitRepository.user.config["git-tree-cache"],commitId[:2],commitId+".json")
+
+  def __loadCachedTree(self,commitId):
+    try:
+      with open(self.__getCachedTreePath(commitId),"r") as cachedTreeFile:
+        rows = json.load(cachedTreeFile)
+    except (OSError,ValueError):
+      return None
+    return [{"mode":mode,"type":objectType,"hash":objectHash,"size":size,"path":path} for (mode,objectType,objectHash,size,path) in rows]
+
+  def __storeCachedTree(self,commitId,items):
+    path = self.__getCachedTreePath(commitId)
+    temporaryPath = path+"."+str(os.getpid())+".tmp"
+    endUser = self.gitRepository.user.endUser
+    try:
+      endUser.makedirs(os.path.dirname(path))
+      with endUser.get_file(temporaryPath,mode="w") as cachedTreeFile:
+        json.dump([[item["mode"],item["type"],item["hash"],item["size"],item["path"]] for item in items],cachedTreeFile,separators=(",",":"))
+      os.rename(temporaryPath,path)
+    except OSError:
+      pass
+
+  def getTreeIndex(self):
+    """
+    Returns a tuple (records,children) built from a single pass over ``lsTree``.
+
+     - records maps each normalized path to its ``lsTree`` item.
+     - children maps each normalized directory path to the list of its direct children's items, in ``lsTree`` order. The root directory is ".".
+
+    >>> from subuserlib.classes.gitRepository import GitRepository
+    >>> gitRepository = GitRepository(subuserlib.classes.gitRepository.getUser(),subuserlib.classes.gitRepository.hashtestDir)
+    >>> fileStructure = gitRepository.getFileStructureAtCommit("master")
+    >>> (records,children) = fileStructure.getTreeIndex()
+    >>> records["bar/abacus"]["type"]
+    'blob'
+    >>> [item["path"] for item in children["bar"]]
+    ['bar/New York', 'bar/abacus']
+    """
+    if self.__treeIndex is None:
+      records = {}
+      children = {}
+      for item in self.lsTree():
+        path = os.path.normpath(item["path"])
+        records[path] = item
+        children.setdefault(os.path.dirname(path) or ".",[]).append(item)
+      self.__treeIndex = (records,children)
+    return self.__treeIndex
+
+  def getRecord(self,path):
+    """
+    Returns the ``lsTree`` item for the given path, or None if there is nothing at that path.
+    """
+    (records,_) = self.getTreeIndex()
+    return records.get(os.path.normpath(path))
+
   def _ls(self, subfolder,objectType=None):
     """
     Returns a list of file and folder names.
@@ -193,13 +542,11 @@ class GitFileStructure(FileStructure):
     """
     if subfolder == "./" or subfolder == "/":
       subfolder = ""
-    items = self.lsTree()
+    (_,children) = self.getTreeIndex()
     names = []
-    for item in items:
-      folder,name = os.path.split(item["path"])
-      if os.path.normpath(folder) == os.path.normpath(subfolder):
-        if objectType is None or objectType == item["type"]:
-          names.append(name)
+    for item in children.get(os.path.normpath(subfolder),[]):
+      if objectType is None or objectType == item["type"]:
+        names.append(os.path.basename(item["path"]))
     return names
 
   def _lsFiles(self,subfolder):
@@ -237,13 +584,14 @@ class GitFileStructure(FileStructure):
     True
     >>> fileStructure.exists("./non-existant")
     False
+    >>> fileStructure.exists("./bar/abacus")
+    True
+    >>> fileStructure.exists("./abacus")
+    False
     """
-    (dir,filename) = os.path.split(path)
-    for object in self.lsTree():
-      (_,existing_filename) = os.path.split(object["path"])
-      if filename == existing_filename:
-        return True
-    return False
+    if os.path.normpath(path) == ".":
+      return True
+    return self.getRecord(path) is not None
 
   def _read(self,path):
     """
@@ -258,13 +606,37 @@ class GitFileStructure(FileStructure):
     """
     return self._readBinary(path).decode("utf-8")
 
-
   def _readBinary(self,path):
-    (errorcode,content) = self.gitRepository.runCollectOutput(["show",self.commit+":"+path],eatStderr=True,decode=None)
-    if errorcode != 0:
-      raise OSError("Git show exited with error "+str(errorcode)+". File does not exist.\nRepo:"+self.gitRepository.path+"\nPath: "+path+"\nCommit: "+self.commit+"\n")
+    content = self.gitRepository.objectReader.read(self.getObjectName(path))
+    if content is None:
+      raise OSError("File does not exist.\nRepo:"+self.gitRepository.path+"\nPath: "+path+"\nCommit: "+self.commit+"\n")
     return content
 
+  def _iterChunks(self,path,chunkSize):
+    """
+    >>> from subuserlib.classes.gitRepository import GitRepository
+    >>> gitRepository = GitRepository(subuserlib.classes.gitRepository.getUser(),subuserlib.classes.gitRepository.hashtestDir)
+    >>> fileStructure = gitRepository.getFileStructureAtCommit("master")
+    >>> chunks = list(fileStructure.iterChunks("./blah",chunkSize=4))
+    >>> b"".join(chunks)
+    b'blahblah\\n'
+    >>> max(len(chunk) for chunk in chunks)
+    4
+    """
+    record = self.getRecord(path)
+    if record is None or not record["type"] == "blob":
+      raise OSError("File does not exist.\nRepo:"+self.gitRepository.path+"\nPath: "+path+"\nCommit: "+self.commit+"\n")
+    return self.gitRepository.objectReader.iterChunks(record["hash"],chunkSize)
+
+  def getObjectName(self,path):
+    """
+    Returns the name by which git knows the file or directory at the given path in this commit.
+    """
+    path = os.path.normpath(path)
+    if path == ".":
+      return self.commit+"^{tree}"
+    return self.commit+":"+path
+
   def _getMode(self,path):
     """
     >>> from subuserlib.classes.gitRepository import GitRepository
@@ -273,10 +645,9 @@ class GitFileStructure(FileStructure):
     >>> print(fileStructure.getModeString("./blah"))
     100644
     """
-    allObjects = self.lsTree()
-    for treeObject in allObjects:
-      if os.path.normpath(treeObject["path"]) == os.path.normpath(path):
-        return int(treeObject["mode"],8)
+    treeObject = self.getRecord(path)
+    if treeObject is not None:
+      return int(treeObject["mode"],8)
 
   def _getSize(self,path):
     """
@@ -286,10 +657,47 @@ class GitFileStructure(FileStructure):
     >>> print(fileStructure.getSize("./blah"))
     9
     """
-    allObjects = self.lsTree()
-    for treeObject in allObjects:
-      if os.path.normpath(treeObject["path"]) == os.path.normpath(path):
-        return int(treeObject["size"],10)
+    treeObject = self.getRecord(path)
+    if treeObject is not None:
+      if treeObject["size"] == "-":
+        # Listings of partial clones do not include sizes. Only the header of the object is read where possible.
+        try:
+          return self.gitRepository.objectStore.getObjectInfo(treeObject["hash"])[1]
+        except (UnsupportedGitObjectException,)+corruptionErrors:
+          return self.gitRepository.objectReader.getSize(self.getObjectName(path))
+      return int(treeObject["size"],10)
+
+  def prefetch(self,path):
+    """
+    If the repository is a partial clone, download the contents of all of the files in the given directory at once.
+    """
+    if not self.gitRepository.isPartialClone():
+      return
+    contentId = self.getContentId(path)
+    if contentId is not None:
+      self.gitRepository.fetchMissingObjects(contentId)
+
+  def _getContentId(self,path):
+    """
+    Returns the git object id of the tree or blob at the given path.
+
+    >>> from subuserlib.classes.gitRepository import GitRepository
+    >>> gitRepository = GitRepository(subuserlib.classes.gitRepository.getUser(),subuserlib.classes.gitRepository.hashtestDir)
+    >>> fileStructure = gitRepository.getFileStructureAtCommit("master")
+    >>> print(fileStructure.getContentId("./blah"))
+    63756ef0df5e4f10b6efa33cfe5c758749615f20
+    >>> fileStructure.getContentId("./") == gitRepository.runCollectOutput(["rev-parse","master^{tree}"])[1].strip()
+    True
+    >>> print(fileStructure.getContentId("./non-existant"))
+    None
+    """
+    path = os.path.normpath(path)
+    if path == ".":
+      return self.gitRepository.objectReader.getObjectId(self.commit+"^{tree}")
+    treeObject = self.getRecord(path)
+    if treeObject is None:
+      return None
+    return treeObject["hash"]
 
   def isLegalSymlink(self,path):
     """
@@ -299,4 +707,7 @@ class GitFileStructure(FileStructure):
     return True
 
 class GitException(Exception):
-  pass
+  def __init__(self,message,returncode=None):
+    Exception.__init__(self,message)
+    # The exit code of the git command, if it got as far as running git.
+    self.returncode = returncode
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+The HashCache remembers the hashes of directories in file structures whose contents can be identified cheaply, such as trees in git repositories and real directories.
+
+Hashing a directory means reading every file in it. The content id of a git tree, or the stats of the files in a real directory, tell us that its contents have not changed, so each directory is only hashed the first time that a given set of contents is seen at a given path. The hashes are exactly those returned by ``FileStructure.hash``.
+"""
+
+#external imports
+import os
+import json
+import hashlib
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+
+class HashCache(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+
+  @property
+  def cacheDir(self):
+    return self.user.config["hash-cache"]
+
+  def getPath(self,contentId,path):
+    # The path is part of the key, because FileStructure.hash includes the paths of the files it hashes.
+    key = hashlib.sha256(json.dumps([contentId,os.path.normpath(path)]).encode("utf-8")).hexdigest()
+    return os.path.join(self.cacheDir,key[:2],key)
+
+  def hash(self,fileStructure,path):
+    """
+    Return ``fileStructure.hash(path)``, computing it only if it has not been computed before for the same contents.
+
+    >>> import os,shutil,subprocess,tempfile
+    >>> import subuserlib.classes.fileStructure
+    >>> from subuserlib.classes.user import User
+    >>> from subuserlib.classes.fileStructure import BasicFileStructure
+    >>> from subuserlib.classes.gitRepository import GitRepository
+    >>> from subuserlib.classes.hashCache import HashCache
+    >>> user = User()
+    >>> hashCache = HashCache(user)
+    >>> directory = tempfile.mkdtemp()
+    >>> os.mkdir(os.path.join(directory,"image"))
+    >>> def writeImageFile(contents):
+    ...   with open(os.path.join(directory,"image","SubuserImagefile"),"w") as imageFile:
+    ...     _ = imageFile.write(contents)
+    >>> def commit():
+    ...   _ = subprocess.call(["git","add","."],cwd=directory)
+    ...   _ = subprocess.call(["git","commit","-q","-m","Change image"],cwd=directory)
+    ...   return subprocess.check_output(["git","rev-parse","HEAD"],cwd=directory).decode().strip()
+    >>> writeImageFile("FROM debian\\n")
+    >>> subprocess.call(["git","init","-q"],cwd=directory)
+    0
+
+    In git repositories, directories are identified by their trees. Once hashed, a tree's hash is cached.
+
+    >>> gitRepository = GitRepository(user,directory)
+    >>> fileStructure = gitRepository.getFileStructureAtCommit(commit())
+    >>> hashCache.hash(fileStructure,"./image") == fileStructure.hash("./image")
+    True
+    >>> os.path.exists(hashCache.getPath(fileStructure.getContentId("./image"),"./image"))
+    True
+
+    Changing a file gives the directory a new tree, which is not in the cache yet.
+
+    >>> writeImageFile("FROM debian:stable\\n")
+    >>> changed = gitRepository.getFileStructureAtCommit(commit())
+    >>> os.path.exists(hashCache.getPath(changed.getContentId("./image"),"./image"))
+    False
+    >>> hashCache.hash(changed,"./image") == changed.hash("./image") != fileStructure.hash("./image")
+    True
+
+    Real directories are identified by the stats of their files. A file which was modified within the last ``racyInterval`` seconds could change again without its stats changing, so a directory which contains one is not cached.
+
+    >>> defaultRacyInterval = subuserlib.classes.fileStructure.racyInterval
+    >>> subuserlib.classes.fileStructure.racyInterval = 3600
+    >>> local = BasicFileStructure(directory)
+    >>> print(local.getContentId("./image"))
+    None
+    >>> hashCache.hash(local,"./image") == local.hash("./image")
+    True
+
+    Once its files are old enough, the directory is cached. Changing a file changes its stats, which misses the cache.
+
+    >>> subuserlib.classes.fileStructure.racyInterval = 0
+    >>> contentId = local.getContentId("./image")
+    >>> hashCache.hash(local,"./image") == local.hash("./image")
+    True
+    >>> os.path.exists(hashCache.getPath(contentId,"./image"))
+    True
+    >>> writeImageFile("FROM debian:unstable\\n")
+    >>> local.getContentId("./image") == contentId
+    False
+    >>> os.path.exists(hashCache.getPath(local.getContentId("./image"),"./image"))
+    False
+    >>> hashCache.hash(local,"./image") == local.hash("./image")
+    True
+    >>> subuserlib.classes.fileStructure.racyInterval = defaultRacyInterval
+    >>> shutil.rmtree(directory)
+    """
+    # The content id and the hash both walk the same directory, so they share one snapshot of it.
+    with fileStructure.snapshot():
+      return self.__hash(fileStructure,path)
+
+  def __hash(self,fileStructure,path):
+    contentId = fileStructure.getContentId(path)
+    if contentId is None:
+      return fileStructure.hash(path)
+    cachePath = self.getPath(contentId,path)
+    try:
+      with open(cachePath,"r") as cacheFile:
+        cachedHash = cacheFile.read().strip()
+      if cachedHash:
+        return cachedHash
+    except OSError:
+      pass
+    directoryHash = fileStructure.hash(path)
+    temporaryPath = cachePath+"."+str(os.getpid())+".tmp"
+    try:
+      self.user.endUser.makedirs(os.path.dirname(cachePath))
+      with self.user.endUser.get_file(temporaryPath,mode="w") as cacheFile:
+        cacheFile.write(directoryHash)
+      os.rename(temporaryPath,cachePath)
+    except OSError:
+      pass
+    return directoryHash
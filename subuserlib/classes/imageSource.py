@@ -11,6 +11,7 @@ from collections import OrderedDict
 #internal imports
 from subuserlib.classes.userOwnedObject import UserOwnedObject
 from subuserlib.classes.describable import Describable
+from subuserlib.classes.hashCache import HashCache
 import subuserlib.permissions
 import subuserlib.docker
 import subuserlib.classes.docker.dockerDaemon as dockerDaemon
@@ -18,11 +19,15 @@ import subuserlib.classes.exceptions as exceptions
 import subuserlib.print
 
 class ImageSource(UserOwnedObject,Describable):
-  def __init__(self,user,repo,name,explicitConfig=None):
+  def __init__(self,user,repo,name,explicitConfig=None,catalogEntry=None):
+    """
+    If a ``catalogEntry`` from the repository's catalog is given, the ImageSource's image file and dependency are taken from it rather than looked up in the repository's files.
+    """
     self.name = name
     self.repo = repo
     self.__permissions = None
     self.__explicitConfig = explicitConfig
+    self.__catalogEntry = catalogEntry or {}
     UserOwnedObject.__init__(self,user)
 
   def __hash__(self):
@@ -57,7 +62,23 @@ class ImageSource(UserOwnedObject,Describable):
         subusers.append(subuser)
     return subusers
 
+  def getCatalogEntry(self):
+    """
+    Describe this ImageSource for the repository's catalog. Anything which cannot be looked up now is left out, so that it is looked up, and any error is reported, when it is actually needed.
+    """
+    catalogEntry = {"explicit-config":self.__explicitConfig}
+    try:
+      catalogEntry["image-dir"] = self.getImageDir()
+      catalogEntry["image-file"] = self.getImageFile()
+      if catalogEntry["image-file"] is not None:
+        catalogEntry["dependency"] = self.getDependencyURI()
+    except (exceptions.ImageBuildException,OSError,UnicodeDecodeError):
+      pass
+    return catalogEntry
+
   def getImageDir(self):
+    if "image-dir" in self.__catalogEntry:
+      return self.__catalogEntry["image-dir"]
     if self.__explicitConfig:
       return self.__explicitConfig["build-context"]
     imageDir = os.path.join(self.getRelativeSourceDir(),"image")
@@ -164,6 +185,8 @@ class ImageSource(UserOwnedObject,Describable):
     return self.user.dockerDaemon.build(dockerfile=subuserSetupDockerFile,tag=self.getDockerImageTag(),useCache=False)
 
   def getImageFile(self):
+    if "image-file" in self.__catalogEntry:
+      return self.__catalogEntry["image-file"]
     if self.__explicitConfig:
       return self.__explicitConfig["image-file"]
     dockerfilePath = os.path.join(self.getImageDir(),"Dockerfile")
@@ -179,11 +202,13 @@ class ImageSource(UserOwnedObject,Describable):
   def getImageFileContents(self):
     return self.repo.fileStructure.read(self.getImageFile())
 
-  def getDependency(self):
+  def getDependencyURI(self):
     """
-     Returns the dependency of this ImageSource as a ImageSource.
+     Returns the URI of the ImageSource which this ImageSource depends on, exactly as it is written in the SubuserImagefile.
      Or None if there is no dependency.
     """
+    if "dependency" in self.__catalogEntry:
+      return self.__catalogEntry["dependency"]
     if not self.getImageFileType() == "SubuserImagefile":
       return None
     subuserImagefileContents = self.getImageFileContents()
@@ -191,16 +216,26 @@ class ImageSource(UserOwnedObject,Describable):
     for line in subuserImagefileContents.split("\n"):
       if line.startswith("FROM-SUBUSER-IMAGE"):
         try:
-          import subuserlib.resolve
-          imageURI = line.split(" ")[1]
-          return subuserlib.resolve.resolveImageSource(self.user,imageURI,contextRepository=self.repo,allowLocalRepositories=False) #TODO, ImageSource names with spaces or other funny characters...
+          return line.split(" ")[1] #TODO, ImageSource names with spaces or other funny characters...
         except IndexError:
           raise exceptions.ImageBuildException("Syntax error in SubuserImagefile one line "+str(lineNumber)+":\n"+line)
-        except KeyError:
-          raise exceptions.ImageBuildException("Error in "+self.name+"'s SubuserImagefile on line "+str(lineNumber)+"\n Subuser image does not exist: \""+imageURI+"\"")
       lineNumber+=1
     return None
 
+  def getDependency(self):
+    """
+     Returns the dependency of this ImageSource as a ImageSource.
+     Or None if there is no dependency.
+    """
+    imageURI = self.getDependencyURI()
+    if imageURI is None:
+      return None
+    try:
+      import subuserlib.resolve
+      return subuserlib.resolve.resolveImageSource(self.user,imageURI,contextRepository=self.repo,allowLocalRepositories=False)
+    except KeyError:
+      raise exceptions.ImageBuildException("Error in "+self.name+"'s SubuserImagefile\n Subuser image does not exist: \""+imageURI+"\"")
+
   def getHash(self):
     """ Return the hash of the ``image`` directory. """
-    return self.repo.fileStructure.hash(self.getImageDir())
+    return HashCache(self.user).hash(self.repo.fileStructure,self.getImageDir())
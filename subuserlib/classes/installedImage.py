@@ -30,30 +30,38 @@ class InstalledImage(UserOwnedObject,Describable):
     """
     Does the Docker daemon have an image with this imageId?
     """
-    return not (self.user.dockerDaemon.getImageProperties(self.imageId) == None)
+    return self.imageId in self.user.dockerDaemon.imageInventory
 
-  def removeCachedRuntimes(self):
+  def getCachedRuntimes(self):
     """
-    Remove cached runtime environments.
+    Return a list of (runReadyImageId,cacheInfoFilePath) pairs, one for each cached runtime environment of this image.
     """
+    cachedRuntimes = []
     pathToImagesRuntimeCacheDir = os.path.join(self.user.config["runtime-cache"],self.imageId)
     try:
-      for permissionsSpecificCacheInfoFileName in os.listdir(pathToImagesRuntimeCacheDir):
+      for permissionsSpecificCacheInfoFileName in sorted(os.listdir(pathToImagesRuntimeCacheDir)):
         permissionsSpecificCacheInfoFilePath = os.path.join(pathToImagesRuntimeCacheDir,permissionsSpecificCacheInfoFileName)
         with open(permissionsSpecificCacheInfoFilePath,mode='r') as permissionsSpecificCacheInfoFileHandle:
           permissionsSpecificCacheInfo = json.load(permissionsSpecificCacheInfoFileHandle, object_pairs_hook=OrderedDict)
-          try:
-            try:
-              imageId = permissionsSpecificCacheInfo['run-ready-image-id']
-              self.user.registry.log("Removing runtime cache image %s"%imageId)
-              self.user.dockerDaemon.removeImage(imageId)
-            except dockerDaemon.ImageDoesNotExistsException:
-              pass
-            os.remove(permissionsSpecificCacheInfoFilePath)
-          except dockerDaemon.ContainerDependsOnImageException:
-            pass
+          cachedRuntimes.append((permissionsSpecificCacheInfo['run-ready-image-id'],permissionsSpecificCacheInfoFilePath))
     except OSError:
       pass
+    return cachedRuntimes
+
+  def removeCachedRuntimes(self):
+    """
+    Remove cached runtime environments.
+    """
+    for imageId,permissionsSpecificCacheInfoFilePath in self.getCachedRuntimes():
+      try:
+        try:
+          self.user.registry.log("Removing runtime cache image %s"%imageId)
+          self.user.dockerDaemon.removeImage(imageId)
+        except dockerDaemon.ImageDoesNotExistsException:
+          pass
+        os.remove(permissionsSpecificCacheInfoFilePath)
+      except dockerDaemon.ContainerDependsOnImageException:
+        pass
 
   def removeDockerImage(self):
     """
@@ -97,7 +105,11 @@ class InstalledImage(UserOwnedObject,Describable):
   def getCreationDateTime(self):
     """
     Return the creation date/time of the installed docker image. Or None if the image does not exist.
+
+    The image list which the inventory is built from only gives creation times to the second, so images built in the same second would tie. The full precision time is taken from inspecting the image instead.
     """
+    if not self.isDockerImageThere():
+      return None
     imageProperties = self.user.dockerDaemon.getImageProperties(self.imageId)
     if not imageProperties is None:
       return imageProperties["Created"]
@@ -108,16 +120,7 @@ class InstalledImage(UserOwnedObject,Describable):
     """
     Return the list(lineage) of id of Docker image layers which goes from a base image to this image including all of the image's ancestors in order of dependency.
     """
-    def getLineageRecursive(imageId):
-      imageProperties = self.user.dockerDaemon.getImageProperties(imageId)
-      if imageProperties == None:
-        return []
-        #sys.exit("Failed to get properties of image "+imageId)
-      if not imageProperties["Parent"] == "":
-        return getLineageRecursive(imageProperties["Parent"]) + [imageId]
-      else:
-        return [imageId]
-    return getLineageRecursive(self.imageId)
+    return self.user.dockerDaemon.imageInventory.getLineage(self.imageId)
 
   def getImageLineage(self):
     """
@@ -40,6 +40,7 @@ class Permissions(collections.OrderedDict,UserOwnedObject,FileBackedObject):
       raise Exception("Programmer error. Saving permissions without first aquiring lock! Please report this incident to: https://github.com/subuser-security/subuser/issues")
     with self.user.endUser.get_file(self.writePath,'w') as fd:
       fd.write(subuserlib.permissions.getJSONString(self))
+    self.user.registry.addChangedFile(self.writePath)
 
   @property
   def description(self):
@@ -9,6 +9,7 @@ import os
 import errno
 import sys
 import shutil
+import threading
 from contextlib import contextmanager
 import json
 #internal imports
@@ -16,6 +17,7 @@ from subuserlib.classes import repositories
 from subuserlib.classes import subusers
 from subuserlib.classes import userOwnedObject
 from subuserlib.classes.gitRepository import GitRepository
+from subuserlib.classes.registrySnapshot import RegistrySnapshot
 import subuserlib.print
 import subuserlib.executablePath
 
@@ -23,8 +25,10 @@ class Registry(userOwnedObject.UserOwnedObject):
   def __init__(self,user,gitReadHash="master", ignoreVersionLocks=False, initialized = False):
     self.__subusers = None
     self.__changeLog = u""
+    self.__heldLogMessages = threading.local()
     self.commit_message = None
     self.__changed = False
+    self.__changedFiles = set()
     self.logOutputVerbosity = 2
     self.initialized = initialized
     self.lastVerbosityLevel = None
@@ -35,6 +39,7 @@ class Registry(userOwnedObject.UserOwnedObject):
       except ValueError:
         subuserlib.print.printWithoutCrashing("Invalid verbosity setting! Verbosity may be set to any integer.")
     self.__repositories = None
+    self.__snapshot = None
     self.gitRepository = None
     self.gitReadHash = gitReadHash
     userOwnedObject.UserOwnedObject.__init__(self,user)
@@ -54,6 +59,15 @@ class Registry(userOwnedObject.UserOwnedObject):
       self.__repositories = repositories.Repositories(self.user)
     return self.__repositories
 
+  @property
+  def snapshot(self):
+    """
+    The ``RegistrySnapshot`` of the registry's files at ``gitReadHash``. It is replaced after each commit.
+    """
+    if self.__snapshot is None:
+      self.__snapshot = RegistrySnapshot(self)
+    return self.__snapshot
+
   def ensureGitRepoInitialized(self):
     if not os.path.exists(os.path.join(self.user.config["registry-dir"],".git")):
       self.initialized = False
@@ -77,6 +91,10 @@ class Registry(userOwnedObject.UserOwnedObject):
     Do not mark the registry as changed.
     The notify option will create a popup dialog with the message if the notify-send command exists.
     """
+    heldLogMessages = getattr(self.__heldLogMessages,"messages",None)
+    if heldLogMessages is not None:
+      heldLogMessages.append((message,verbosityLevel,notify))
+      return
     message = message.rstrip()
     if (verbosityLevel-1) <= self.logOutputVerbosity:
       self.__changeLog = self.__changeLog + message + u"\n"
@@ -90,6 +108,27 @@ class Registry(userOwnedObject.UserOwnedObject):
         self.user.endUser.call(["notify-send",message])
     self.lastVerbosityLevel = verbosityLevel
 
+  @contextmanager
+  def holdLogMessages(self):
+    """
+    Hold back the messages which are logged by the current thread, rather than printing them right away.
+    Yields the list of held (message,verbosityLevel,notify) tuples, which can later be passed to ``replayLogMessages``.
+    This lets work which is done in parallel threads be logged in a deterministic order.
+    """
+    messages = []
+    self.__heldLogMessages.messages = messages
+    try:
+      yield messages
+    finally:
+      self.__heldLogMessages.messages = None
+
+  def replayLogMessages(self,messages):
+    """
+    Log messages which were held back by ``holdLogMessages``.
+    """
+    for message,verbosityLevel,notify in messages:
+      self.log(message,verbosityLevel=verbosityLevel,notify=notify)
+
   def logChange(self,message,verbosityLevel=1):
     """
     Add a log message to the registry's change log, and mark the registry as changed.
@@ -100,6 +139,15 @@ class Registry(userOwnedObject.UserOwnedObject):
   def setChanged(self,changed=True):
     self.__changed = changed
 
+  def addChangedFile(self,path):
+    """
+    Note that a file in the registry has been written or removed, so that it will be included in the next commit.
+    Only files which have been noted this way are staged by ``commit``. Paths outside of the registry are ignored.
+    """
+    relativePath = os.path.relpath(os.path.abspath(path),os.path.abspath(self.registryDir))
+    if not relativePath.startswith(os.pardir):
+      self.__changedFiles.add(relativePath)
+
   def logRenameCommit(self, message):
     """
     Add a new message to the top of the log.
@@ -117,18 +165,21 @@ class Registry(userOwnedObject.UserOwnedObject):
       self.subusers.save()
       with self.user.endUser.get_file(self.logFilePath) as fd:
         fd.write(self.__changeLog)
-      self.gitRepository.run(["add","."])
+      self.addChangedFile(self.logFilePath)
+      self.gitRepository.stage(sorted(self.__changedFiles))
       if message is None:
         if self.commit_message is not None:
           message = self.commit_message
         else:
           message = self.__changeLog
-      self.gitRepository.commit(message)
+      commit = self.gitRepository.commitIndex(message)
+      self.__snapshot = None
       # Log to live log
       announcement = {}
-      announcement["commit"] = self.gitRepository.getHashOfRef("master")
+      announcement["commit"] = commit or self.gitRepository.getHashOfRef("master")
       self.logToLiveLog(announcement)
       self.__changed = False
+      self.__changedFiles = set()
       self.__changeLog = u""
 
   def logToLiveLog(self,announcement):
@@ -145,7 +196,7 @@ class Registry(userOwnedObject.UserOwnedObject):
         # TODO Note: We don't close the file descriptors, because doing so makes the pipe close on the other end too. This would be a file descriptor leak if this method was used in any long running process(which it is not).
 
   def cleanOutOldPermissions(self):
-    for permissions_folder_name in self.gitRepository.getFileStructureAtCommit(self.gitReadHash).lsFolders("permissions"):
+    for permissions_folder_name in self.snapshot.lsFolders("permissions"):
       exists = os.path.exists(os.path.join(self.registryDir,"permissions",permissions_folder_name))
       if exists and permissions_folder_name not in self.subusers:
         self.logChange("Removing left over permissions for no-longer extant subuser %s"%permissions_folder_name,2)
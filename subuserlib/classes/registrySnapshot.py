@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+A RegistrySnapshot is a read only view of the registry's files at the commit which the registry is being read from.
+
+The registry's ``gitReadHash`` is resolved to a commit only once, and the registry's json files are all read together the first time that any file is read. All of the parts of the registry which load their state from git share one snapshot, so loading a registry costs the same number of git operations no matter how many subusers it has.
+"""
+
+#external imports
+import os
+#internal imports
+from subuserlib.classes.fileStructure import FileStructure
+
+class RegistrySnapshot(FileStructure):
+  def __init__(self,registry):
+    self.registry = registry
+    self.commit = registry.gitRepository.objectReader.getObjectId(registry.gitReadHash+"^{commit}")
+    self.__gitFileStructure = None
+    if self.commit is not None:
+      self.__gitFileStructure = registry.gitRepository.getFileStructureAtCommit(self.commit)
+    self.__files = None
+
+  def loadFiles(self):
+    """
+    Read every json file in the registry at once. Returns a dictionary of file contents by normalized path.
+    """
+    if self.__files is None:
+      files = {}
+      if self.__gitFileStructure is not None:
+        (records,_) = self.__gitFileStructure.getTreeIndex()
+        objectReader = self.registry.gitRepository.objectReader
+        for path,record in records.items():
+          if record["type"] == "blob" and path.endswith(".json"):
+            contents = objectReader.read(record["hash"])
+            if contents is not None:
+              files[path] = contents
+      self.__files = files
+    return self.__files
+
+  def _ls(self,subfolder,objectType=None):
+    if self.__gitFileStructure is None:
+      return []
+    return self.__gitFileStructure._ls(subfolder,objectType=objectType)
+
+  def _lsFiles(self,subfolder):
+    return self.ls(subfolder,"blob")
+
+  def _lsFolders(self,subfolder):
+    return self.ls(subfolder,"tree")
+
+  def _exists(self,path):
+    if self.__gitFileStructure is None:
+      return False
+    return self.__gitFileStructure._exists(path)
+
+  def _read(self,path):
+    return self._readBinary(path).decode("utf-8")
+
+  def _readBinary(self,path):
+    try:
+      return self.loadFiles()[os.path.normpath(path)]
+    except KeyError:
+      pass
+    if self.__gitFileStructure is None:
+      raise OSError("File does not exist.\nRepo:"+self.registry.gitRepository.path+"\nPath: "+path+"\nCommit: "+self.registry.gitReadHash+"\n")
+    return self.__gitFileStructure._readBinary(path)
+
+  def _getMode(self,path):
+    if self.__gitFileStructure is None:
+      return None
+    return self.__gitFileStructure._getMode(path)
+
+  def _getSize(self,path):
+    if self.__gitFileStructure is None:
+      return None
+    return self.__gitFileStructure._getSize(path)
+
+  def _getContentId(self,path):
+    if self.__gitFileStructure is None:
+      return None
+    return self.__gitFileStructure._getContentId(path)
+
+  def isLegalSymlink(self,path):
+    return True
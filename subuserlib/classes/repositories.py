@@ -71,10 +71,14 @@ class Repositories(collections.abc.Mapping,UserOwnedObject,FileBackedObject):
           sourceDir = repoAttributes["source-dir"]
         else:
           sourceDir = None
-        repositories[repoName] = Repository(self.user,name=repoName,gitOriginURI=gitOriginURI,gitCommitHash=gitCommitHash,temporary=temporary,sourceDir=sourceDir)
+        if "refresh-interval" in repoAttributes:
+          refreshInterval = repoAttributes["refresh-interval"]
+        else:
+          refreshInterval = None
+        repositories[repoName] = Repository(self.user,name=repoName,gitOriginURI=gitOriginURI,gitCommitHash=gitCommitHash,temporary=temporary,sourceDir=sourceDir,refreshInterval=refreshInterval)
       return repositories
     self.systemRepositories = loadRepositoryDict(subuserlib.loadMultiFallbackJsonConfigFile.getConfig(self.systemRepositoryListPaths))
-    registryFileStructure = self.user.registry.gitRepository.getFileStructureAtCommit(self.user.registry.gitReadHash)
+    registryFileStructure = self.user.registry.snapshot
     if self.user.registry.initialized and "repositories.json" in registryFileStructure.lsFiles("./"):
       self.userRepositories = loadRepositoryDict(json.loads(registryFileStructure.read("repositories.json")))
     else:
@@ -87,7 +91,7 @@ class Repositories(collections.abc.Mapping,UserOwnedObject,FileBackedObject):
     """
     if not self.user.registry.initialized:
       return {}
-    gitFileStructure = self.user.registry.gitRepository.getFileStructureAtCommit(self.user.registry.gitReadHash)
+    gitFileStructure = self.user.registry.snapshot
     if "repository-states.json" in gitFileStructure.lsFiles("./"):
       return json.loads(gitFileStructure.read("repository-states.json"))
     else:
@@ -134,6 +138,8 @@ class Repositories(collections.abc.Mapping,UserOwnedObject,FileBackedObject):
       else:
         repositoryListDict[name]["source-dir"] = repository.repoPath
       repositoryListDict[name]["temporary"] = repository.temporary
+      if repository.refreshInterval is not None:
+        repositoryListDict[name]["refresh-interval"] = repository.refreshInterval
     return repositoryListDict
 
   def serializeRepositoryStatesToDict(self):
@@ -154,6 +160,8 @@ class Repositories(collections.abc.Mapping,UserOwnedObject,FileBackedObject):
     repositoryStatesDotJsonPath = os.path.join(self.user.config["registry-dir"],"repository-states.json")
     with self.user.endUser.get_file(repositoryStatesDotJsonPath,mode="w") as repositoryStatesDotJsonFile:
       json.dump(self.serializeRepositoryStatesToDict(),repositoryStatesDotJsonFile, indent=1, separators=(',', ': '))
+    self.user.registry.addChangedFile(self.userRepositoryListPath)
+    self.user.registry.addChangedFile(repositoryStatesDotJsonPath)
 
   def getNewUniqueTempRepoId(self):
     """
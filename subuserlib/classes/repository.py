@@ -2,40 +2,96 @@
 
 """
 A repository is a collection of ``ImageSource`` s which are published in a git repo.
+
+A repository's ``ImageSource`` s are only loaded the first time that they are looked at, so commands which only touch a few subusers do not pay for loading every repository.
 """
 
 #external imports
 import os
 import shutil
 import json
+import time
 from collections import OrderedDict
 #internal imports
 from subuserlib.classes.userOwnedObject import UserOwnedObject
 from subuserlib.classes.imageSource import ImageSource
 from subuserlib.classes.describable import Describable
-from subuserlib.classes.gitRepository import GitRepository
+from subuserlib.classes.gitRepository import GitRepository,GitException
 from subuserlib.classes.fileStructure import BasicFileStructure
+from subuserlib.classes.repositoryCatalog import RepositoryCatalog
 import subuserlib.version
 
 class Repository(OrderedDict,UserOwnedObject,Describable):
-  def __init__(self,user,name,gitOriginURI=None,gitCommitHash=None,temporary=False,sourceDir=None):
+  def __init__(self,user,name,gitOriginURI=None,gitCommitHash=None,temporary=False,sourceDir=None,refreshInterval=None):
     """
     Repositories can either be managed by git, or simply be normal directories on the user's computer. If ``sourceDir`` is not set to None, then ``gitOriginURI`` is ignored and the repository is assumed to be a simple directory.
+
+    ``refreshInterval`` is the minimum number of seconds between checks of git origin for updates. If it is None, the ``repository-refresh-interval`` config setting is used.
     """
     self.name = name
     self.gitOriginURI = gitOriginURI
     self.gitCommitHash = gitCommitHash
     self.temporary = temporary
     self.sourceDir = sourceDir
+    self.refreshInterval = refreshInterval
     self.__fileStructure = None
+    self.__repoConfig = None
+    self.__loaded = False
     UserOwnedObject.__init__(self,user)
     super().__init__()
     self.gitRepository = GitRepository(user,self.repoPath)
     if not self.isPresent():
       self.updateSources(initialUpdate=True)
-    if self.isPresent():
-      self.repoConfig = self.loadRepoConfig()
-      self.loadImageSources()
+
+  def __ensureLoaded(self):
+    if not self.__loaded and self.isPresent():
+      # Loading looks at the repository itself, so it has to be marked as loaded first. If loading fails, it is tried again the next time.
+      self.__loaded = True
+      try:
+        self.loadImageSources()
+      except BaseException:
+        self.__loaded = False
+        raise
+
+  def __getitem__(self,imageName):
+    self.__ensureLoaded()
+    return super().__getitem__(imageName)
+
+  def __contains__(self,imageName):
+    self.__ensureLoaded()
+    return super().__contains__(imageName)
+
+  def __iter__(self):
+    self.__ensureLoaded()
+    return super().__iter__()
+
+  def __len__(self):
+    self.__ensureLoaded()
+    return super().__len__()
+
+  def get(self,imageName,default=None):
+    self.__ensureLoaded()
+    return super().get(imageName,default)
+
+  def keys(self):
+    self.__ensureLoaded()
+    return super().keys()
+
+  def values(self):
+    self.__ensureLoaded()
+    return super().values()
+
+  def items(self):
+    self.__ensureLoaded()
+    return super().items()
+
+  @property
+  def repoConfig(self):
+    """
+    The contents of the repository's ``.subuser.json`` file, or None if it has none.
+    """
+    self.__ensureLoaded()
+    return self.__repoConfig
 
   @property
   def uri(self):
@@ -178,23 +234,181 @@ class Repository(OrderedDict,UserOwnedObject,Describable):
     """
     if self.isLocal:
       return
+    fetchResult = self.fetchSources()
+    if fetchResult is not None:
+      self.applyFetchedSources(new=(fetchResult == "cloned"),initialUpdate=initialUpdate)
+
+  def fetchSources(self):
+    """
+    Clone or fetch the repo from git origin, without changing which commit the repository is at.
+    This only talks to git, so it is safe to do for several repositories at once.
+    Returns "cloned" or "fetched", or None if the repository could not be cloned.
+
+    >>> import os,shutil,subprocess,tempfile
+    >>> import subuserlib.test
+    >>> from subuserlib.classes.user import User
+    >>> from subuserlib.classes.repository import Repository
+    >>> user = User()
+    >>> user.registry.logOutputVerbosity = 1
+    >>> tempDir = tempfile.mkdtemp()
+    >>> origin = os.path.join(tempDir,"origin.git")
+    >>> subprocess.call(["git","clone","-q","--bare",os.path.join(subuserlib.test.homeDir,"test-repos","default-test-repo"),origin])
+    0
+    >>> repository = Repository(user,"fetch-test",gitOriginURI="file://"+origin,refreshInterval=0) # doctest: +ELLIPSIS
+    Cloning repository fetch-test from file://.../origin.git
+
+    Git records every fetch in FETCH_HEAD. Cloning may already have written it.
+
+    >>> fetchHead = os.path.join(repository.repoPath,".git","FETCH_HEAD")
+    >>> if os.path.exists(fetchHead):
+    ...   os.remove(fetchHead)
+
+    If origin has not changed, nothing is fetched.
+
+    >>> repository.fetchSources()
+    'fetched'
+    >>> os.path.exists(fetchHead)
+    False
+
+    Once origin's master branch has moved, it is fetched.
+
+    >>> work = os.path.join(tempDir,"work")
+    >>> subprocess.call(["git","clone","-q",origin,work])
+    0
+    >>> subprocess.call(["git","commit","-q","--allow-empty","-m","Move master"],cwd=work)
+    0
+    >>> subprocess.call(["git","push","-q","origin","master"],cwd=work)
+    0
+    >>> repository.fetchSources()
+    'fetched'
+    >>> os.path.exists(fetchHead)
+    True
+    >>> repository.gitRepository.getHashOfRef("refs/remotes/origin/master") == subprocess.check_output(["git","rev-parse","HEAD"],cwd=work).decode().strip()
+    True
+
+    Within the refresh interval, origin is not contacted at all.
+
+    >>> shutil.move(origin,origin+".moved") # doctest: +ELLIPSIS
+    '...'
+    >>> repository.refreshInterval = 3600
+    >>> repository.fetchSources()
+    'fetched'
+
+    A failed fetch does not count as a check, so origin will be tried again next time.
+
+    >>> os.remove(repository.lastCheckedPath)
+    >>> repository.fetchSources()
+    Fetching repository fetch-test failed.
+    'fetched'
+    >>> repository.wasCheckedRecently()
+    False
+    >>> repository.removeGitRepo()
+    >>> shutil.rmtree(tempDir)
+    """
     if not self.isPresent():
-      new = True
       self.user.registry.log("Cloning repository "+self.name+" from "+self.gitOriginURI)
-      if self.gitRepository.clone(self.gitOriginURI) != 0:
+      reference = self.user.config["git-reference-repository"]
+      if not os.path.isdir(reference):
+        reference = None
+      if self.gitRepository.clone(self.gitOriginURI,partial=self.user.config["partial-clone-repositories"],reference=reference) != 0:
         self.user.registry.log("Clone failed.")
-        return
+        return None
+      fetchResult = "cloned"
     else:
-      new = False
+      fetchResult = "fetched"
+      if self.wasCheckedRecently():
+        self.user.registry.log("Repository "+self.name+" was checked for updates less than "+str(self.getRefreshInterval())+" seconds ago. Not fetching.",verbosityLevel=4)
+        return fetchResult
+      if self.isUpToDateWithOrigin():
+        self.user.registry.log("Repository "+self.name+" has not changed on git origin. Not fetching.",verbosityLevel=4)
+        self.markChecked()
+        return fetchResult
+    try:
+      returncode = self.gitRepository.run(["fetch","--all"])
+    except GitException as e: # For some reason, git outputs normal messages to stderr.
+      returncode = e.returncode
+    if returncode != 0:
+      # Origin will be checked again next time, rather than waiting for the refresh interval to pass.
+      self.user.registry.log("Fetching repository "+self.name+" failed.")
+      return fetchResult
+    self.markChecked()
+    return fetchResult
+
+  def getRefreshInterval(self):
+    """
+    The minimum number of seconds between checks of git origin for updates.
+    """
+    if self.refreshInterval is not None:
+      return self.refreshInterval
+    return self.user.config["repository-refresh-interval"]
+
+  @property
+  def lastCheckedPath(self):
+    # This is kept inside the clone rather than in the registry, because everything in the registry directory is committed to the registry's git repository.
+    return os.path.join(self.repoPath,".git","subuser-last-checked")
+
+  def wasCheckedRecently(self):
+    """
+    Returns True if git origin was checked for updates less than ``getRefreshInterval()`` seconds ago.
+    """
+    refreshInterval = self.getRefreshInterval()
+    if not refreshInterval:
+      return False
     try:
-      self.gitRepository.run(["fetch","--all"])
-    except Exception: # For some reason, git outputs normal messages to stderr.
+      lastChecked = os.path.getmtime(self.lastCheckedPath)
+    except OSError:
+      return False
+    return 0 <= time.time() - lastChecked < refreshInterval
+
+  def markChecked(self):
+    try:
+      with self.user.endUser.get_file(self.lastCheckedPath,mode="w") as lastCheckedFile:
+        lastCheckedFile.write(str(int(time.time())))
+    except OSError:
       pass
+
+  def isUpToDateWithOrigin(self):
+    """
+    Ask git origin which commits its branches point to, without fetching anything, and return True if fetching would not change which commit the repository should be at.
+    That is the case when origin's master branch and the branch named by the matching version constraint point to the same commits as our copies of them, or when the version constraint names a commit which we already have.
+    """
+    master = "refs/remotes/origin/master"
+    localMaster = self.gitRepository.objectReader.getObjectId(master)
+    if localMaster is None:
+      return False
+    try:
+      target = self.getVersionConstraintTarget(localMaster)
+    except (SyntaxError,ValueError):
+      return False
+    branches = ["master"]
+    if target is not None and not (len(target) == 40 and self.gitRepository.objectReader.exists(target+"^{commit}")):
+      branches.append(target)
+    try:
+      (returncode,output) = self.gitRepository.runCollectOutput(["ls-remote","origin"]+["refs/heads/"+branch for branch in branches],eatStderr=True)
+    except Exception:
+      return False
+    if returncode != 0:
+      return False
+    remoteRefs = {}
+    for line in output.splitlines():
+      fields = line.split()
+      if len(fields) == 2:
+        remoteRefs[fields[1]] = fields[0]
+    for branch in branches:
+      remoteHash = remoteRefs.get("refs/heads/"+branch)
+      if remoteHash is None or not remoteHash == self.gitRepository.objectReader.getObjectId("refs/remotes/origin/"+branch):
+        return False
+    return True
+
+  def applyFetchedSources(self,new=False,initialUpdate=False):
+    """
+    Move the repository to the newest commit which was fetched by ``fetchSources`` and reload its ImageSources.
+    """
     if self.updateGitCommitHash():
       if not new:
         self.user.registry.logChange("Updated repository "+self.displayName)
       if not initialUpdate:
-        self.loadImageSources()
+        self.__loaded = False
 
   def serializeToDict(self):
     """
@@ -207,17 +421,144 @@ class Repository(OrderedDict,UserOwnedObject,Describable):
 
   def loadImageSources(self):
     """
-    Load ImageSources from disk into memory.
+    Load ImageSources into memory.
+    Git repositories are loaded from the catalog of their current commit, which is built the first time that commit is loaded.
+
+    >>> import os,shutil,subprocess,tempfile
+    >>> import subuserlib.test
+    >>> from subuserlib.classes.user import User
+    >>> from subuserlib.classes.repository import Repository
+    >>> from subuserlib.classes.repositoryCatalog import RepositoryCatalog
+    >>> user = User()
+    >>> user.registry.logOutputVerbosity = 1
+    >>> tempDir = tempfile.mkdtemp()
+    >>> origin = os.path.join(tempDir,"origin.git")
+    >>> subprocess.call(["git","clone","-q","--bare",os.path.join(subuserlib.test.homeDir,"test-repos","default-test-repo"),origin])
+    0
+    >>> repository = Repository(user,"catalog-test",gitOriginURI="file://"+origin,refreshInterval=0) # doctest: +ELLIPSIS
+    Cloning repository catalog-test from file://.../origin.git
+    >>> sorted(repository.keys())
+    ['foo', 'subuser-internal-xpra-client', 'subuser-internal-xpra-server']
+
+    Another copy of the repository at the same commit is loaded from the catalog, without reading any of the repository's files.
+
+    >>> def unreadable(*args,**kwargs):
+    ...   raise AssertionError("The repository's files were read.")
+    >>> def withoutFiles(repository):
+    ...   fileStructure = repository.fileStructure
+    ...   fileStructure.lsFolders = fileStructure.exists = fileStructure.read = fileStructure.readBinary = unreadable
+    ...   return repository
+    >>> sameCommit = withoutFiles(Repository(user,"catalog-test",gitOriginURI="file://"+origin,gitCommitHash=repository.gitCommitHash))
+    >>> sorted(sameCommit.keys())
+    ['foo', 'subuser-internal-xpra-client', 'subuser-internal-xpra-server']
+    >>> sameCommit["foo"].getImageDir(),sameCommit["foo"].getImageFile()
+    ('./foo/image', './foo/image/SubuserImagefile')
+
+    Once the repository moves to a new commit, that commit is not in the catalog yet, so the repository's files are read again.
+
+    >>> work = os.path.join(tempDir,"work")
+    >>> subprocess.call(["git","clone","-q",origin,work])
+    0
+    >>> shutil.copytree(os.path.join(work,"foo"),os.path.join(work,"bar")) # doctest: +ELLIPSIS
+    '...'
+    >>> with open(os.path.join(work,"bar","image","SubuserImagefile"),"w") as imageFile:
+    ...   _ = imageFile.write("FROM-SUBUSER-IMAGE foo@default\\n")
+    >>> subprocess.call(["git","add","bar"],cwd=work)
+    0
+    >>> subprocess.call(["git","commit","-q","-m","Add bar"],cwd=work)
+    0
+    >>> subprocess.call(["git","push","-q","origin","master"],cwd=work)
+    0
+    >>> repository.updateSources()
+    Updated repository catalog-test
+    >>> RepositoryCatalog(user).get(repository.gitCommitHash) is None
+    True
+    >>> sorted(repository.keys())
+    ['bar', 'foo', 'subuser-internal-xpra-client', 'subuser-internal-xpra-server']
+    >>> RepositoryCatalog(user).get(repository.gitCommitHash) is None
+    False
+
+    The catalog also remembers which image each image source depends on.
+
+    >>> newCommit = withoutFiles(Repository(user,"catalog-test",gitOriginURI="file://"+origin,gitCommitHash=repository.gitCommitHash))
+    >>> newCommit["bar"].getDependencyURI()
+    'foo@default'
+
+    If loading fails, the repository is loaded again the next time it is looked at.
+
+    >>> broken = withoutFiles(Repository(user,"catalog-test",gitOriginURI="file://"+origin,gitCommitHash=repository.gitCommitHash))
+    >>> broken.loadImageSources = unreadable
+    >>> "bar" in broken
+    Traceback (most recent call last):
+    ...
+    AssertionError: The repository's files were read.
+    >>> del broken.loadImageSources
+    >>> "bar" in broken
+    True
+    >>> repository.removeGitRepo()
+    >>> shutil.rmtree(tempDir)
     """
+    self.clear()
+    if self.isLocal:
+      self.__repoConfig = self.loadRepoConfig()
+      for imageName,explicitConfig in self.findImageSources().items():
+        self[imageName] = ImageSource(self.user,self,imageName,explicitConfig=explicitConfig)
+      return
+    repositoryCatalog = RepositoryCatalog(self.user)
+    commitId = self.gitRepository.objectReader.getObjectId(self.fileStructure.commit+"^{commit}")
+    catalog = repositoryCatalog.get(commitId)
+    if catalog is None:
+      self.__repoConfig = self.loadRepoConfig()
+      catalog = {"repo-config":self.__repoConfig,"image-sources":{}}
+      for imageName,explicitConfig in self.findImageSources().items():
+        catalog["image-sources"][imageName] = ImageSource(self.user,self,imageName,explicitConfig=explicitConfig).getCatalogEntry()
+      repositoryCatalog.store(commitId,catalog)
+    self.__repoConfig = catalog["repo-config"]
+    for imageName,catalogEntry in catalog["image-sources"].items():
+      self[imageName] = ImageSource(self.user,self,imageName,explicitConfig=catalogEntry.get("explicit-config"),catalogEntry=catalogEntry)
+
+  def findImageSources(self):
+    """
+    Look through the repository's files for ImageSources. Returns an ordered dictionary of their explicit configs by name. ImageSources which live in their own folders have no explicit config.
+    """
+    imageSources = OrderedDict()
     imageNames = self.fileStructure.lsFolders(self.relativeImageSourcesDir)
     for imageName in imageNames:
       imageSource = ImageSource(self.user,self,imageName)
       if self.fileStructure.exists(imageSource.getRelativePermissionsFilePath()):
-        self[imageName] = imageSource
-    if self.repoConfig is not None and "explicit-image-sources" in self.repoConfig:
-      for imageName,config in self.repoConfig["explicit-image-sources"].items():
+        imageSources[imageName] = None
+    if self.__repoConfig is not None and "explicit-image-sources" in self.__repoConfig:
+      for imageName,config in self.__repoConfig["explicit-image-sources"].items():
         assert config is not None
-        self[imageName] = ImageSource(self.user,self,imageName,explicitConfig = config)
+        imageSources[imageName] = config
+    return imageSources
+
+  def getVersionConstraintTarget(self,commit):
+    """
+    Look up the subuser-version-constraints in the ``.subuser.json`` file at the given commit and return the branch name or commit hash which the constraint matching our version of subuser points to.
+    Returns None if the repository has no version constraints.
+    """
+    fileStructure = self.gitRepository.getFileStructureAtCommit(commit)
+    if not fileStructure.exists("./.subuser.json"):
+      return None
+    configAtCommit = json.loads(fileStructure.read("./.subuser.json"))
+    if not "subuser-version-constraints" in configAtCommit:
+      return None
+    versionConstraints = configAtCommit["subuser-version-constraints"]
+    subuserVersion = subuserlib.version.getSubuserVersion(self.user)
+    for constraint in versionConstraints:
+      if not len(constraint) == 3:
+        raise SyntaxError("Error in .subuser.json file. Invalid subuser-version-constraints."+ str(versionConstraints))
+      op,version,target = constraint
+      from operator import lt,le,eq,ge,gt
+      operators = {"<":lt,"<=":le,"==":eq,">=":ge,">":gt}
+      try:
+        matched = operators[op](subuserVersion,version)
+      except KeyError:
+        raise SyntaxError("Error in .subuser.json file. Invalid subuser-version-constraints.  \""+op+"\" is not a valid operator.\n\n"+ str(versionConstraints))
+      if matched:
+        return target
+    raise SyntaxError("Error reading .subuser.json file, no version constraints matched the current subuser version ("+subuserVersion+").\n\n"+str(versionConstraints))
 
   def updateGitCommitHash(self):
     """
@@ -231,33 +572,15 @@ class Repository(OrderedDict,UserOwnedObject,Describable):
     master = "refs/remotes/origin/master"
     newCommitHash = self.gitRepository.getHashOfRef(master)
     # First we check for version constraints on the repository.
-    if self.gitRepository.getFileStructureAtCommit(master).exists("./.subuser.json"):
-      configFileContents = self.gitRepository.getFileStructureAtCommit(master).read("./.subuser.json")
-      configAtMaster = json.loads(configFileContents)
-      if "subuser-version-constraints" in configAtMaster:
-        versionConstraints = configAtMaster["subuser-version-constraints"]
-        subuserVersion = subuserlib.version.getSubuserVersion(self.user)
-        for constraint in versionConstraints:
-          if not len(constraint) == 3:
-            raise SyntaxError("Error in .subuser.json file. Invalid subuser-version-constraints."+ str(versionConstraints))
-          op,version,commit = constraint
-          from operator import lt,le,eq,ge,gt
-          operators = {"<":lt,"<=":le,"==":eq,">=":ge,">":gt}
-          try:
-            matched = operators[op](subuserVersion,version)
-          except KeyError:
-            raise SyntaxError("Error in .subuser.json file. Invalid subuser-version-constraints.  \""+op+"\" is not a valid operator.\n\n"+ str(versionConstraints))
-          if matched:
-            try:
-              newCommitHash = self.gitRepository.getHashOfRef("refs/remotes/origin/"+commit)
-            except OSError as e:
-              if len(commit) == 40:
-                newCommitHash = commit
-              else:
-                raise e
-            break
+    commit = self.getVersionConstraintTarget(master)
+    if commit is not None:
+      try:
+        newCommitHash = self.gitRepository.getHashOfRef("refs/remotes/origin/"+commit)
+      except OSError as e:
+        if len(commit) == 40:
+          newCommitHash = commit
         else:
-          raise SyntaxError("Error reading .subuser.json file, no version constraints matched the current subuser version ("+subuserVersion+").\n\n"+str(versionConstraints))
+          raise e
     updated = not (newCommitHash == self.gitCommitHash)
     self.gitCommitHash = newCommitHash
     self.__fileStructure = None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+The RepositoryCatalog remembers what is in each commit of a git repository: the repository's ``.subuser.json`` configuration, and the names, image files and dependencies of its image sources.
+
+Loading a repository means listing its image source folders and looking inside each of them. The contents of a commit never change, so this is only done the first time that a given commit is loaded. After that, the repository is loaded from its catalog without reading its files at all.
+"""
+
+#external imports
+import os
+import re
+import json
+#internal imports
+from subuserlib.classes.userOwnedObject import UserOwnedObject
+
+# Catalogs written by other versions of this format are ignored.
+catalogFormat = 1
+
+class RepositoryCatalog(UserOwnedObject):
+  def __init__(self,user):
+    UserOwnedObject.__init__(self,user)
+
+  @property
+  def cacheDir(self):
+    return self.user.config["repository-catalog-cache"]
+
+  def getPath(self,commitId):
+    return os.path.join(self.cacheDir,commitId[:2],commitId+".json")
+
+  def isCommitId(self,commitId):
+    return commitId is not None and re.match(r"^[0-9a-f]{40}$",commitId) is not None
+
+  def get(self,commitId):
+    """
+    Returns the catalog of the given commit, or None if it has not been stored.
+    """
+    if not self.isCommitId(commitId):
+      return None
+    try:
+      with open(self.getPath(commitId),"r") as catalogFile:
+        catalog = json.load(catalogFile)
+    except (OSError,ValueError):
+      return None
+    if not isinstance(catalog,dict) or not catalog.get("format") == catalogFormat:
+      return None
+    return catalog
+
+  def store(self,commitId,catalog):
+    if not self.isCommitId(commitId):
+      return
+    catalog = dict(catalog,format=catalogFormat)
+    path = self.getPath(commitId)
+    temporaryPath = path+"."+str(os.getpid())+".tmp"
+    try:
+      self.user.endUser.makedirs(os.path.dirname(path))
+      with self.user.endUser.get_file(temporaryPath,mode="w") as catalogFile:
+        json.dump(catalog,catalogFile,separators=(",",":"))
+      os.rename(temporaryPath,path)
+    except OSError:
+      pass
@@ -118,7 +118,7 @@ class Subuser(UserOwnedObject, Describable):
     return os.path.join(self.permissionsDir,"permissions.json")
 
   def loadPermissions(self):
-    registryFileStructure = self.user.registry.gitRepository.getFileStructureAtCommit(self.user.registry.gitReadHash)
+    registryFileStructure = self.user.registry.snapshot
     try:
       initialPermissions = subuserlib.permissions.load(permissionsString=registryFileStructure.read(os.path.join(self.relativePermissionsDir,"permissions.json")),logger=self.user.registry)
     except OSError:
@@ -144,7 +144,7 @@ Please file a bug report explaining how you got here.\n"""+ str(e))
   def getPermissionsTemplate(self):
     if self.__permissionsTemplate is None:
       permissionsDotJsonWritePath = os.path.join(self.permissionsDir,"permissions-template.json")
-      registryFileStructure = self.user.registry.gitRepository.getFileStructureAtCommit(self.user.registry.gitReadHash)
+      registryFileStructure = self.user.registry.snapshot
       if "permissions-template.json" in registryFileStructure.lsFiles(self.relativePermissionsDir):
         initialPermissions = subuserlib.permissions.load(permissionsString=registryFileStructure.read(os.path.join(self.relativePermissionsDir,"permissions-template.json")),logger=self.user.registry)
         save = False
@@ -182,7 +182,7 @@ Please file a bug report explaining how you got here.\n"""+ str(e))
       pass
 
   def isImageInstalled(self):
-    return self.user.dockerDaemon.getImageProperties(self.imageId) is not None
+    return self.imageId in self.user.dockerDaemon.imageInventory
 
   def getRunReadyImage(self):
     if not self.__runReadyImage:
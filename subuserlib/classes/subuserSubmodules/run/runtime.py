@@ -15,6 +15,7 @@ import shutil
 #internal imports
 import subuserlib.test
 from subuserlib.classes.userOwnedObject import UserOwnedObject
+from subuserlib.classes.docker.engineApiLauncher import UnsupportedRunFlagException
 
 def getRecursiveDirectoryContents(directory):
   files = []
@@ -330,7 +331,21 @@ $ subuser repair
       (collectStdout,collectStderr) = self.getBackgroundCollectOutput()
       self.user.registry.log("Running subuser with Docker.",verbosityLevel=4)
       self.user.registry.log(self.getPrettyCommand(args),verbosityLevel=4)
-      returnValue = self.user.dockerDaemon.execute(command,background=self.background,backgroundSuppressOutput=self.backgroundSuppressOutput,backgroundCollectStdout=collectStdout,backgroundCollectStderr=collectStderr)
+      returnValue = None
+      containerId = None
+      # Background containers whose output we need to see can only be run through the docker client.
+      runViaEngineApi = self.user.config["docker-run-method"] == "engine-api" and not (self.background and (collectStdout or collectStderr or not self.backgroundSuppressOutput))
+      if runViaEngineApi:
+        try:
+          if self.background:
+            containerId = self.user.dockerDaemon.runContainer(command,background=True)
+          else:
+            returnValue = self.user.dockerDaemon.runContainer(command)
+        except UnsupportedRunFlagException as e:
+          self.user.registry.log("The docker run flag "+str(e)+" is not supported by the engine API launcher. Falling back to the docker client.",verbosityLevel=4)
+          runViaEngineApi = False
+      if not runViaEngineApi:
+        returnValue = self.user.dockerDaemon.execute(command,background=self.background,backgroundSuppressOutput=self.backgroundSuppressOutput,backgroundCollectStdout=collectStdout,backgroundCollectStderr=collectStderr)
       if self.subuser.permissions["run-commands-on-host"]:
         self.user.registry.log("Stopping execution spool.",verbosityLevel=4)
         self.tearDownExecutionSpool()
@@ -338,17 +353,18 @@ $ subuser repair
         self.user.registry.log("Disconnecting from X11 bridge.",verbosityLevel=4)
         self.subuser.x11Bridge.removeClient()
       if self.background:
-        self.user.registry.log("Waiting for CID file to be generated.",verbosityLevel=4)
-        while not os.path.exists(self.getCidFile()) or os.path.getsize(self.getCidFile()) == 0:
-          time.sleep(0.05)
-        with open(self.getCidFile(),"r") as cidFile:
-          self.user.registry.log("Reading CID file.",verbosityLevel=4)
-          containerId = cidFile.read()
-          container = self.user.dockerDaemon.getContainer(containerId)
-          if container is None:
-            sys.exit("Container failed to start:"+containerId)
+        if containerId is None:
+          self.user.registry.log("Waiting for CID file to be generated.",verbosityLevel=4)
+          while not os.path.exists(self.getCidFile()) or os.path.getsize(self.getCidFile()) == 0:
+            time.sleep(0.05)
+          with open(self.getCidFile(),"r") as cidFile:
+            self.user.registry.log("Reading CID file.",verbosityLevel=4)
+            containerId = cidFile.read()
           os.remove(self.getCidFile())
-          return (container, returnValue)
+        container = self.user.dockerDaemon.getContainer(containerId)
+        if container is None:
+          sys.exit("Container failed to start:"+containerId)
+        return (container, returnValue)
       else:
         return returnValue
     #try:
@@ -34,6 +34,7 @@ import sys
 import hashlib
 #internal imports
 from subuserlib.classes.service import Service
+from subuserlib.classes.docker.asyncDockerDaemon import runConcurrently
 from collections import OrderedDict
 import subuserlib.verify
 import subuserlib.subuser
@@ -287,8 +288,8 @@ class XpraX11Bridge(Service):
     """
     Stop the bridge.
     """
-    self.user.dockerDaemon.getContainer(serviceStatus["xpra-client-service-cid"]).stop()
-    self.user.dockerDaemon.getContainer(serviceStatus["xpra-server-service-cid"]).stop()
+    asyncDockerDaemon = self.user.asyncDockerDaemon
+    runConcurrently(asyncDockerDaemon.stopContainer(serviceStatus["xpra-client-service-cid"]),asyncDockerDaemon.stopContainer(serviceStatus["xpra-server-service-cid"]))
     if not "SUBUSER_DEBUG_XPRA" in os.environ:
       self.cleanUp()
 
@@ -21,7 +21,7 @@ class Subusers(dict,UserOwnedObject,FileBackedObject):
   """
   def __init__(self,user):
     UserOwnedObject.__init__(self,user)
-    registryFileStructure = self.user.registry.gitRepository.getFileStructureAtCommit(self.user.registry.gitReadHash)
+    registryFileStructure = self.user.registry.snapshot
     if self.user.registry.initialized and "subusers.json" in registryFileStructure.lsFiles("./"):
       serializedUnlockedSubusersDict = json.loads(registryFileStructure.read("subusers.json"), object_pairs_hook=collections.OrderedDict)
       self._loadSerializedSubusersDict(serializedUnlockedSubusersDict,locked=False)
@@ -53,8 +53,10 @@ class Subusers(dict,UserOwnedObject,FileBackedObject):
     Save the list of subusers to disk.
     """
     serializedDict = self.serializeToDict()
-    with self.user.endUser.get_file(os.path.join(self.user.config["registry-dir"],"subusers.json"), 'w') as file_f:
+    subusersDotJsonPath = os.path.join(self.user.config["registry-dir"],"subusers.json")
+    with self.user.endUser.get_file(subusersDotJsonPath, 'w') as file_f:
       json.dump(serializedDict["unlocked"], file_f, indent=1, separators=(',', ': '))
+    self.user.registry.addChangedFile(subusersDotJsonPath)
     with self.user.endUser.get_file(os.path.join(self.user.config["locked-subusers-path"]), 'w') as file_f:
       json.dump(serializedDict["locked"], file_f, indent=1, separators=(',', ': '))
 
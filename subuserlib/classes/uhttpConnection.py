@@ -7,6 +7,9 @@ This module allows us to communicate using http over standard unix sockets.
 
 #external imports
 import socket
+import select
+import threading
+from contextlib import contextmanager
 try:
   import httplib
 except ImportError:
@@ -15,16 +18,182 @@ except ImportError:
 #internal imports
 #import ...
 
+DEFAULT_TIMEOUT = object()
+
+# Only requests which can safely be sent twice are retried. The server may have acted on a request even though the connection failed before its response arrived.
+retryableMethods = ["GET","HEAD"]
 
 class UHTTPConnection(httplib.HTTPConnection):
   """
   Subclass of Python library HTTPConnection that uses a unix-domain socket.
   """
-  def __init__(self, path):
-    httplib.HTTPConnection.__init__(self, 'localhost')
+  def __init__(self, path, timeout=None):
+    httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
     self.path = path
 
   def connect(self):
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(self.timeout)
     sock.connect(self.path)
     self.sock = sock
+
+  def setTimeout(self,timeout):
+    """
+    Set the timeout in seconds for socket operations on this connection. None means wait forever.
+    """
+    self.timeout = timeout
+    if self.sock:
+      self.sock.settimeout(timeout)
+
+class BufferedResponse():
+  """
+  A HTTP response which has already been read in full, so that the connection it arrived on could be reused.
+  """
+  def __init__(self,status,reason,body):
+    self.status = status
+    self.reason = reason
+    self.body = body
+
+  def read(self):
+    return self.body
+
+class UHTTPConnectionPool():
+  """
+  A thread safe pool of keep-alive connections to a HTTP server listening on a unix-domain socket.
+
+  At most maxConnections requests are in flight at any one time. Idle connections which the server has closed are dropped before a request is sent on them. The server may still hang up just as a request is sent, so GET and HEAD requests which fail on a reused connection are retried once.
+
+  Requests time out after timeout seconds unless another timeout is given. Requests which make the server wait on something else, such as stopping a container, should be given a timeout of None.
+
+  Here we set up a server which answers each request and then hangs up, as the Docker daemon does with idle connections when it restarts:
+
+  >>> import os
+  >>> import shutil
+  >>> import tempfile
+  >>> from subuserlib.classes.uhttpConnection import UHTTPConnectionPool
+  >>> socketDir = tempfile.mkdtemp()
+  >>> socketPath = os.path.join(socketDir,"socket")
+  >>> server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+  >>> server.bind(socketPath)
+  >>> server.listen(1)
+  >>> server.settimeout(10)
+  >>> hungUp = threading.Semaphore(0)
+  >>> def serve():
+  ...   for _ in range(2):
+  ...     client,_ = server.accept()
+  ...     request = b""
+  ...     while not b"\\r\\n\\r\\n" in request:
+  ...       request += client.recv(1024)
+  ...     client.sendall(b"HTTP/1.1 200 OK\\r\\nContent-Length: 2\\r\\n\\r\\nok")
+  ...     client.close()
+  ...     hungUp.release()
+  >>> serverThread = threading.Thread(target=serve,daemon=True)
+  >>> serverThread.start()
+  >>> pool = UHTTPConnectionPool(socketPath)
+  >>> pool.request("GET","/").read()
+  b'ok'
+  >>> hungUp.acquire()
+  True
+
+  A POST is never retried, so it must not be sent on the connection which the server has closed.
+
+  >>> pool.request("POST","/",body=b"").read()
+  b'ok'
+  >>> serverThread.join()
+  >>> pool.close()
+  >>> server.close()
+  >>> shutil.rmtree(socketDir)
+  """
+  def __init__(self,path,maxConnections=4,timeout=60):
+    self.path = path
+    self.timeout = timeout
+    self.__idleConnections = []
+    self.__idleConnectionsLock = threading.Lock()
+    self.__connectionSlots = threading.BoundedSemaphore(maxConnections)
+
+  def __checkoutConnection(self):
+    """
+    Returns a tuple (connection,reused).
+    """
+    while True:
+      with self.__idleConnectionsLock:
+        if not self.__idleConnections:
+          break
+        connection = self.__idleConnections.pop()
+      if isOpen(connection):
+        return (connection,True)
+      connection.close()
+    return (UHTTPConnection(self.path),False)
+
+  def __checkinConnection(self,connection):
+    with self.__idleConnectionsLock:
+      self.__idleConnections.append(connection)
+
+  @contextmanager
+  def connection(self,timeout=DEFAULT_TIMEOUT,reusable=True):
+    """
+    Check out a connection for the duration of the with block. This is for requests whose responses need to be streamed rather than buffered.
+    The response must be read in full before the block ends.
+    Connections which are taken over by another protocol, such as attached container streams, are not reusable. They are closed at the end of the block instead of being returned to the pool.
+    """
+    with self.__connectionSlots:
+      connection,_ = self.__checkoutConnection()
+      connection.setTimeout(self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+      try:
+        yield connection
+      except BaseException:
+        connection.close()
+        raise
+      if reusable:
+        self.__checkinConnection(connection)
+      else:
+        connection.close()
+
+  def request(self,method,url,body=None,headers=None,timeout=DEFAULT_TIMEOUT):
+    """
+    Send a request and return a ``BufferedResponse``.
+    """
+    if headers is None:
+      headers = {}
+    replayable = method in retryableMethods and (body is None or isinstance(body,(bytes,str)))
+    with self.__connectionSlots:
+      connection,reused = self.__checkoutConnection()
+      connection.setTimeout(self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+      try:
+        try:
+          connection.request(method,url,body=body,headers=headers)
+          response = connection.getresponse()
+        except (httplib.ImproperConnectionState,ConnectionError) as e:
+          # The server closes idle keep-alive connections whenever it likes. That is only an error if this was a fresh connection.
+          connection.close()
+          if not (reused and replayable):
+            raise e
+          connection.request(method,url,body=body,headers=headers)
+          response = connection.getresponse()
+        bufferedResponse = BufferedResponse(response.status,response.reason,response.read())
+      except BaseException:
+        connection.close()
+        raise
+      if response.will_close:
+        connection.close()
+      else:
+        self.__checkinConnection(connection)
+      return bufferedResponse
+
+  def close(self):
+    with self.__idleConnectionsLock:
+      for connection in self.__idleConnections:
+        connection.close()
+      self.__idleConnections = []
+
+def isOpen(connection):
+  """
+  Returns False if the server has hung up on an idle connection. An idle connection has nothing to read, so if its socket is readable then the server has either closed it or sent something which we did not ask for.
+  """
+  if connection.sock is None:
+    return False
+  try:
+    readable,_,_ = select.select([connection.sock],[],[],0)
+  except (OSError,ValueError):
+    return False
+  return not readable
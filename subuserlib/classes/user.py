@@ -15,6 +15,7 @@ from subuserlib.classes import registry
 from subuserlib.classes import config
 from subuserlib.classes import installedImages
 from subuserlib.classes.docker import dockerDaemon
+from subuserlib.classes.docker import asyncDockerDaemon
 from subuserlib.classes.endUser import EndUser
 from subuserlib.classes.operation import Operation
 from subuserlib import test
@@ -37,6 +38,7 @@ class User(object):
     self.__registry = None
     self.__installedImages = None
     self.__dockerDaemon = None
+    self.__asyncDockerDaemon = None
     self.__runtimeCache = None
     self.__operation = None
     self._has_lock = _locked
@@ -102,6 +104,15 @@ class User(object):
       self.__dockerDaemon = dockerDaemon.DockerDaemon(self)
     return self.__dockerDaemon
 
+  @property
+  def asyncDockerDaemon(self):
+    """
+    Get the :doc:`AsyncDockerDaemon <docker>` object.  Use this to send several requests to the Docker daemon at the same time.
+    """
+    if self.__asyncDockerDaemon == None:
+      self.__asyncDockerDaemon = asyncDockerDaemon.AsyncDockerDaemon(self)
+    return self.__asyncDockerDaemon
+
   @property
   def operation(self):
     """
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 #external imports
+import os
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 #internal imports
 import subuserlib.verify
 import subuserlib.print
@@ -24,6 +26,120 @@ def getInstalledImagesThatAreInUse(user):
         user.registry.log("Warning: No image for %s installed."%subuser.name)
   return installedImagesThatAreInUse
 
+# The most images which are removed at the same time. This matches the number of connections which we keep open to the Docker daemon.
+maxRemovalWorkers = 4
+
+class ImageRemoval():
+  """
+  One Docker image which is to be removed. Runtime cache images also have a cache info file, which is removed along with them.
+  """
+  def __init__(self,imageId,cacheInfoFilePath=None):
+    self.imageId = imageId
+    self.cacheInfoFilePath = cacheInfoFilePath
+    self.dependents = []
+    self.wave = None
+
+  def describe(self):
+    if self.cacheInfoFilePath:
+      return "runtime cache image "+self.imageId
+    return "image "+self.imageId
+
+def planImageRemoval(user,imagesToBeRemoved):
+  """
+  Given a list of InstalledImages, return a list of waves of ``ImageRemoval`` s. The images in each wave can be removed at the same time, once all of the images in the previous waves have been removed.
+
+  The runtime cache images which were built from the installed images are removed too. Images are always removed before their ancestors, so that Docker never refuses to remove an image because it has children.
+  """
+  removals = OrderedDict() # {imageId : ImageRemoval}
+  for installedImage in imagesToBeRemoved:
+    for runReadyImageId,cacheInfoFilePath in installedImage.getCachedRuntimes():
+      removals[runReadyImageId] = ImageRemoval(runReadyImageId,cacheInfoFilePath)
+    removals[installedImage.imageId] = ImageRemoval(installedImage.imageId)
+  for imageId,removal in removals.items():
+    for ancestorId in user.dockerDaemon.imageInventory.getLineage(imageId)[:-1]:
+      if ancestorId in removals:
+        removals[ancestorId].dependents.append(removal)
+  def getWave(removal):
+    if removal.wave is None:
+      removal.wave = 0
+      for dependent in removal.dependents:
+        removal.wave = max(removal.wave,getWave(dependent)+1)
+    return removal.wave
+  waves = []
+  for removal in removals.values():
+    wave = getWave(removal)
+    while len(waves) <= wave:
+      waves.append([])
+    waves[wave].append(removal)
+  return waves
+
+def getReclaimedBytes(user,imageId):
+  """
+  Return the number of bytes of disk space which the image's own layer takes up, as far as the Docker daemon tells us.
+  """
+  imageInventory = user.dockerDaemon.imageInventory
+  imageProperties = imageInventory.getImageProperties(imageId)
+  if imageProperties is None:
+    return 0
+  size = imageProperties.get("Size",0)
+  parentProperties = None
+  if imageProperties.get("Parent"):
+    parentProperties = imageInventory.getImageProperties(imageProperties["Parent"])
+  if parentProperties is not None and parentProperties.get("Size",0) <= size:
+    size -= parentProperties.get("Size",0)
+  return size
+
+def removeUnneededImages(user,imagesToBeRemoved):
+  """
+  Remove the given InstalledImages and their runtime cache images from the Docker daemon, wave by wave, several images at a time.
+  Messages are logged in the order of the plan, no matter the order in which the removals finish.
+  Returns the number of bytes which were reclaimed.
+  """
+  waves = planImageRemoval(user,imagesToBeRemoved)
+  sizes = {}
+  for wave in waves:
+    for removal in wave:
+      sizes[removal.imageId] = getReclaimedBytes(user,removal.imageId)
+  def remove(removal):
+    """
+    Returns None if the image was removed, or an error message.
+    """
+    try:
+      user.dockerDaemon.removeImage(removal.imageId)
+    except dockerDaemon.ImageDoesNotExistsException as e:
+      if not removal.cacheInfoFilePath:
+        return "Error removing image: "+removal.imageId+"\n"+str(e)
+    except dockerDaemon.ServerErrorException as e:
+      return "Error removing image: "+removal.imageId+"\n"+str(e)
+    except dockerDaemon.ContainerDependsOnImageException as e:
+      return "Could not remove image "+removal.imageId+" because it is being used by a container."
+    if removal.cacheInfoFilePath:
+      try:
+        os.remove(removal.cacheInfoFilePath)
+      except OSError:
+        pass
+    return None
+  reclaimedBytes = 0
+  failed = set()
+  with ThreadPoolExecutor(max_workers=maxRemovalWorkers) as executor:
+    for wave in waves:
+      thisWave = []
+      for removal in wave:
+        # There is no point trying to remove an image which still has children.
+        if any(dependent.imageId in failed for dependent in removal.dependents):
+          failed.add(removal.imageId)
+          user.registry.log("Not removing "+removal.describe()+" because an image which depends on it could not be removed.")
+          continue
+        user.registry.log("Removing "+removal.describe())
+        thisWave.append(removal)
+      for removal,error in zip(thisWave,executor.map(remove,thisWave)):
+        if error:
+          failed.add(removal.imageId)
+          user.registry.log(error)
+        else:
+          reclaimedBytes += sizes[removal.imageId]
+  return reclaimedBytes
+
 def removeOldImages(user,dryrun=False,yes=False,sourceRepo=None,imageSourceName=None):
   installedImagesThatAreInUse = getInstalledImagesThatAreInUse(user)
   imagesToBeRemoved = []
@@ -51,20 +167,7 @@ def removeOldImages(user,dryrun=False,yes=False,sourceRepo=None,imageSourceName=
     user.registry.log("")
     removeImages = True
   if yes or removeImages:
-    # This is a very basic emulation of a topological sort,
-    # so we can remove images which depend on eachother.
-    nextRound = imagesToBeRemoved
-    didSomething = True
-    while nextRound and didSomething:
-      thisRound = nextRound
-      nextRound = []
-      didSomething = False
-      for installedImage in thisRound:
-        installedImage.removeCachedRuntimes()
-        try:
-          installedImage.removeDockerImage()
-          didSomething = True
-        except dockerDaemon.ContainerDependsOnImageException:
-          nextRound.append(installedImage)
+    reclaimedBytes = removeUnneededImages(user,imagesToBeRemoved)
+    user.registry.log("Reclaimed "+str(reclaimedBytes)+" bytes of disk space.")
     subuserlib.verify.verify(user.operation)
     user.registry.commit()
@@ -6,17 +6,82 @@ High level operations used for updating, rolling back, locking ect.
 
 #external imports
 import sys
+from concurrent.futures import ThreadPoolExecutor
 #internal imports
 import subuserlib.verify
 
+# The most repositories which are fetched at the same time.
+maxFetchWorkers = 4
+
+def fetchRepositories(user,repositories):
+  """
+  Clone or fetch the given repositories from their origins, several at a time.
+  Each repository's log messages are held back and then logged together, in the order in which the repositories were given.
+  Returns a list with the result of ``Repository.fetchSources`` for each repository. A repository whose fetch raised an exception gets None, so that it does not stop the others from being updated.
+  """
+  def fetch(repository):
+    with user.registry.holdLogMessages() as messages:
+      try:
+        fetchResult = repository.fetchSources()
+      except Exception as e:
+        user.registry.log("Fetching repository "+repository.displayName+" failed.\n"+str(e))
+        fetchResult = None
+    return (fetchResult,messages)
+  fetchResults = []
+  with ThreadPoolExecutor(max_workers=maxFetchWorkers) as executor:
+    for fetchResult,messages in executor.map(fetch,repositories):
+      user.registry.replayLogMessages(messages)
+      fetchResults.append(fetchResult)
+  return fetchResults
+
+def updateRepositories(user,repositories):
+  """
+  Fetch the given repositories and move each of them to the newest commit which was fetched.
+  Fetching is slow and only talks to git, so it is done in parallel. Updating the registry's view of each repository is done in order, so that registry commits stay deterministic. A repository which could not be fetched is left where it is.
+
+  >>> import time
+  >>> import subuserlib.update
+  >>> from subuserlib.classes.user import User
+  >>> user = User()
+  >>> class FakeRepository():
+  ...   def __init__(self,displayName,delay,error=None):
+  ...     self.displayName = displayName
+  ...     self.delay = delay
+  ...     self.error = error
+  ...   def fetchSources(self):
+  ...     time.sleep(self.delay)
+  ...     user.registry.log("Fetched "+self.displayName)
+  ...     if self.error is not None:
+  ...       raise self.error
+  ...     return "fetched"
+  ...   def applyFetchedSources(self,new=False):
+  ...     user.registry.log("Applied "+self.displayName)
+
+  The first repository takes the longest to fetch and the second one fails, but the log still comes out in order and the others are applied.
+
+  >>> subuserlib.update.updateRepositories(user,[FakeRepository("first",0.2),FakeRepository("second",0,error=OSError("Origin is unreachable.")),FakeRepository("third",0.1)])
+  Fetched first
+  Fetched second
+  Fetching repository second failed.
+  Origin is unreachable.
+  Fetched third
+  Applied first
+  Applied third
+  """
+  fetchResults = fetchRepositories(user,repositories)
+  for repository,fetchResult in zip(repositories,fetchResults):
+    if fetchResult is not None:
+      repository.applyFetchedSources(new=(fetchResult == "cloned"))
+
 #####################################################################################
 def run(operation):
   """
   This command updates(if needed) all of the installed subuser images.
   """
-  operation.user.registry.log("Updating...")
-  for _,repository in operation.user.registry.repositories.items():
-    repository.updateSources()
+  user = operation.user
+  user.registry.log("Updating...")
+  repositories = [repository for _,repository in user.registry.repositories.items() if not repository.isLocal]
+  updateRepositories(user,repositories)
   subuserlib.verify.verify(operation)
   operation.user.registry.commit()
 
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Time ``FileStructure.hash`` on a large directory, made by copying the files in ``test/hashtest`` thousands of times, with and without reading files ahead in parallel.
+
+Every run must give the same hash.
+
+Usage: ./benchmark-hashing.py [number-of-copies]
+"""
+
+#external imports
+import os
+import sys
+import time
+import shutil
+import tempfile
+#internal imports
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import subuserlib.classes.fileStructure
+from subuserlib.classes.fileStructure import BasicFileStructure
+
+def makeTestDir(copies):
+  hashtestDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),"hashtest")
+  testDir = tempfile.mkdtemp(prefix="subuser-benchmark-hashing-")
+  for copy in range(copies):
+    shutil.copytree(hashtestDir,os.path.join(testDir,str(copy//100),str(copy)))
+  return testDir
+
+def timeHash(fileStructure,hashWorkers,readAheadFiles):
+  subuserlib.classes.fileStructure.maxHashWorkers = hashWorkers
+  subuserlib.classes.fileStructure.maxReadAheadFiles = readAheadFiles
+  startTime = time.time()
+  directoryHash = fileStructure.hash("./")
+  return (directoryHash,time.time()-startTime)
+
+if __name__ == "__main__":
+  copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  readAheadFiles = subuserlib.classes.fileStructure.maxReadAheadFiles
+  testDir = makeTestDir(copies)
+  try:
+    fileStructure = BasicFileStructure(testDir)
+    print("Hashing "+str(copies*3)+" files.")
+    # Reading only one file ahead means that each file is read and then hashed in turn.
+    (serialHash,serialTime) = timeHash(fileStructure,1,1)
+    print("Serial: %.3fs" % serialTime)
+    for hashWorkers in [1,2,4,8]:
+      (parallelHash,parallelTime) = timeHash(fileStructure,hashWorkers,readAheadFiles)
+      if not parallelHash == serialHash:
+        sys.exit("Hashes differ with "+str(hashWorkers)+" workers!")
+      print(str(hashWorkers)+" read ahead workers: %.3fs" % parallelTime)
+  finally:
+    shutil.rmtree(testDir)